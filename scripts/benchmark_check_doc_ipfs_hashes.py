@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""
+Benchmark the doc command scanner against AEA_COMMAND_REGEX.
+
+Both are run over synthetic docs and must find the same commands. Run it from
+the repository root:
+
+    python -m scripts.benchmark_check_doc_ipfs_hashes --lines 1000 10000
+"""
+
+import argparse
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from scripts.check_doc_ipfs_hashes import AEA_COMMAND_REGEX, read_file, scan_file
+
+
+DEFAULT_LINES = (1000, 10000, 50000)
+SEED = 42
+BASE32_ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"
+
+
+def make_doc(lines: int, seed: int = SEED) -> str:
+    """
+    Build a synthetic doc.
+
+    Besides prose and commands, it contains long lines with one or several
+    commands and no hash, which make the regex backtrack.
+
+    :param lines: number of lines
+    :param seed: random seed
+    :return: the doc
+    """
+    rng = random.Random(seed)  # nosec
+
+    def ipfs_hash() -> str:
+        """Random CIDv1"""
+        return "bafybei" + "".join(rng.choices(BASE32_ALPHABET, k=52))
+
+    def command() -> str:
+        """Random fetch or add command"""
+        return rng.choice(
+            [
+                f"    autonomy fetch valory/contribute:0.1.0:{ipfs_hash()} --service",
+                f"    autonomy add skill valory/abci:0.1.0:{ipfs_hash()}",
+                f"    aea -s fetch {ipfs_hash()} --alias agent",
+            ]
+        )
+
+    def prose() -> str:
+        """Random prose line"""
+        return " ".join(rng.choices(["the", "agent", "service", "a", "run"], k=12))
+
+    def long_command() -> str:
+        """Long command line without a hash"""
+        return "autonomy deploy build " + " ".join(
+            f"--option{i} value" for i in range(rng.randrange(20, 60))
+        )
+
+    def chained_commands() -> str:
+        """Line with many commands and no hash"""
+        return " && ".join(
+            f"autonomy deploy run --n {i}" for i in range(rng.randrange(20, 60))
+        )
+
+    generators = [
+        command,
+        prose,
+        prose,
+        prose,
+        long_command,
+        chained_commands,
+        lambda: "```",
+    ]
+    return "\n".join(rng.choice(generators)() for _ in range(lines)) + "\n"
+
+
+def regex_scan(filepath: Path) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """Find the commands with AEA_COMMAND_REGEX"""
+    content = read_file(str(filepath), newline="")
+    return [
+        (m.start("full_cmd"), m.end("full_cmd"), m.groupdict())
+        for m in re.finditer(AEA_COMMAND_REGEX, content)
+    ]
+
+
+def measure(
+    scan: Callable[[Path], List], filepath: Path, repeat: int
+) -> Tuple[float, List]:
+    """Get the best time of several scans and their result"""
+    best = float("inf")
+    result: List = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = scan(filepath)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--lines", type=int, nargs="*", default=list(DEFAULT_LINES))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'commands':>9} {'regex':>10} {'scanner':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for lines in args.lines:
+            filepath = Path(temp_dir, f"doc_{lines}.md")
+            filepath.write_text(make_doc(lines), encoding="utf-8")
+
+            regex_time, expected = measure(regex_scan, filepath, args.repeat)
+            scanner_time, commands = measure(scan_file, filepath, args.repeat)
+            if commands != expected:
+                raise ValueError(f"The scanner and the regex disagree on {filepath}")
+
+            print(
+                f"{lines:>8} {len(commands):>9} {regex_time:>9.3f}s {scanner_time:>9.3f}s "
+                f"{regex_time / scanner_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2023 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""
+Offline benchmark for the contribution verifier.
+
+The chain, the leaderboard sheet and the token metadata endpoint are replaced by
+local stand-in servers that serve synthetic datasets. Run it from the repository
+root:
+
+    python -m scripts.benchmark_contribute_verify --sizes 1000 10000 100000
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import random
+import re
+import subprocess  # nosec
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from eth_abi import decode, encode
+
+from scripts.contribute_verify import (
+    CONFIG,
+    JsonlSink,
+    MetadataClient,
+    NULL_ADDRESS_TOPIC,
+    OWNER_OF_SELECTOR,
+    POINT_TO_HASHES,
+    TOKEN_URI_SELECTOR,
+    TRANSFER_TOPIC,
+    TierResolver,
+    TokenReader,
+    VerificationEngine,
+    fetch_images_onchain,
+    get_address_to_points,
+    get_contract,
+    get_last_block,
+    get_mints,
+    verify,
+)
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULTS_DIR = Path("benchmark_results", "contribute_verify")
+EARLIEST_BLOCK = 16097553
+BLOCKS_PER_TOKEN = 20
+MAX_LOGS_PER_QUERY = 10000
+SEED = 42
+
+DYNAMIC_CONTRIBUTION_ABI = [
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": True, "name": "id", "type": "uint256"},
+        ],
+        "name": "Transfer",
+        "type": "event",
+    },
+]
+
+
+class Dataset:  # pylint: disable=too-few-public-methods
+    """Synthetic mints, leaderboard and token images"""
+
+    def __init__(self, size: int, seed: int = SEED) -> None:
+        """
+        Constructor
+
+        :param size: number of minted tokens
+        :param seed: random seed
+        """
+        rng = random.Random(seed)  # nosec
+        thresholds = list(POINT_TO_HASHES)
+
+        # Some members mint more than one token
+        addresses = [f"0x{rng.getrandbits(160):040x}" for _ in range(size * 4 // 5)]
+        self.mints: List[Tuple[int, int, int, str]] = []
+        for token_id in range(1, size + 1):
+            block = EARLIEST_BLOCK + token_id * BLOCKS_PER_TOKEN + rng.randrange(10)
+            self.mints.append((block, 0, token_id, rng.choice(addresses)))
+        self.last_block = EARLIEST_BLOCK + (size + 1) * BLOCKS_PER_TOKEN
+
+        # Most members are on the leaderboard, plus some that have not minted
+        self.leaderboard = [
+            [address, str(rng.randrange(0, 200000))]
+            for address in addresses
+            if rng.random() < 0.9
+        ] + [
+            [f"0x{rng.getrandbits(160):040x}", str(rng.randrange(0, 200000))]
+            for _ in range(size // 10)
+        ]
+        self.images = {
+            token_id: POINT_TO_HASHES[rng.choice(thresholds)]
+            for _, _, token_id, _ in self.mints
+        }
+
+
+class StandInServer:
+    """Local HTTP server that counts the requests it serves"""
+
+    def __init__(
+        self, handle: Callable[[str, str, Optional[bytes], Dict[str, str]], Tuple]
+    ) -> None:
+        """
+        Constructor
+
+        :param handle: callable that receives the method, path, body and headers of a request and returns its status, headers and body
+        """
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Stand-in request handler"""
+
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, body: Optional[bytes]) -> None:
+                """Serve a request"""
+                with server.lock:
+                    server.requests += 1
+                status, headers, response = handle(
+                    self.command, self.path, body, dict(self.headers)
+                )
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Handle a GET request"""
+                self._respond(None)
+
+            def do_POST(self) -> None:  # pylint: disable=invalid-name
+                """Handle a POST request"""
+                length = int(self.headers.get("Content-Length", 0))
+                self._respond(self.rfile.read(length))
+
+            def log_message(self, *args: Any) -> None:
+                """Do not log every request"""
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self) -> None:
+        """Reset the request counter"""
+        with self.lock:
+            self.requests = 0
+
+    def close(self) -> None:
+        """Stop the server"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def json_response(data: Any, status: int = 200) -> Tuple[int, Dict, bytes]:
+    """Build a JSON response"""
+    return status, {"Content-Type": "application/json"}, json.dumps(data).encode()
+
+
+def to_topic(value: int) -> str:
+    """Encode an integer as a log topic"""
+    return f"0x{value:064x}"
+
+
+class FakeChain:
+    """JSON-RPC stand-in that serves the DynamicContribution mint logs and token views"""
+
+    def __init__(self, dataset: Dataset, contract_address: str, base_uri: str) -> None:
+        """Constructor"""
+        self.dataset = dataset
+        self.contract_address = contract_address
+        self.base_uri = base_uri
+        self.blocks = [block for block, *_ in dataset.mints]
+        self.owners = {token_id: address for *_, token_id, address in dataset.mints}
+        self.methods: Dict[str, Callable[[List], Any]] = {
+            "eth_chainId": lambda params: "0x1",
+            "net_version": lambda params: "1",
+            "eth_blockNumber": lambda params: hex(dataset.last_block),
+            "eth_getLogs": self.get_logs,
+            "eth_call": self.eth_call,
+        }
+        self.server = StandInServer(self.handle)
+
+    def eth_call(self, params: List) -> str:
+        """Serve the tokenURI and ownerOf views, reverting for unknown tokens"""
+        data = bytes.fromhex(params[0]["data"][2:])
+        (token_id,) = decode(["uint256"], data[4:])
+        if token_id not in self.owners:
+            raise ValueError("execution reverted: ERC721: invalid token ID")
+        if data[:4] == TOKEN_URI_SELECTOR:
+            return "0x" + encode(["string"], [f"{self.base_uri}{token_id}"]).hex()
+        if data[:4] == OWNER_OF_SELECTOR:
+            return "0x" + encode(["address"], [self.owners[token_id]]).hex()
+        raise ValueError("execution reverted")
+
+    def get_logs(self, params: List) -> List[Dict]:
+        """Serve eth_getLogs, failing like Infura above 10k results"""
+        log_filter = params[0]
+        from_block = int(log_filter["fromBlock"], 16)
+        to_block = int(log_filter["toBlock"], 16)
+        topics = log_filter.get("topics") or []
+        if topics[:2] != [TRANSFER_TOPIC, NULL_ADDRESS_TOPIC]:
+            return []
+
+        start = next(
+            (i for i, block in enumerate(self.blocks) if block >= from_block),
+            len(self.blocks),
+        )
+        logs: List[Dict[str, Any]] = []
+        for block, log_index, token_id, address in self.dataset.mints[start:]:
+            if block > to_block:
+                break
+            if len(logs) == MAX_LOGS_PER_QUERY:
+                raise ValueError("query returned more than 10000 results")
+            logs.append(
+                {
+                    "address": self.contract_address,
+                    "topics": [
+                        TRANSFER_TOPIC,
+                        NULL_ADDRESS_TOPIC,
+                        to_topic(int(address, 16)),
+                        to_topic(token_id),
+                    ],
+                    "data": "0x",
+                    "blockNumber": hex(block),
+                    "blockHash": to_topic(block),
+                    "transactionHash": to_topic(token_id),
+                    "transactionIndex": "0x0",
+                    "logIndex": hex(log_index),
+                    "removed": False,
+                }
+            )
+        return logs
+
+    def call(self, request: Dict) -> Dict:
+        """Serve a single JSON-RPC request"""
+        try:
+            result = self.methods[request["method"]](request.get("params", []))
+        except KeyError:
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {"code": -32601, "message": "method not found"},
+            }
+        except ValueError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {"code": -32005, "message": str(e)},
+            }
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def handle(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple:
+        """Serve a JSON-RPC request or batch"""
+        del method, path, headers
+        request = json.loads(body or b"{}")
+        if isinstance(request, list):
+            return json_response([self.call(item) for item in request])
+        return json_response(self.call(request))
+
+
+class FakeSheets:
+    """Google Sheets values:batchGet and Drive files.get stand-in"""
+
+    RANGE_REGEX = re.compile(r"^(?P<sheet>[^!]+)!B(?P<start>\d+):C(?P<end>\d*)$")
+
+    def __init__(self, dataset: Dataset, validators: bool = True) -> None:
+        """
+        Constructor
+
+        :param dataset: the dataset whose leaderboard is served
+        :param validators: whether values:batchGet answers conditional requests, unlike the real one
+        """
+        self.dataset = dataset
+        self.validators = validators
+        self.drive_available = True
+        self.modified_at = float(int(time.time()))
+        self.server = StandInServer(self.handle)
+
+    def update(self, leaderboard: List[List[str]]) -> None:
+        """Replace the leaderboard, moving its modification time forward"""
+        self.dataset.leaderboard = leaderboard
+        self.modified_at += 1
+
+    def handle(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple:
+        """Serve Drive files.get or values:batchGet"""
+        del method, body
+        if urlparse(path).path.startswith("/drive/"):
+            return self.get_file()
+        return self.batch_get(path, headers)
+
+    def get_file(self) -> Tuple[int, Dict, bytes]:
+        """Serve the modification time of the sheet"""
+        if not self.drive_available:
+            return json_response({"error": "Drive API disabled"}, status=403)
+        modified_time = datetime.fromtimestamp(self.modified_at, timezone.utc)
+        return json_response(
+            {"modifiedTime": modified_time.isoformat().replace("+00:00", "Z")}
+        )
+
+    def is_not_modified(self, headers: Dict[str, str], etag: str) -> bool:
+        """Check the conditional request headers against the served values"""
+        if "If-None-Match" in headers:
+            return headers["If-None-Match"] == etag
+        if "If-Modified-Since" in headers:
+            since = parsedate_to_datetime(headers["If-Modified-Since"])
+            return self.modified_at <= since.timestamp()
+        return False
+
+    def batch_get(self, path: str, headers: Dict[str, str]) -> Tuple[int, Dict, bytes]:
+        """Serve values:batchGet, rows start at 2"""
+        value_ranges = []
+        for sheet_range in parse_qs(urlparse(path).query).get("ranges", []):
+            match = self.RANGE_REGEX.match(sheet_range)
+            if not match:
+                return json_response({"error": "invalid range"}, status=400)
+            # Ranges are open ended without an end row
+            end = int(match.group("end")) - 1 if match.group("end") else None
+            values = self.dataset.leaderboard[int(match.group("start")) - 2 : end]
+            value_ranges.append(
+                {"range": sheet_range, **({"values": values} if values else {})}
+            )
+        status, response_headers, response = json_response(
+            {"valueRanges": value_ranges}
+        )
+        if not self.validators:
+            return status, response_headers, response
+
+        etag = f'"{hashlib.sha256(response).hexdigest()}"'
+        if self.is_not_modified(headers, etag):
+            return 304, {"ETag": etag}, b""
+        response_headers["ETag"] = etag
+        response_headers["Last-Modified"] = formatdate(self.modified_at, usegmt=True)
+        return status, response_headers, response
+
+
+class FakeMetadata:  # pylint: disable=too-few-public-methods
+    """Token metadata endpoint stand-in"""
+
+    def __init__(self, dataset: Dataset) -> None:
+        """Constructor"""
+        self.dataset = dataset
+        self.server = StandInServer(self.handle)
+
+    def handle(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple:
+        """Serve the metadata of a token"""
+        del method, body, headers
+        try:
+            image = self.dataset.images[int(path.strip("/").split("/")[-1])]
+        except (KeyError, ValueError):
+            return json_response({"error": "not found"}, status=404)
+        return json_response({"image": f"ipfs://{image}"})
+
+
+class PhaseTimer:  # pylint: disable=too-few-public-methods
+    """Measures the wall time, requests and peak memory of every phase"""
+
+    def __init__(self, servers: Dict[str, StandInServer], memory: bool) -> None:
+        """Constructor"""
+        self.servers = servers
+        self.memory = memory
+        self.phases: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, name: str, function: Callable[[], Any]) -> Any:
+        """Run a phase and record its measurements"""
+        for server in self.servers.values():
+            server.reset()
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        peak = 0
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        self.phases[name] = {
+            "seconds": round(elapsed, 4),
+            "requests": {
+                server_name: server.requests
+                for server_name, server in self.servers.items()
+            },
+            "peak_memory_mb": round(peak / 2**20, 2),
+        }
+        print(
+            f"  {name:<22} {elapsed:>9.3f}s  "
+            + "  ".join(f"{k}={v}" for k, v in self.phases[name]["requests"].items())
+            + (f"  peak={peak / 2**20:.1f}MB" if self.memory else "")
+        )
+        return result
+
+
+def benchmark(  # pylint: disable=too-many-locals
+    size: int, memory: bool = True
+) -> Dict[str, Any]:
+    """
+    Benchmark every verification phase over a synthetic dataset.
+
+    :param size: number of minted tokens
+    :param memory: whether to trace the peak memory, which slows the phases down
+    :return: the measurements
+    """
+    print(f"Benchmarking {size} tokens")
+    dataset = Dataset(size)
+    base_config = CONFIG["prod"]
+    sheets = FakeSheets(dataset)
+    metadata = FakeMetadata(dataset)
+    chain = FakeChain(
+        dataset,
+        base_config["dynamic_contribution_contract_address"],
+        base_uri=f"{metadata.server.url}/",
+    )
+    servers = {
+        "rpc": chain.server,
+        "sheets": sheets.server,
+        "metadata": metadata.server,
+    }
+    timer = PhaseTimer(servers, memory)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        abi_file_path = Path(temp_dir, "DynamicContribution.json")
+        abi_file_path.write_text(
+            json.dumps({"abi": DYNAMIC_CONTRIBUTION_ABI}), encoding="utf-8"
+        )
+        config = {
+            **base_config,
+            "earliest_block_to_monitor": EARLIEST_BLOCK,
+            "infura_url": chain.server.url,
+            "abi_file_path": abi_file_path,
+            "leaderboard_base_endpoint": f"{sheets.server.url}/v4/spreadsheets",
+            "leaderboard_drive_endpoint": f"{sheets.server.url}/drive/v3/files",
+            "leaderboard_api_key": "benchmark",
+            "service_endpoint": metadata.server.url,
+        }
+
+        def read_mints() -> Dict[str, Dict[str, Any]]:
+            """Full scan of the mint logs"""
+            web3, contract = get_contract(config)
+            mints = get_mints(
+                contract,
+                config["earliest_block_to_monitor"],
+                get_last_block(web3, config),
+            )
+            return {mint["token_id"]: mint for mint in mints}
+
+        mints = timer.run("get_token_to_address", read_mints)
+        address_to_points = timer.run(
+            "get_address_to_points", lambda: get_address_to_points(config)
+        )
+        token_to_hash = timer.run(
+            "image_fetching",
+            lambda: MetadataClient(config["service_endpoint"]).get_image_hashes(mints),
+        )
+        onchain_token_to_hash = timer.run(
+            "image_fetching_onchain",
+            lambda: {
+                row["token_id"]: row["image"]
+                for row in fetch_images_onchain(
+                    (
+                        {"token_id": token_id, "image": None, **mint}
+                        for token_id, mint in mints.items()
+                    ),
+                    TokenReader(
+                        config["infura_url"],
+                        config["dynamic_contribution_contract_address"],
+                    ),
+                    MetadataClient(config["service_endpoint"]),
+                    ttl=0,
+                )
+            },
+        )
+        if onchain_token_to_hash != token_to_hash:
+            raise ValueError("The on-chain and endpoint images disagree")
+        timer.run(
+            "table_building",
+            lambda: VerificationEngine(
+                address_to_points, TierResolver(POINT_TO_HASHES)
+            ).verify(mints, token_to_hash),
+        )
+
+        # End to end, with an empty store and the rows streamed to nowhere
+        CONFIG["benchmark"] = config
+        try:
+            for phase, source in (
+                ("pipeline", "endpoint"),
+                ("pipeline_onchain", "chain"),
+            ):
+                with open(
+                    Path(temp_dir, f"{phase}.jsonl"), "w", encoding="utf-8"
+                ) as stream:
+                    timer.run(
+                        phase,
+                        functools.partial(
+                            verify,
+                            "benchmark",
+                            JsonlSink(stream),
+                            store_path=str(Path(temp_dir, f"{phase}.db")),
+                            source=source,
+                        ),
+                    )
+        finally:
+            del CONFIG["benchmark"]
+
+    for server in servers.values():
+        server.close()
+
+    return {"size": size, "phases": timer.phases}
+
+
+def get_commit() -> str:
+    """Get the current git commit, if any"""
+    try:
+        return subprocess.check_output(  # nosec
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: Dict[str, Any], baseline_path: Path) -> None:
+    """Print the time ratio of every phase against a previous run"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    baseline_runs = {run["size"]: run for run in baseline["runs"]}
+    print(f"\nCompared to {baseline['commit']} ({baseline_path}):")
+    for run in results["runs"]:
+        baseline_run = baseline_runs.get(run["size"])
+        if baseline_run is None:
+            continue
+        for phase, data in run["phases"].items():
+            old = baseline_run["phases"].get(phase)
+            if not old or not old["seconds"]:
+                continue
+            ratio = data["seconds"] / old["seconds"]
+            print(
+                f"  {run['size']:>7} {phase:<22} {old['seconds']:>9.3f}s -> {data['seconds']:>9.3f}s  x{ratio:.2f}"
+            )
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(DEFAULT_SIZES))
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Do not trace the peak memory, which slows the phases down",
+    )
+    parser.add_argument("--output-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument(
+        "--compare", type=Path, help="Results file of a previous run to compare with"
+    )
+    args = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "timestamp": int(time.time()),
+        "runs": [benchmark(size, memory=not args.no_memory) for size in args.sizes],
+    }
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = args.output_dir / f"{results['timestamp']}-{results['commit']}.json"
+    output_path.write_text(json.dumps(results, indent=4), encoding="utf-8")
+    print(f"\nResults saved to {output_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
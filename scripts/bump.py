@@ -27,19 +27,30 @@ This script
 - Performs the packages sync
 """
 
+import difflib
+import hashlib
+import io
+import json
 import os
 import re
+import shutil
+import tempfile
+import time
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
 import requests
 from aea.cli.utils.click_utils import PackagesSource, PyPiDependency
 from aea.configurations.constants import PACKAGES, PACKAGE_TYPE_TO_CONFIG_FILE
-from aea.configurations.data_types import Dependency
+from aea.configurations.data_types import Dependency, PackageId
+from aea.helpers.ipfs.base import IPFSHashOnly
 from aea.helpers.logging import setup_logger
 from aea.helpers.yaml_utils import yaml_dump, yaml_dump_all, yaml_load, yaml_load_all
-from aea.package_manager.v1 import PackageManagerV1
+from aea.package_manager.base import PACKAGES_FILE, load_fetch_ipfs
+from aea.package_manager.v1 import PACKAGE_FILE_REMOTE_URL, PackageManagerV1
+from requests.adapters import HTTPAdapter
 
 from autonomy.cli.helpers.ipfs_hash import load_configuration
 
@@ -52,6 +63,7 @@ TOX_INI = Path.cwd() / "tox.ini"
 TAGS_URL = "https://api.github.com/repos/{repo}/tags"
 FILE_URL = "https://raw.githubusercontent.com/{repo}/{tag}/{file}"
 
+DEPENDENCY_NAME_RE = re.compile(r"^\s*\"?(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)")
 VERISON_RE = re.compile(r"(__version__|version)( )?=( )?\"(?P<version>[0-9a-z\.]+)\"")
 
 OPEN_AEA_REPO = "valory-xyz/open-aea"
@@ -96,140 +108,241 @@ DEPENDENCY_SPECS = {
     },
 }
 
-_cache_file = Path.home() / ".aea" / ".gitcache"
-_version_cache = {}
+GIT_REQUEST_TIMEOUT = 30.0
+GIT_REQUEST_WORKERS = 8
+CACHE_TTL = 60 * 60
+PACKAGE_FETCH_WORKERS = 8
+
+# The plain `key: value` cache is shared with the bump scripts of other repos,
+# so the entries with their validators are kept in a separate file
+_legacy_cache_file = Path.home() / ".aea" / ".gitcache"
+_cache_file = Path.home() / ".aea" / ".gitcache.v2"
+_package_store = Path.home() / ".aea" / "package_store"
+_hash_manifest_file = Path.cwd() / ".package_hashes.json"
+# Cached values along with the url they come from, when they were fetched and
+# the validators of the response, i.e.
+# {key: {"value": ..., "url": ..., "fetched_at": ..., "etag": ..., "last_modified": ...}}
+_version_cache: t.Dict[str, t.Dict[str, t.Any]] = {}
+_cache_settings: t.Dict[str, t.Any] = {"ttl": CACHE_TTL, "offline": False}
 _logger = setup_logger("bump")
 
+# Connections to github are kept alive and shared by all the requests
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=GIT_REQUEST_WORKERS))
+
 
 def load_git_cache() -> None:
     """Load versions cache."""
-    if not _cache_file.exists():
-        return
-    with _cache_file.open("r", encoding="utf-8") as stream:
-        _version_cache.update(yaml_load(stream=stream))
+    # Plain values of the shared cache are used until they are revalidated
+    if _legacy_cache_file.exists():
+        with _legacy_cache_file.open("r", encoding="utf-8") as stream:
+            data = yaml_load(stream=stream) or {}
+        _version_cache.update(
+            {
+                key: {"value": value}
+                for key, value in data.items()
+                if not isinstance(value, dict)
+            }
+        )
+    if _cache_file.exists():
+        with _cache_file.open("r", encoding="utf-8") as stream:
+            _version_cache.update(yaml_load(stream=stream) or {})
 
 
 def dump_git_cache() -> None:
     """Dump versions cache."""
+    _cache_file.parent.mkdir(parents=True, exist_ok=True)
     with _cache_file.open("w", encoding="utf-8") as stream:
         yaml_dump(data=_version_cache, stream=stream)
 
 
-def make_git_request(url: str) -> requests.Response:
+def make_git_request(
+    url: str, headers: t.Optional[t.Dict[str, str]] = None
+) -> requests.Response:
     """Make git request"""
+    headers = dict(headers or {})
     auth = os.environ.get("GITHUB_AUTH")
-    if auth is None:
-        return requests.get(url=url)
-    return requests.get(url=url, headers={"Authorization": f"Bearer {auth}"})
+    if auth is not None:
+        headers["Authorization"] = f"Bearer {auth}"
+    return _session.get(url=url, headers=headers, timeout=GIT_REQUEST_TIMEOUT)
+
+
+def get_cached_value(
+    key: str, url: str, parse: t.Callable[[requests.Response], str]
+) -> str:
+    """
+    Get a value fetched from github, through the cache.
+
+    A value cached from the same url is used as is for the cache ttl, and then
+    revalidated with a conditional request. In offline mode, cached values are
+    always used.
+
+    :param key: the cache key
+    :param url: the url to fetch the value from
+    :param parse: gets the value from a response, or raises a ValueError
+    :return: the value
+    """
+    entry = _version_cache.get(key)
+    if _cache_settings["offline"]:
+        if entry is None:
+            raise ValueError(f"`{key}` is not cached and can't be resolved offline")
+        return entry["value"]
+
+    headers = {}
+    if entry is not None and entry.get("url") == url:
+        if time.time() - entry.get("fetched_at", 0) < _cache_settings["ttl"]:
+            return entry["value"]
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = make_git_request(url=url, headers=headers)
+    if response.status_code == 304 and entry is not None and headers:
+        entry["fetched_at"] = time.time()
+        return entry["value"]
+
+    _version_cache[key] = {
+        "value": parse(response),
+        "url": url,
+        "fetched_at": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return _version_cache[key]["value"]
 
 
 def get_latest_tag(repo: str) -> str:
     """Fetch latest git tag."""
-    if repo in _version_cache:
-        return _version_cache[repo]
-
-    response = make_git_request(url=TAGS_URL.format(repo=repo))
-    if response.status_code != 200:
-        raise ValueError(
-            f"Fetching tags from `{repo}` failed with message '"
-            + response.json()["message"]
-            + "'"
-        )
-    latest_tag_data, *_ = response.json()
-    _version_cache[repo] = latest_tag_data["name"]
-    return _version_cache[repo]
+
+    def parse(response: requests.Response) -> str:
+        """Get the latest tag from the tags response"""
+        if response.status_code != 200:
+            raise ValueError(
+                f"Fetching tags from `{repo}` failed with message '"
+                + response.json()["message"]
+                + "'"
+            )
+        latest_tag_data, *_ = response.json()
+        return latest_tag_data["name"]
+
+    return get_cached_value(repo, TAGS_URL.format(repo=repo), parse)
 
 
-def get_dependency_version(repo: str, file: str) -> str:
+def get_dependency_version(repo: str, file: str, tag: t.Optional[str] = None) -> str:
     """Get version spec ."""
-    response = make_git_request(
-        FILE_URL.format(
-            repo=repo,
-            tag=get_latest_tag(repo=repo),
-            file=file,
-        )
-    )
-    if response.status_code != 200:
-        raise ValueError(
-            f"Fetching packages from `{repo}` failed with message '"
-            + response.text
-            + "'"
-        )
-    ((*_, version),) = VERISON_RE.findall(response.content.decode())
-    return f"=={version}"
+
+    def parse(response: requests.Response) -> str:
+        """Get the version spec from the file response"""
+        if response.status_code != 200:
+            raise ValueError(
+                f"Fetching packages from `{repo}` failed with message '"
+                + response.text
+                + "'"
+            )
+        ((*_, version),) = VERISON_RE.findall(response.content.decode())
+        return f"=={version}"
+
+    url = FILE_URL.format(repo=repo, tag=tag or get_latest_tag(repo=repo), file=file)
+    return get_cached_value(f"{repo}/{file}", url, parse)
 
 
 def get_dependencies() -> t.Dict:
     """Get dependency->version mapping."""
-    dependencies = {}
-    for dependency, specs in DEPENDENCY_SPECS.items():
-        version = _version_cache.get(
-            dependency,
-            get_dependency_version(
+    with ThreadPoolExecutor(max_workers=GIT_REQUEST_WORKERS) as executor:
+        # The latest tag of every repo is resolved once, for all its files
+        repos = sorted({specs["repo"] for specs in DEPENDENCY_SPECS.values()})
+        tags = dict(zip(repos, executor.map(get_latest_tag, repos)))
+        versions = executor.map(
+            lambda specs: get_dependency_version(
                 repo=specs["repo"],
                 file=specs["file"],
+                tag=tags[specs["repo"]],
             ),
+            DEPENDENCY_SPECS.values(),
         )
-        dependencies[dependency] = version
-    _version_cache.update(dependencies)
-    return dependencies
-
-
-def bump_pipfile_or_pyproject(file: Path, dependencies: t.Dict[str, str]) -> None:
-    """Bump Pipfile."""
-    if not file.exists():
-        return
-
-    _logger.info(f"Updating {file.name}")
-    updated = ""
-    content = file.read_text(encoding="utf-8")
-    for line in content.split("\n"):
+        return dict(zip(DEPENDENCY_SPECS, versions))
+
+
+def _bump_lines(
+    content: str,
+    dependencies: t.Dict[str, str],
+    bump_line: t.Callable[[str, str], t.Optional[str]],
+) -> str:
+    """
+    Bump the dependency lines of a file.
+
+    Only lines that start with the name of a dependency to bump are parsed.
+
+    :param content: the file content
+    :param dependencies: the dependency to version spec mapping
+    :param bump_line: gets the bumped line from a line and its version spec, or None to keep it
+    :return: the bumped content
+    """
+    lines = content.split("\n")
+    for i, line in enumerate(lines):
+        match = DEPENDENCY_NAME_RE.match(line)
+        if match is None or match.group("name") not in dependencies:
+            continue
         try:
-            spec = Dependency.from_pipfile_string(line)
-            update = dependencies.get(spec.name)
-            if update is None:
-                updated += line + "\n"
-                continue
-            spec = Dependency(
-                name=spec.name,
-                version=update,
-                extras=spec.extras,
-            )
-            updated += spec.to_pipfile_string() + "\n"
+            lines[i] = bump_line(line, dependencies[match.group("name")]) or line
         except ValueError:
-            updated += line + "\n"
-    file.write_text(updated[:-1], encoding="utf-8")
+            continue
+    return "\n".join(lines)
 
 
-def bump_tox(dependencies: t.Dict[str, str]) -> None:
-    """Bump tox file."""
+def plan_pipfile_or_pyproject(
+    file: Path, dependencies: t.Dict[str, str]
+) -> t.Dict[Path, str]:
+    """Plan the Pipfile or pyproject.toml bump."""
+    if not file.exists():
+        return {}
+
+    def bump_line(line: str, update: str) -> t.Optional[str]:
+        """Bump a Pipfile line"""
+        spec = Dependency.from_pipfile_string(line)
+        if spec.name not in dependencies or spec.version == update:
+            return None
+        return Dependency(
+            name=spec.name,
+            version=update,
+            extras=spec.extras,
+        ).to_pipfile_string()
+
+    return {
+        file: _bump_lines(file.read_text(encoding="utf-8"), dependencies, bump_line)
+    }
+
+
+def plan_tox(dependencies: t.Dict[str, str]) -> t.Dict[Path, str]:
+    """Plan the tox.ini bump."""
     if not TOX_INI.exists():
-        return
-
-    _logger.info("Updating tox.ini")
-    updated = ""
-    content = TOX_INI.read_text(encoding="utf-8")
-    for line in content.split("\n"):
-        try:
-            spec = Dependency.from_string(line.lstrip().rstrip())
-            update = dependencies.get(spec.name)
-            if update is None:
-                updated += line + "\n"
-                continue
-            spec = Dependency(
+        return {}
+
+    def bump_line(line: str, update: str) -> t.Optional[str]:
+        """Bump a tox.ini dependency line"""
+        spec = Dependency.from_string(line.lstrip().rstrip())
+        if spec.name not in dependencies or spec.version == update:
+            return None
+        return (
+            "    "
+            + Dependency(
                 name=spec.name,
                 version=update,
                 extras=spec.extras,
-            )
-            updated += "    " + spec.to_pip_string() + "\n"
-        except ValueError:
-            updated += line + "\n"
-    TOX_INI.write_text(updated[:-1], encoding="utf-8")
+            ).to_pip_string()
+        )
+
+    return {
+        TOX_INI: _bump_lines(
+            TOX_INI.read_text(encoding="utf-8"), dependencies, bump_line
+        )
+    }
 
 
-def bump_packages(dependencies: t.Dict[str, str]) -> None:
-    """Bump packages."""
-    _logger.info("Updating packages")
+def plan_packages(dependencies: t.Dict[str, str]) -> t.Dict[Path, str]:
+    """Plan the bump of the dev packages whose dependencies change."""
+    plan = {}
     manager = PackageManagerV1.from_dir(Path(PACKAGES))
     for package_id in manager.dev_packages:
         path = (
@@ -241,14 +354,426 @@ def bump_packages(dependencies: t.Dict[str, str]) -> None:
         with path.open("r", encoding="utf-8") as stream:
             config, *extra = yaml_load_all(stream=stream)
 
+        changed = False
         for name in config.get("dependencies", {}):
             update = dependencies.get(name)
-            if update is None:
+            if update is None or config["dependencies"][name].get("version") == update:
                 continue
             config["dependencies"][name]["version"] = update
+            changed = True
+
+        # Packages are only dumped again when they change, to keep their hashes
+        if changed:
+            buffer = io.StringIO()
+            yaml_dump_all([config, *extra], stream=buffer)
+            plan[path] = buffer.getvalue()
+    return plan
+
+
+def plan_bump(dependencies: t.Dict[str, str]) -> t.Dict[Path, t.Tuple[str, str]]:
+    """
+    Compute all the file updates of a bump, without writing them.
+
+    :param dependencies: the dependency to version spec mapping
+    :return: the current and updated content of every file that changes
+    """
+    updates = {
+        **plan_pipfile_or_pyproject(PIPFILE, dependencies=dependencies),
+        **plan_pipfile_or_pyproject(PYPROJECT_TOML, dependencies=dependencies),
+        **plan_tox(dependencies=dependencies),
+        **plan_packages(dependencies=dependencies),
+    }
+    plan = {}
+    for path, updated in updates.items():
+        content = path.read_text(encoding="utf-8")
+        if updated != content:
+            plan[path] = (content, updated)
+    return plan
+
+
+def show_plan(plan: t.Dict[Path, t.Tuple[str, str]], diff: bool = False) -> None:
+    """Log a summary of the planned updates, and optionally print their diff."""
+    if not plan:
+        _logger.info("Nothing to update")
+    for path, (content, updated) in plan.items():
+        lines = list(
+            difflib.unified_diff(
+                content.splitlines(keepends=True),
+                updated.splitlines(keepends=True),
+                fromfile=str(path),
+                tofile=str(path),
+            )
+        )
+        added = sum(
+            1 for line in lines if line.startswith("+") and not line.startswith("+++")
+        )
+        removed = sum(
+            1 for line in lines if line.startswith("-") and not line.startswith("---")
+        )
+        _logger.info(f"Updating {path}: +{added} -{removed}")
+        if diff:
+            click.echo("".join(lines))
 
-        with path.open("w", encoding="utf-8") as stream:
-            yaml_dump_all([config, *extra], stream=stream)
+
+def apply_plan(plan: t.Dict[Path, t.Tuple[str, str]]) -> None:
+    """Write the updated files, each one atomically through a temporary file."""
+    for path, (_, updated) in plan.items():
+        fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as stream:
+                stream.write(updated)
+            os.chmod(temp_path, path.stat().st_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+class PackageStore:
+    """
+    Local content-addressed store of packages.
+
+    Every package is kept under its IPFS hash as `<hash>/<name>`, so a package
+    is only downloaded once for a given hash. Packages are copied out of the
+    store rather than linked, since the sync rewrites their configurations in
+    place, and verified against their hash when they are.
+    """
+
+    def __init__(self, path: Path, offline: bool = False) -> None:
+        """Constructor"""
+        self.path = path
+        self.offline = offline
+
+    def get(self, package_id: PackageId) -> t.Optional[Path]:
+        """Get the stored package path, if the package is stored."""
+        package_path = self.path / package_id.package_hash / package_id.name
+        return package_path if package_path.is_dir() else None
+
+    def evict(self, package_id: PackageId) -> None:
+        """Remove a package from the store."""
+        shutil.rmtree(self.path / package_id.package_hash, ignore_errors=True)
+
+    def fetch(self, package_id: PackageId) -> Path:
+        """
+        Download a package to the store, unless it is already stored.
+
+        :param package_id: the package id, with its hash
+        :return: the stored package path
+        """
+        package_path = self.get(package_id)
+        if package_path is not None:
+            return package_path
+        if self.offline:
+            raise ValueError(
+                f"{package_id.without_hash()} is not stored and can't be fetched offline"
+            )
+
+        _logger.info(f"Downloading {package_id.without_hash()}")
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Downloads go to a temporary directory, which is moved in place once
+        # verified, so that the store never holds partial packages
+        temp_dir = Path(
+            tempfile.mkdtemp(prefix=f".{package_id.package_hash}.", dir=self.path)
+        )
+        try:
+            load_fetch_ipfs()(
+                str(package_id.package_type),
+                package_id.public_id,
+                str(temp_dir / package_id.name),
+                True,
+            )
+            package_hash = IPFSHashOnly.get(str(temp_dir / package_id.name))
+            if package_hash != package_id.package_hash:
+                raise ValueError(
+                    f"Downloaded {package_id.without_hash()} has hash {package_hash}, "
+                    f"expected {package_id.package_hash}"
+                )
+            os.rename(temp_dir, self.path / package_id.package_hash)
+        except OSError:
+            # Stored meanwhile by another sync
+            if self.get(package_id) is None:
+                raise
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return self.path / package_id.package_hash / package_id.name
+
+    def restore(self, package_id: PackageId, dest: Path) -> None:
+        """
+        Restore a package from the store, fetching it first if needed.
+
+        :param package_id: the package id, with its hash
+        :param dest: the package directory to restore to
+        """
+        shutil.copytree(self.fetch(package_id), dest)
+        if IPFSHashOnly.get(str(dest)) == package_id.package_hash:
+            return
+
+        # The stored package was modified in the store
+        _logger.warning(f"Stored {package_id.without_hash()} is corrupted, refetching")
+        shutil.rmtree(dest)
+        self.evict(package_id)
+        shutil.copytree(self.fetch(package_id), dest)
+
+
+class HashManifest:
+    """
+    Manifest of the packages as they were when they were last hashed.
+
+    For every package it keeps the mtime, size and digest of its files, its
+    hash and the hashes of its dependencies, i.e.
+    {package: {"hash": ..., "files": {path: [mtime_ns, size, digest]}, "dependencies": {package: hash}}}
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Constructor"""
+        self.path = path
+        self.packages: t.Dict[str, t.Dict[str, t.Any]] = {}
+
+    def load(self) -> None:
+        """Load the manifest."""
+        if self.path.exists():
+            self.packages = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def save(self) -> None:
+        """Save the manifest."""
+        self.path.write_text(
+            json.dumps(self.packages, indent=2, sort_keys=True), encoding="utf-8"
+        )
+
+    def scan(  # pylint: disable=too-many-locals
+        self, package: str, package_path: Path
+    ) -> t.Tuple[bool, t.Dict]:
+        """
+        Get the files of a package, and whether they changed since its last hashing.
+
+        Files are only read if their mtime or size changed. Like the package
+        hash, the `__pycache__` directories and `.pyc` files are ignored.
+
+        :param package: the package uri path
+        :param package_path: the package directory
+        :return: whether the files changed, and their mtime, size and digest
+        """
+        known = self.packages.get(package, {}).get("files", {})
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(package_path):
+            dirnames[:] = [name for name in dirnames if name != "__pycache__"]
+            for filename in filenames:
+                if filename.endswith(".pyc"):
+                    continue
+                filepath = Path(dirpath, filename)
+                path = filepath.relative_to(package_path).as_posix()
+                stat = filepath.stat()
+                mtime, size, digest = known.get(path, (None, None, None))
+                if (mtime, size) != (stat.st_mtime_ns, stat.st_size):
+                    digest = hashlib.sha256(filepath.read_bytes()).hexdigest()
+                files[path] = [stat.st_mtime_ns, stat.st_size, digest]
+
+        changed = set(files) != set(known) or any(
+            known[path][2] != digest for path, (*_, digest) in files.items()
+        )
+        return changed, files
+
+
+class StoredPackageManager(PackageManagerV1):
+    """
+    Package manager which fetches packages through a package store.
+
+    With a hash manifest, it also updates the package hashes incrementally.
+    """
+
+    def __init__(
+        self,
+        *args: t.Any,
+        store: t.Optional[PackageStore] = None,
+        manifest: t.Optional[HashManifest] = None,
+        **kwargs: t.Any,
+    ) -> None:
+        """Constructor"""
+        super().__init__(*args, **kwargs)
+        self.store = store if store is not None else PackageStore(_package_store)
+        self.manifest = manifest
+        # Hashes of the packages seen by the ongoing incremental update, and the
+        # ones which are kept as they are
+        self._hashes: t.Optional[t.Dict[str, str]] = None
+        self._unchanged: t.Set[str] = set()
+
+    @classmethod
+    def from_store(
+        cls,
+        path: Path,
+        store: PackageStore,
+        manifest: t.Optional[HashManifest] = None,
+        **kwargs: t.Any,
+    ) -> "StoredPackageManager":
+        """Load the package manager of a packages directory with a store."""
+        manager = t.cast(StoredPackageManager, cls.from_dir(path, **kwargs))
+        manager.store = store
+        manager.manifest = manifest
+        manager._hashes, manager._unchanged = None, set()
+        return manager
+
+    @staticmethod
+    def _get_latest_tag(repo: str) -> str:
+        """Get latest tag for the repository, through the cache."""
+        return get_latest_tag(repo)
+
+    @staticmethod
+    def _get_packages_json(repo: str, tag: str) -> t.Dict[str, t.Dict[str, str]]:
+        """Get `packages.json`, through the cache."""
+
+        def parse(response: requests.Response) -> str:
+            """Get the packages.json content from the file response"""
+            if response.status_code != 200:
+                raise ValueError(
+                    f"Fetching packages from `{repo}` failed with message '"
+                    + response.text
+                    + "'"
+                )
+            return response.text
+
+        url = PACKAGE_FILE_REMOTE_URL.format(repo=repo, tag=tag)
+        return json.loads(
+            get_cached_value(f"{repo}/{PACKAGES}/{PACKAGES_FILE}", url, parse)
+        )
+
+    def _fetch_package(self, package_id: PackageId) -> None:
+        """Restore a package from the store to the filesystem."""
+        package_path = self.package_path_from_package_id(package_id)
+        for collection in (package_path.parent.parent, package_path.parent):
+            if not collection.exists():
+                collection.mkdir()
+                (collection / "__init__.py").touch()
+        self.store.restore(package_id, package_path)
+        self._logger.debug(f"Restored {package_id.without_hash()}")
+
+    def prefetch(self) -> None:
+        """Download the missing or outdated third party packages concurrently."""
+        missing = []
+        for package_id, package_hash in self.third_party_packages.items():
+            if self.store.get(package_id.with_hash(package_hash)) is not None:
+                continue
+            package_path = self.package_path_from_package_id(package_id)
+            if (
+                package_path.exists()
+                and IPFSHashOnly.get(str(package_path)) == package_hash
+            ):
+                continue
+            missing.append(package_id.with_hash(package_hash))
+
+        with ThreadPoolExecutor(max_workers=PACKAGE_FETCH_WORKERS) as executor:
+            list(executor.map(self.store.fetch, missing))
+
+    def sync(  # pylint: disable=too-many-arguments
+        self,
+        dev: bool = False,
+        third_party: bool = True,
+        update_packages: bool = False,
+        update_hashes: bool = False,
+        sources: t.Optional[t.List[str]] = None,
+    ) -> "StoredPackageManager":
+        """Sync local packages, after fetching the missing ones to the store."""
+        if sources:
+            self._update_hashes_from_sources(sources=sources)
+        if third_party and update_packages:
+            self.prefetch()
+        super().sync(
+            dev=dev,
+            third_party=third_party,
+            update_packages=update_packages,
+            update_hashes=update_hashes,
+        )
+        return self
+
+    def update_package_hashes(
+        self,
+        selector_prompt: t.Optional[t.Callable[[], str]] = None,
+        skip_missing: bool = False,
+    ) -> "StoredPackageManager":
+        """
+        Update the package hashes, only rehashing the packages that changed.
+
+        A package is fingerprinted and hashed again if its files changed since
+        its last hashing, or if the hash of one of its dependencies did, so
+        changes propagate up the dependency tree. The other packages keep the
+        hash from the manifest.
+
+        :param selector_prompt: prompt for the type of the new packages
+        :param skip_missing: skip the packages which are not in packages.json
+        :return: the package manager
+        """
+        if self.manifest is None:
+            super().update_package_hashes(
+                selector_prompt=selector_prompt, skip_missing=skip_missing
+            )
+            return self
+
+        self._hashes, self._unchanged = {}, set()
+        try:
+            super().update_package_hashes(
+                selector_prompt=selector_prompt, skip_missing=skip_missing
+            )
+            self._logger.info(
+                f"Rehashed {len(self._hashes) - len(self._unchanged)} of "
+                f"{len(self._hashes)} packages"
+            )
+        finally:
+            self._hashes, self._unchanged = None, set()
+        self.manifest.save()
+        return self
+
+    def update_fingerprints(self, package_id: PackageId) -> None:
+        """Update fingerprints for a package, unless it didn't change."""
+        if self.manifest is None or self._hashes is None:
+            super().update_fingerprints(package_id=package_id)
+            return
+
+        package = package_id.to_uri_path
+        entry = self.manifest.packages.get(package)
+        changed, files = self.manifest.scan(
+            package, self.package_path_from_package_id(package_id)
+        )
+        if (
+            entry is not None
+            and not changed
+            and all(
+                self._hashes.get(dependency) == dependency_hash
+                for dependency, dependency_hash in entry["dependencies"].items()
+            )
+        ):
+            entry["files"] = files
+            self._hashes[package] = entry["hash"]
+            self._unchanged.add(package)
+            return
+        super().update_fingerprints(package_id=package_id)
+
+    def update_dependencies(self, package_id: PackageId) -> None:
+        """Update dependency hashes for a package, unless it didn't change."""
+        if package_id.to_uri_path not in self._unchanged:
+            super().update_dependencies(package_id=package_id)
+
+    def calculate_hash_from_package_id(self, package_id: PackageId) -> str:
+        """Calculate package hash, or get it from the manifest if it didn't change."""
+        if self.manifest is None or self._hashes is None:
+            return super().calculate_hash_from_package_id(package_id=package_id)
+
+        package = package_id.to_uri_path
+        if package in self._unchanged:
+            return self._hashes[package]
+
+        package_hash = super().calculate_hash_from_package_id(package_id=package_id)
+        _, files = self.manifest.scan(
+            package, self.package_path_from_package_id(package_id)
+        )
+        self.manifest.packages[package] = {
+            "hash": package_hash,
+            "files": files,
+            "dependencies": {
+                dependency.without_hash().to_uri_path: dependency.package_hash
+                for dependency in self.get_package_dependencies(package_id)
+            },
+        }
+        self._hashes[package] = package_hash
+        return package_hash
 
 
 @click.command(name="bump")
@@ -275,14 +800,49 @@ def bump_packages(dependencies: t.Dict[str, str]) -> None:
     default=False,
     help="Avoid using cache to bump.",
 )
-def main(
+@click.option(
+    "--cache-ttl",
+    type=float,
+    default=CACHE_TTL,
+    show_default=True,
+    help="Seconds before cached versions are revalidated with github.",
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    default=False,
+    help="Only use cached versions and stored packages, without contacting github or IPFS.",
+)
+@click.option(
+    "--full-rehash",
+    is_flag=True,
+    default=False,
+    help="Rehash all the packages after the sync, not only the ones that changed.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="Print the diff of the updates without writing them.",
+)
+def main(  # pylint: disable=too-many-arguments
     extra: t.Tuple[Dependency, ...],
     sources: t.Tuple[str, ...],
     sync: bool,
     no_cache: bool,
+    cache_ttl: float,
+    offline: bool,
+    full_rehash: bool,
+    dry_run: bool,
 ) -> None:
     """Run the bump script."""
 
+    if no_cache and offline:
+        raise click.UsageError(
+            "--offline needs the cache, it can't be used with --no-cache"
+        )
+
+    _cache_settings.update({"ttl": cache_ttl, "offline": offline})
     if not no_cache:
         load_git_cache()
 
@@ -290,26 +850,34 @@ def main(
     dependencies.update(get_dependencies())
     dependencies.update({dep.name: dep.version for dep in extra or []})
 
-    bump_pipfile_or_pyproject(PIPFILE, dependencies=dependencies)
-    bump_pipfile_or_pyproject(PYPROJECT_TOML, dependencies=dependencies)
-    bump_tox(dependencies=dependencies)
-    bump_packages(dependencies=dependencies)
+    plan = plan_bump(dependencies=dependencies)
+    show_plan(plan, diff=dry_run)
     dump_git_cache()
+    if dry_run:
+        return
+    apply_plan(plan)
 
     if sync:
-        pm = PackageManagerV1.from_dir(
-            Path.cwd() / PACKAGES, config_loader=load_configuration
+        manifest = HashManifest(_hash_manifest_file)
+        if not full_rehash:
+            manifest.load()
+        pm = StoredPackageManager.from_store(
+            Path.cwd() / PACKAGES,
+            store=PackageStore(_package_store, offline=offline),
+            manifest=manifest,
+            config_loader=load_configuration,
         )
         pm.sync(
             sources=[
-                f"{OPEN_AEA_REPO}:{_version_cache[OPEN_AEA_REPO]}",
-                f"{OPEN_AUTONOMY_REPO}:{_version_cache[OPEN_AUTONOMY_REPO]}",
+                f"{OPEN_AEA_REPO}:{get_latest_tag(OPEN_AEA_REPO)}",
+                f"{OPEN_AUTONOMY_REPO}:{get_latest_tag(OPEN_AUTONOMY_REPO)}",
                 *sources,
             ],
             update_packages=True,
         )
         pm.update_package_hashes()
         pm.dump()
+        dump_git_cache()
 
 
 if __name__ == "__main__":
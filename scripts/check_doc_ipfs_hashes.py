@@ -22,11 +22,33 @@
 """This module contains the tools for autoupdating ipfs hashes in the documentation."""
 
 import argparse
+import difflib
+import hashlib
 import itertools
+import json
+import mmap
+import os
+import queue
 import re
+import subprocess  # nosec
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import yaml
 from aea.cli.packages import get_package_manager
@@ -34,6 +56,17 @@ from aea.configurations.data_types import PackageId
 from aea.helpers.base import IPFS_HASH_REGEX, SIMPLE_ID_REGEX
 
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: nocover
+    from yaml import SafeLoader  # type: ignore
+
+try:
+    from watchdog import events as watchdog_events
+    from watchdog import observers as watchdog_observers
+except ImportError:  # pragma: nocover
+    watchdog_events = watchdog_observers = None  # type: ignore
+
 CLI_REGEX = r"(?P<cli>aea|autonomy)"
 # CMD_REGEX should be r"(?P<cmd>(\S+\s(\s--\S+)*)+)",
 # but python implementation differs from others and does not match it properly
@@ -50,17 +83,410 @@ AEA_COMMAND_REGEX = rf"(?P<full_cmd>{CLI_REGEX} {CMD_REGEX} (?:{VENDOR_REGEX}\/{
 FULL_PACKAGE_REGEX = rf"(?P<full_package>(?:{VENDOR_REGEX}\/{PACKAGE_REGEX}:{VERSION_REGEX}?:?)?(?P<hash>{IPFS_HASH_REGEX}))"
 PACKAGE_TABLE_REGEX = rf"\|\s*{PACKAGE_TYPE_REGEX}\/{VENDOR_REGEX}\/{PACKAGE_REGEX}\/{VERSION_REGEX}\s*\|\s*`(?P<hash>{IPFS_HASH_REGEX})`\s*\|"
 
+# Byte patterns of the command scanner, which anchors on the IPFS hashes
+# (capturing groups make the candidate search several times slower)
+HASH_CANDIDATE_PATTERN = re.compile(IPFS_HASH_REGEX.replace("(", "(?:").encode())
+PACKAGE_PREFIX_PATTERN = re.compile(
+    rf"{VENDOR_REGEX}\/{PACKAGE_REGEX}:{VERSION_REGEX}?:?".encode()
+)
+PACKAGE_REFERENCE_PATTERN = re.compile(
+    rf"{VENDOR_REGEX}\/{PACKAGE_REGEX}:{VERSION_REGEX}?:?\Z".encode()
+)
+CLI_NAMES = (b"aea ", b"autonomy ")
+MAX_PACKAGE_PREFIX = 512
+WHITESPACE = b" \t\n\r\f\v"
+
 ROOT_DIR = Path(__file__).parent.parent
 HASH_SKIPS = ()
-
-
-def read_file(filepath: str) -> str:
+PACKAGES_FILE = Path("packages", "packages.json")
+SCAN_CACHE_FILE = Path(".doc_ipfs_hashes_cache.json")
+SCAN_WORKERS = os.cpu_count() or 1
+SCAN_CHUNK_SIZE = 16
+WATCH_INTERVAL = 1.0
+WATCH_EVENTS = ("created", "deleted", "modified", "moved")
+
+# Python files under these directories are not checked
+PY_SKIP_DIRS = {
+    ".eggs",
+    ".git",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".tox",
+    ".venv",
+    "__pycache__",
+    "build",
+    "dist",
+    "env",
+    "node_modules",
+    "venv",
+}
+
+# Package versions, keyed by package hash
+VERSION_CACHE: Dict[str, Optional[str]] = {}
+
+
+def read_file(filepath: str, newline: Optional[str] = None) -> str:
     """Loads a file into a string"""
-    with open(filepath, "r", encoding="utf-8") as file_:
+    with open(filepath, "r", encoding="utf-8", newline=newline) as file_:
         file_str = file_.read()
     return file_str
 
 
+def get_digest(filepath: Path) -> str:
+    """Get the sha256 digest of a file's content"""
+    return hashlib.sha256(filepath.read_bytes()).hexdigest()
+
+
+def _parse_command(
+    data: Union[bytes, mmap.mmap], start: int, space: int, hash_match: re.Match
+) -> Optional[Tuple[int, int, Dict[str, Any]]]:
+    """Parse the command that ends with the given hash, searching its cli from start"""
+    clis = [(data.find(cli, start, space), cli) for cli in CLI_NAMES]
+    clis = [(cli_start, cli) for cli_start, cli in clis if cli_start != -1]
+    if not clis:
+        return None
+    cli_start, cli = min(clis)
+    cmd_start = cli_start + len(cli)
+
+    end = hash_match.end()
+    if (
+        data[end : end + 1]
+        and data[end] in WHITESPACE
+        and data[end + 1 : end + 3] == b"--"
+    ):
+        end = data.find(b"\n", end + 1)
+        end = len(data) if end == -1 else end
+
+    prefix = PACKAGE_PREFIX_PATTERN.fullmatch(data, space + 1, hash_match.start())
+    groups = {
+        "full_cmd": data[cli_start:end],
+        "cli": cli[:-1],
+        "cmd": data[cmd_start:space],
+        **(
+            prefix.groupdict()
+            if prefix
+            else {"vendor": None, "package": None, "version": None}
+        ),
+        "hash": hash_match.group(),
+        "flags": data[hash_match.end() : end],
+    }
+    return (
+        cli_start,
+        end,
+        {
+            key: value.decode("utf-8") if value is not None else None
+            for key, value in groups.items()
+        },
+    )
+
+
+def scan_commands(
+    data: Union[bytes, mmap.mmap]
+) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Find the autonomy/aea commands in a document in linear time.
+
+    This matches the same commands as AEA_COMMAND_REGEX without backtracking.
+    IPFS hashes are found first and kept when they are preceded by a space,
+    optionally followed by a vendor/package:version prefix. The rightmost such
+    hash of a line ends the command, which starts at the leftmost cli name
+    before it on the same line.
+
+    :param data: the document bytes
+    :yield: the byte span and the AEA_COMMAND_REGEX groups of every command
+    """
+    position = 0  # end of the last command
+    line_start = 0
+    previous = 0  # start of the last hash candidate
+    anchor = None  # the rightmost command hash of the line, and its space
+
+    for hash_match in HASH_CANDIDATE_PATTERN.finditer(data):
+        hash_start = hash_match.start()
+        newline = data.rfind(b"\n", previous, hash_start)
+        previous = hash_start
+        if newline != -1:
+            if anchor is not None:
+                command = _parse_command(data, max(line_start, position), *anchor)
+                if command:
+                    position = command[1]
+                    yield command
+                anchor = None
+            line_start = newline + 1
+        if hash_start < position:
+            continue
+
+        # The prefix can not contain spaces, so it starts after the last one
+        space = data.rfind(
+            b" ", max(line_start, position, hash_start - MAX_PACKAGE_PREFIX), hash_start
+        )
+        if space == -1:
+            continue
+        if space == hash_start - 1 or PACKAGE_PREFIX_PATTERN.fullmatch(
+            data, space + 1, hash_start
+        ):
+            anchor = (space, hash_match)
+
+    if anchor is not None:
+        command = _parse_command(data, max(line_start, position), *anchor)
+        if command:
+            yield command
+
+
+def scan_package_references(
+    data: Union[bytes, mmap.mmap]
+) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Find the vendor/package:version:hash references in a source file in linear time.
+
+    This anchors on the IPFS hashes like scan_commands. Unlike FULL_PACKAGE_REGEX,
+    bare hashes are not reported, as they are seldom package hashes in code.
+
+    :param data: the file bytes
+    :yield: the byte span and the FULL_PACKAGE_REGEX groups of every reference
+    """
+    position = 0  # end of the last reference
+    for hash_match in HASH_CANDIDATE_PATTERN.finditer(data):
+        hash_start = hash_match.start()
+        prefix = PACKAGE_REFERENCE_PATTERN.search(
+            data, max(position, hash_start - MAX_PACKAGE_PREFIX), hash_start
+        )
+        if prefix is None:
+            continue
+        position = hash_match.end()
+        groups = {
+            "full_package": data[prefix.start() : position],
+            **prefix.groupdict(),
+            "hash": hash_match.group(),
+        }
+        yield prefix.start(), position, {
+            key: value.decode("utf-8") if value is not None else None
+            for key, value in groups.items()
+        }
+
+
+def scan_file(
+    filepath: Path,
+    scan: Callable[
+        [Union[bytes, mmap.mmap]], Iterator[Tuple[int, int, Dict[str, Any]]]
+    ] = scan_commands,
+) -> List[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Get the character span and groups of every match in a file.
+
+    The file is memory-mapped and scanned as bytes. The spans refer to the
+    content as read with read_file(filepath, newline="").
+
+    :param filepath: path to the file
+    :param scan: the scanner, i.e. scan_commands or scan_package_references
+    :return: the matches
+    """
+    matches: List[Tuple[int, int, Dict[str, Any]]] = []
+    with open(filepath, "rb") as file_:
+        if os.fstat(file_.fileno()).st_size == 0:
+            return matches
+        with mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = chars = 0
+            for start, end, groups in scan(data):
+                chars += len(data[offset:start].decode("utf-8"))
+                offset = start
+                matches.append(
+                    (chars, chars + len(data[start:end].decode("utf-8")), groups)
+                )
+    return matches
+
+
+def scan_files(
+    filepaths: List[Path],
+    max_workers: int = SCAN_WORKERS,
+    scan: Callable[
+        [Union[bytes, mmap.mmap]], Iterator[Tuple[int, int, Dict[str, Any]]]
+    ] = scan_commands,
+) -> Iterator[Tuple[Path, List[Tuple[int, int, Dict[str, Any]]]]]:
+    """
+    Scan several files, in a process pool when there are enough of them.
+
+    :param filepaths: the files to scan
+    :param max_workers: maximum number of processes
+    :param scan: the scanner, i.e. scan_commands or scan_package_references
+    :yield: every file path along with its scan result, in order
+    """
+    scan_path = partial(scan_file, scan=scan)
+    if max_workers <= 1 or len(filepaths) <= SCAN_CHUNK_SIZE:
+        yield from zip(filepaths, map(scan_path, filepaths))
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from zip(
+            filepaths, executor.map(scan_path, filepaths, chunksize=SCAN_CHUNK_SIZE)
+        )
+
+
+def is_package_file(path: Path) -> bool:
+    """Whether a file belongs to a package, so fixing it would change the package hash"""
+    return PACKAGES_FILE.parent.resolve() in path.resolve().parents
+
+
+def find_python_files(paths: List[Path]) -> List[Path]:
+    """
+    Find the Python files to check under some paths.
+
+    Files ignored by git are left out when the paths are in a git repository,
+    and so are the files under PY_SKIP_DIRS.
+
+    :param paths: the paths to search
+    :return: the Python files, sorted
+    """
+    if not paths:
+        return []
+    try:
+        output = subprocess.run(  # nosec
+            ["git", "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+            + ["--"]
+            + [str(path) for path in paths],
+            check=True,
+            capture_output=True,
+        ).stdout
+        py_files = [Path(f) for f in output.decode().split("\0") if f.endswith(".py")]
+    except (OSError, subprocess.CalledProcessError):
+        py_files = []
+        for path in paths:
+            for root, dirs, filenames in os.walk(path):
+                dirs[:] = [
+                    d
+                    for d in dirs
+                    if d not in PY_SKIP_DIRS and not d.endswith(".egg-info")
+                ]
+                py_files += [Path(root, f) for f in filenames if f.endswith(".py")]
+    return sorted(
+        py_file
+        for py_file in py_files
+        if not PY_SKIP_DIRS.intersection(py_file.parts) and py_file.is_file()
+    )
+
+
+class ScanCache:
+    """
+    Remembers the files that passed the check.
+
+    Entries are keyed by the file content digest and are only valid for the
+    packages.json digest they were checked against.
+    """
+
+    def __init__(self, path: Optional[Path], packages_digest: str) -> None:
+        """
+        Constructor
+
+        :param path: path to the cache file, or None to disable the cache
+        :param packages_digest: the current packages.json digest
+        """
+        self.path = path
+        self.packages_digest = packages_digest
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.new_files: Dict[str, Dict[str, Any]] = {}
+        if path is None or not path.is_file():
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError:
+            return
+        if data.get("packages_digest") == packages_digest:
+            self.files = data.get("files", {})
+
+    def get_matches(self, filepath: Path, digest: str) -> Optional[int]:
+        """Get the number of commands in a file that passed the check, if its content has not changed"""
+        entry = self.files.get(str(filepath))
+        if entry is None or entry["digest"] != digest:
+            return None
+        self.new_files[str(filepath)] = entry
+        return entry["matches"]
+
+    def add(self, filepath: Path, digest: str, matches: int) -> None:
+        """Remember a file that passed the check"""
+        self.new_files[str(filepath)] = {"digest": digest, "matches": matches}
+
+    def save(self) -> None:
+        """Save the files that passed the check in this run"""
+        if self.path is None:
+            return
+        self.path.write_text(
+            json.dumps(
+                {"packages_digest": self.packages_digest, "files": self.new_files},
+                indent=4,
+            ),
+            encoding="utf-8",
+        )
+
+
+def write_file(filepath: str, content: str) -> None:
+    """Atomically replace a file's content through a temporary file in the same directory"""
+    directory, filename = os.path.split(os.path.abspath(filepath))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{filename}.", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as file_:
+            file_.write(content)
+        os.chmod(temp_path, os.stat(filepath).st_mode)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def apply_edits(content: str, edits: Sequence[Tuple[int, int, str]]) -> str:
+    """
+    Apply span replacements to a string in a single pass.
+
+    :param content: the original string
+    :param edits: non-overlapping (start, end, replacement) spans over the original string
+    :return: the edited string
+    """
+    parts = []
+    position = 0
+    for start, end, replacement in sorted(edits):
+        parts += [content[position:start], replacement]
+        position = end
+    parts.append(content[position:])
+    return "".join(parts)
+
+
+def fix_file(
+    filepath: str,
+    content: str,
+    edits: Sequence[Tuple[int, int, str]],
+    dry_run: bool = False,
+) -> None:
+    """
+    Write all the fixes of a file at once, or print them as a diff.
+
+    :param filepath: path to the file
+    :param content: the file content the edit spans refer to
+    :param edits: the (start, end, replacement) spans
+    :param dry_run: print a unified diff instead of writing the file
+    """
+    new_content = apply_edits(content, edits)
+    if new_content == content:
+        return
+    if dry_run:
+        sys.stdout.writelines(
+            difflib.unified_diff(
+                content.splitlines(keepends=True),
+                new_content.splitlines(keepends=True),
+                fromfile=filepath,
+                tofile=filepath,
+            )
+        )
+        return
+    write_file(filepath, new_content)
+    print(f"Fixed {len(edits)} IPFS hash(es) in file {filepath}")
+
+
+def read_version(yaml_file_path: Path) -> Optional[str]:
+    """Read the version of a package from its configuration"""
+    with open(yaml_file_path, "r", encoding="utf-8") as file:
+        for resource in yaml.load_all(file, Loader=SafeLoader):
+            if "version" in resource:
+                return resource["version"]
+    return None
+
+
 def get_packages() -> Dict[str, str]:
     """Get packages."""
     data = get_package_manager(Path("packages").relative_to(".")).json
@@ -80,6 +506,7 @@ class Package:  # pylint: disable=too-few-public-methods
         self.type = self.package_id.package_type.to_plural()
         self.name = self.package_id.name
         self.hash = package_hash
+        self.yaml_file_path: Optional[Path] = None
 
         if self.name == "scaffold":
             return
@@ -101,8 +528,7 @@ class Package:  # pylint: disable=too-few-public-methods
             )
         self.type = self.type[:-1]  # remove last s
 
-        self.last_version = None
-        yaml_file_path = Path(
+        self.yaml_file_path = Path(
             ROOT_DIR,
             "packages",
             self.vendor,
@@ -110,12 +536,15 @@ class Package:  # pylint: disable=too-few-public-methods
             self.name,
             f"{'aea-config' if self.type == 'agent' else self.type}.yaml",
         )
-        with open(yaml_file_path, "r", encoding="utf-8") as file:
-            content = yaml.load_all(file, Loader=yaml.FullLoader)
-            for resource in content:
-                if "version" in resource:
-                    self.last_version = resource["version"]
-                    break
+
+    @property
+    def last_version(self) -> Optional[str]:
+        """Get the package version, which is only read once a doc references the package"""
+        if self.yaml_file_path is None:
+            return None
+        if self.hash not in VERSION_CACHE:
+            VERSION_CACHE[self.hash] = read_version(self.yaml_file_path)
+        return VERSION_CACHE[self.hash]
 
     def get_command(
         self, cmd: str, include_version: bool = True, flags: str = ""
@@ -149,16 +578,31 @@ class PackageHashManager:
             self.package_tree[p.vendor][p.type].setdefault(p.name, p)
             assert re.match(IPFS_HASH_REGEX, p.hash)  # detect wrong regexes
 
+        # Indexes so that every lookup is a single dict access
+        hash_to_packages: Dict[str, List[Package]] = {}
+        self.name_to_types: Dict[Tuple[str, str], List[str]] = {}
+        for p in self.packages:
+            hash_to_packages.setdefault(p.hash, []).append(p)
+            package_types = self.name_to_types.setdefault((p.vendor, p.name), [])
+            if p.type not in package_types:
+                package_types.append(p.type)
+        self.hash_to_package = {
+            package_hash: packages[0]
+            for package_hash, packages in hash_to_packages.items()
+        }
+        self.duplicate_hashes = {
+            package_hash: packages
+            for package_hash, packages in hash_to_packages.items()
+            if len(packages) > 1
+        }
+
     def get_package_by_hash(self, package_hash: str) -> Optional[Package]:
         """Get a package given its hash"""
-        packages = list(filter(lambda p: p.hash == package_hash, self.packages))
-        if not packages:
-            return None
-        if len(packages) > 1:
+        if package_hash in self.duplicate_hashes:
             raise ValueError(
                 f"PackageHashManager: hash search for {package_hash} returned more than 1 result in packages.json"
             )
-        return packages[0]
+        return self.hash_to_package.get(package_hash)
 
     def get_hash_by_package_line(
         self, package_line: str, target_file: str
@@ -196,10 +640,11 @@ class PackageHashManager:
             # Complete command, succesfully retrieved or complete packages
 
             # Guess the package type (agent, service, contract...). First try to find the package in the package_tree
-            potential_package_types = []
-            for package_type, packages in self.package_tree[d["vendor"]].items():
-                if d["package"] in packages.keys():
-                    potential_package_types.append(package_type)
+            if d["vendor"] not in self.package_tree:
+                raise KeyError(d["vendor"])
+            potential_package_types = self.name_to_types.get(
+                (d["vendor"], d["package"]), []
+            )
 
             # If only 1 match has been found we can be sure about the package type
             if len(potential_package_types) == 1:
@@ -243,73 +688,306 @@ class PackageHashManager:
         return self.package_tree[vendor][package_type][package_name].hash
 
 
-def check_ipfs_hashes(  # pylint: disable=too-many-locals,too-many-statements
-    paths: Optional[List[Path]] = None, fix: bool = False
+def check_doc(  # pylint: disable=too-many-locals
+    package_manager: PackageHashManager,
+    md_file: Path,
+    file_matches: List[Tuple[int, int, Dict[str, Any]]],
+    fix: bool = False,
+    dry_run: bool = False,
+) -> Tuple[bool, bool, Dict[str, str]]:
+    """
+    Check, and optionally fix, the commands found in a doc.
+
+    :param package_manager: the package hash manager
+    :param md_file: path to the doc
+    :param file_matches: the commands found in the doc by scan_file
+    :param fix: whether to fix the mismatching hashes
+    :param dry_run: print the fixes as a diff instead of writing them
+    :return: whether there were errors and mismatches, and the fixed hashes
+    """
+    errors = False
+    hash_mismatches = False
+    old_to_new_hashes = {}
+    edits = []
+    for start, end, match in file_matches:
+        doc_full_cmd = match["full_cmd"]
+        doc_cmd = match["cmd"]
+        doc_hash = match["hash"]
+        flags = match["flags"]
+
+        if doc_hash in HASH_SKIPS:
+            continue
+
+        expected_hash = package_manager.get_hash_by_package_line(
+            doc_full_cmd, str(md_file)
+        )
+        if not expected_hash:
+            errors = True
+            continue
+        expected_package = package_manager.get_package_by_hash(expected_hash)
+        if not expected_package:
+            errors = True
+            continue
+
+        new_command = expected_package.get_command(cmd=doc_cmd, flags=flags)
+
+        # Overwrite with new hash
+        if doc_hash == expected_hash:
+            continue
+
+        hash_mismatches = True
+
+        if fix:
+            edits.append((start, end, new_command))
+            old_to_new_hashes[doc_hash] = expected_hash
+        else:
+            print(
+                f"IPFS hash mismatch in doc file {md_file}.\n"
+                f"\tCommand string: {doc_full_cmd}\n"
+                f"\tExpected: {expected_hash}\n"
+                f"\tFound: {doc_hash}\n"
+            )
+
+    if edits:
+        content = read_file(str(md_file), newline="")
+        fix_file(str(md_file), content, edits, dry_run)
+
+    return errors, hash_mismatches, old_to_new_hashes
+
+
+class DocWatcher:
+    """
+    Re-checks the docs as they change.
+
+    The package index is kept in memory along with the hashes that every doc
+    references, so that a packages.json change only re-checks the docs that
+    reference a changed hash.
+
+    Changes are picked up through filesystem notifications when the optional
+    `watchdog` package is installed, and by polling the files otherwise.
+    """
+
+    def __init__(
+        self,
+        paths: List[Path],
+        fix: bool = False,
+        dry_run: bool = False,
+        interval: float = WATCH_INTERVAL,
+    ) -> None:
+        """
+        Constructor
+
+        :param paths: the doc directories
+        :param fix: whether to fix the mismatching hashes
+        :param dry_run: print the fixes as a diff instead of writing them
+        :param interval: seconds between checks for changes when polling, and to gather the events of a change
+        """
+        self.paths = [path.resolve() for path in paths]
+        self.packages_file = PACKAGES_FILE.resolve()
+        self.fix = fix
+        self.dry_run = dry_run
+        self.interval = interval
+        self.package_manager = PackageHashManager()
+        self.doc_hashes: Dict[Path, Set[str]] = {}
+        self.hash_to_docs: Dict[str, Set[Path]] = {}
+
+    def find_docs(self) -> List[Path]:
+        """Find the docs under the watched paths"""
+        return sorted(
+            itertools.chain.from_iterable(path.rglob("*.md") for path in self.paths)
+        )
+
+    def is_doc(self, path: Path) -> bool:
+        """Whether a path is a doc under the watched paths"""
+        return path.suffix == ".md" and any(
+            watched in path.parents for watched in self.paths
+        )
+
+    def forget(self, md_file: Path) -> None:
+        """Remove a doc from the reverse index"""
+        for doc_hash in self.doc_hashes.pop(md_file, set()):
+            self.hash_to_docs[doc_hash].discard(md_file)
+            if not self.hash_to_docs[doc_hash]:
+                del self.hash_to_docs[doc_hash]
+
+    def check(self, md_file: Path) -> None:
+        """Check a doc and index the hashes it references"""
+        self.forget(md_file)
+        if not md_file.is_file():
+            return
+        file_matches = scan_file(md_file)
+        self.doc_hashes[md_file] = {match["hash"] for _, _, match in file_matches}
+        for doc_hash in self.doc_hashes[md_file]:
+            self.hash_to_docs.setdefault(doc_hash, set()).add(md_file)
+
+        try:
+            errors, hash_mismatches, _ = check_doc(
+                self.package_manager, md_file, file_matches, self.fix, self.dry_run
+            )
+        except ValueError as e:
+            print(e)
+            errors, hash_mismatches = True, False
+        status = "errors" if errors else "mismatches" if hash_mismatches else "ok"
+        print(f"[{time.strftime('%H:%M:%S')}] {md_file}: {status}")
+
+    def reload_packages(self) -> None:
+        """Rebuild the package index and re-check the docs that reference changed hashes"""
+        old_hashes = set(self.package_manager.hash_to_package)
+        try:
+            self.package_manager = PackageHashManager()
+        except (OSError, ValueError) as e:
+            print(f"Could not reload {PACKAGES_FILE}: {e}")
+            return
+        changed_hashes = old_hashes ^ set(self.package_manager.hash_to_package)
+        md_files = set(
+            itertools.chain.from_iterable(
+                self.hash_to_docs.get(changed_hash, ())
+                for changed_hash in changed_hashes
+            )
+        )
+        print(
+            f"{PACKAGES_FILE} changed: {len(changed_hashes)} hashes, re-checking {len(md_files)} docs"
+        )
+        for md_file in sorted(md_files):
+            self.check(md_file)
+
+    def on_change(self, path: Path) -> None:
+        """Handle a changed path"""
+        if path == self.packages_file:
+            self.reload_packages()
+        elif self.is_doc(path):
+            self.check(path)
+
+    def _get_state(self) -> Dict[Path, Tuple[int, int]]:
+        """Get the modification time and size of the docs and packages.json"""
+        state = {}
+        for path in self.find_docs() + [self.packages_file]:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def poll(self) -> None:
+        """Check for changes every interval"""
+        state = self._get_state()
+        while True:
+            time.sleep(self.interval)
+            new_state = self._get_state()
+            for path in sorted(set(state) | set(new_state)):
+                if state.get(path) != new_state.get(path):
+                    self.on_change(path)
+            state = new_state
+
+    def observe(self) -> None:
+        """Handle the filesystem change notifications"""
+        changes: "queue.Queue[Path]" = queue.Queue()
+
+        class Handler(  # pylint: disable=too-few-public-methods
+            watchdog_events.FileSystemEventHandler
+        ):
+            """Forwards the changed paths to the watcher thread"""
+
+            def on_any_event(self, event: Any) -> None:
+                """Queue the paths of an event"""
+                # Reading a doc to check it also triggers events
+                if event.event_type not in WATCH_EVENTS:
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        changes.put(Path(os.fsdecode(path)).resolve())
+
+        observer = watchdog_observers.Observer()
+        for path in self.paths:
+            observer.schedule(Handler(), str(path), recursive=True)
+        observer.schedule(Handler(), str(self.packages_file.parent))
+        observer.start()
+        try:
+            while True:
+                # Editors write a file in several steps, so all the events of
+                # a change are gathered before handling it once
+                changed = {changes.get()}
+                time.sleep(self.interval)
+                while not changes.empty():
+                    changed.add(changes.get())
+                for path in sorted(changed):
+                    self.on_change(path)
+        finally:
+            observer.stop()
+            observer.join()
+
+    def run(self) -> None:
+        """Check every doc, then keep re-checking them as they change"""
+        for md_file in self.find_docs():
+            self.check(md_file)
+        print("Watching for changes...")
+        if watchdog_observers is None:
+            self.poll()
+        else:
+            self.observe()
+
+
+def check_ipfs_hashes(  # pylint: disable=too-many-locals,too-many-statements,too-many-branches,too-many-arguments
+    paths: Optional[List[Path]] = None,
+    fix: bool = False,
+    dry_run: bool = False,
+    use_cache: bool = True,
+    max_workers: int = SCAN_WORKERS,
+    py_paths: Optional[List[Path]] = None,
 ) -> None:
     """Fix ipfs hashes in the docs"""
 
     if paths is None:
         paths = [Path("docs")]
 
+    if py_paths is None:
+        py_paths = []
+
     all_md_files = itertools.chain.from_iterable([path.rglob("*.md") for path in paths])
     errors = False
     hash_mismatches = False
-    old_to_new_hashes = {}
+    old_to_new_hashes: Dict[str, str] = {}
     package_manager = PackageHashManager()
     matches = 0
 
-    # Fix full commands in docs
+    # Docs that passed the check against the same packages.json are skipped
+    scan_cache = ScanCache(
+        SCAN_CACHE_FILE if use_cache else None, get_digest(PACKAGES_FILE)
+    )
+    md_file_digests = {}
     for md_file in all_md_files:
-        content = read_file(str(md_file))
-        for match in [m.groupdict() for m in re.finditer(AEA_COMMAND_REGEX, content)]:
-            matches += 1
-            doc_full_cmd = match["full_cmd"]
-            doc_cmd = match["cmd"]
-            doc_hash = match["hash"]
-            flags = match["flags"]
-
-            if doc_hash in HASH_SKIPS:
-                continue
-
-            expected_hash = package_manager.get_hash_by_package_line(
-                doc_full_cmd, str(md_file)
-            )
-            if not expected_hash:
-                errors = True
-                continue
-            expected_package = package_manager.get_package_by_hash(expected_hash)
-            if not expected_package:
-                errors = True
-                continue
-
-            new_command = expected_package.get_command(cmd=doc_cmd, flags=flags)
-
-            # Overwrite with new hash
-            if doc_hash == expected_hash:
-                continue
-
-            hash_mismatches = True
+        digest = get_digest(md_file)
+        cached_matches = scan_cache.get_matches(md_file, digest)
+        if cached_matches is None:
+            md_file_digests[md_file] = digest
+        else:
+            matches += cached_matches
+    py_file_digests = {}
+    for py_file in find_python_files(py_paths):
+        digest = get_digest(py_file)
+        if scan_cache.get_matches(py_file, digest) is None:
+            py_file_digests[py_file] = digest
 
-            if fix:
-                content = content.replace(doc_full_cmd, new_command)
-
-                with open(str(md_file), "w", encoding="utf-8") as qs_file:
-                    qs_file.write(content)
-                print(f"Fixed an IPFS hash in doc file {md_file}")
-                old_to_new_hashes[doc_hash] = expected_hash
-            else:
-                print(
-                    f"IPFS hash mismatch in doc file {md_file}.\n"
-                    f"\tCommand string: {doc_full_cmd}\n"
-                    f"\tExpected: {expected_hash}\n"
-                    f"\tFound: {doc_hash}\n"
-                )
+    # Fix full commands in docs
+    for md_file, file_matches in scan_files(list(md_file_digests), max_workers):
+        matches += len(file_matches)
+        doc_errors, doc_mismatches, doc_old_to_new_hashes = check_doc(
+            package_manager, md_file, file_matches, fix, dry_run
+        )
+        errors = errors or doc_errors
+        hash_mismatches = hash_mismatches or doc_mismatches
+        old_to_new_hashes.update(doc_old_to_new_hashes)
+        if not doc_errors and not doc_mismatches:
+            scan_cache.add(md_file, md_file_digests[md_file], len(file_matches))
 
     # Fix packages in python files
-    all_py_files: List[str] = []
-    for py_file in all_py_files:
-        content = read_file(str(py_file))
-        for match in [m.groupdict() for m in re.finditer(FULL_PACKAGE_REGEX, content)]:
+    for py_file, file_matches in scan_files(
+        list(py_file_digests), max_workers, scan_package_references
+    ):
+        edits = []
+        passed = True
+        for start, end, match in file_matches:
             full_package = match["full_package"]
             py_hash = match["hash"]
             expected_hash = package_manager.get_hash_by_package_line(
@@ -317,10 +995,12 @@ def check_ipfs_hashes(  # pylint: disable=too-many-locals,too-many-statements
             )
             if not expected_hash:
                 errors = True
+                passed = False
                 continue
             expected_package = package_manager.get_package_by_hash(expected_hash)
             if not expected_package:
                 errors = True
+                passed = False
                 continue
 
             new_package = (":").join(full_package.split(":")[:-1] + [expected_hash])
@@ -330,13 +1010,17 @@ def check_ipfs_hashes(  # pylint: disable=too-many-locals,too-many-statements
                 continue
 
             hash_mismatches = True
+            passed = False
 
-            if fix:
-                content = content.replace(full_package, new_package)
-
-                with open(str(py_file), "w", encoding="utf-8") as qs_file:
-                    qs_file.write(content)
-                print(f"Fixed an IPFS hash in doc file {py_file}")
+            if fix and is_package_file(py_file):
+                errors = True
+                print(
+                    f"[{py_file}]: IPFS hash mismatch in package {full_package}. "
+                    f"Can't fix it because it would change the hash of the package "
+                    f"the file belongs to. Expected: {expected_hash}"
+                )
+            elif fix:
+                edits.append((start, end, new_package))
                 old_to_new_hashes[py_hash] = expected_hash
             else:
                 print(
@@ -346,6 +1030,14 @@ def check_ipfs_hashes(  # pylint: disable=too-many-locals,too-many-statements
                     f"\tFound: {py_hash}:\n"
                 )
 
+        if edits:
+            content = read_file(str(py_file), newline="")
+            fix_file(str(py_file), content, edits, dry_run)
+        elif passed:
+            scan_cache.add(py_file, py_file_digests[py_file], len(file_matches))
+
+    scan_cache.save()
+
     if fix and errors:
         raise ValueError(
             "There were some errors while fixing IPFS hashes. Check the logs."
@@ -368,6 +1060,50 @@ if __name__ == "__main__":
     print("Start checking doc IPFS hashes.")
     parser = argparse.ArgumentParser()
     parser.add_argument("--fix", action="store_true")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With --fix, print the fixes as a diff instead of writing them",
+    )
     parser.add_argument("-p", "--paths", type=Path, nargs="*", default=[Path("docs")])
+    parser.add_argument(
+        "--py-paths",
+        type=Path,
+        nargs="*",
+        default=[],
+        help=(
+            "Paths to the Python files whose package references are checked, "
+            "i.e. packages. Files of packages are only checked, never fixed."
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Keep re-checking the docs as they or packages.json change, "
+            "through filesystem notifications if watchdog is installed"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Check every doc, even those that passed the check before",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=SCAN_WORKERS, help="Number of scan processes"
+    )
     args = parser.parse_args()
-    check_ipfs_hashes(paths=args.paths, fix=args.fix)
+    if args.watch:
+        try:
+            DocWatcher(args.paths, fix=args.fix, dry_run=args.dry_run).run()
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    check_ipfs_hashes(
+        paths=args.paths,
+        fix=args.fix,
+        dry_run=args.dry_run,
+        use_cache=not args.no_cache,
+        max_workers=args.jobs,
+        py_paths=args.py_paths,
+    )
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""
+Compute the IPFS CIDs of files locally, and check the tier images and mints against them.
+
+CIDs are computed the way `ipfs add --cid-version=1 --raw-leaves=false` does,
+i.e. the files are split in 256KiB chunks laid out in a balanced dag-pb tree,
+so no IPFS node or gateway is needed. Run it from the repository root:
+
+    python -m scripts.check_image_cids cid mints/01.png
+    python -m scripts.check_image_cids verify --tier-images path/to/tiers
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from scripts.contribute_verify import TierResolver
+
+
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+CID_WORKERS = os.cpu_count() or 1
+CID_CHUNK_SIZE = 4
+MINTS_DIR = Path("mints")
+IPFS_PREFIX = "ipfs://"
+
+# Multicodec prefixes of a CIDv1 with a dag-pb sha2-256 multihash
+CID_V1_DAG_PB = b"\x01\x70"
+SHA256_MULTIHASH = b"\x12\x20"
+
+# The multihash, cumulative size and file size of a dag node
+DagNode = Tuple[bytes, int, int]
+
+
+def _varint(value: int) -> bytes:
+    """Encode an unsigned protobuf varint"""
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _int_field(number: int, value: int) -> bytes:
+    """Encode a protobuf varint field"""
+    return _varint(number << 3) + _varint(value)
+
+
+def _bytes_field(number: int, value: bytes) -> bytes:
+    """Encode a protobuf length delimited field"""
+    return _varint(number << 3 | 2) + _varint(len(value)) + value
+
+
+def _unixfs_file(data: bytes, filesize: int, blocksizes: Sequence[int] = ()) -> bytes:
+    """Encode the UnixFS data of a file node"""
+    return (
+        _int_field(1, 2)  # Type: File
+        + (_bytes_field(2, data) if data else b"")
+        + _int_field(3, filesize)
+        + b"".join(_int_field(4, blocksize) for blocksize in blocksizes)
+    )
+
+
+def _block(data: bytes, links: Sequence[DagNode] = ()) -> bytes:
+    """Encode a dag-pb block, whose links come before its data"""
+    return b"".join(
+        _bytes_field(
+            2,
+            _bytes_field(1, multihash) + _bytes_field(2, b"") + _int_field(3, tsize),
+        )
+        for multihash, tsize, _ in links
+    ) + _bytes_field(1, data)
+
+
+def _node(data: bytes, links: Sequence[DagNode] = (), filesize: int = 0) -> DagNode:
+    """Hash a block into a dag node"""
+    block = _block(data, links)
+    return (
+        SHA256_MULTIHASH + hashlib.sha256(block).digest(),
+        len(block) + sum(tsize for _, tsize, _ in links),
+        filesize,
+    )
+
+
+def leaf_node(chunk: bytes) -> DagNode:
+    """Build the dag node of a file chunk"""
+    return _node(_unixfs_file(chunk, len(chunk)), filesize=len(chunk))
+
+
+def parent_node(children: Sequence[DagNode]) -> DagNode:
+    """Build the dag node that links some file nodes"""
+    blocksizes = [filesize for *_, filesize in children]
+    return _node(
+        _unixfs_file(b"", sum(blocksizes), blocksizes),
+        links=children,
+        filesize=sum(blocksizes),
+    )
+
+
+class BalancedDag:
+    """
+    Builds a balanced file dag as its chunks come in.
+
+    Every level keeps the nodes that are not linked by a parent yet, and a
+    parent is built as soon as a level has MAX_LINKS of them, so only a few
+    nodes per level are in memory at any time.
+    """
+
+    def __init__(self) -> None:
+        """Constructor"""
+        self.levels: List[List[DagNode]] = [[]]
+
+    def add(self, node: DagNode, level: int = 0) -> None:
+        """Add a node to a level"""
+        if level == len(self.levels):
+            self.levels.append([])
+        self.levels[level].append(node)
+        if len(self.levels[level]) == MAX_LINKS:
+            self.add(parent_node(self.levels[level]), level + 1)
+            self.levels[level] = []
+
+    def root(self) -> DagNode:
+        """Link the remaining nodes up to the root"""
+        for level, nodes in enumerate(self.levels):
+            if level == len(self.levels) - 1 and len(nodes) == 1:
+                return nodes[0]
+            if nodes:
+                self.add(parent_node(nodes), level + 1)
+                self.levels[level] = []
+        return leaf_node(b"")
+
+
+def to_cid(multihash: bytes) -> str:
+    """Encode a dag-pb multihash as a base32 CIDv1"""
+    encoded = base64.b32encode(CID_V1_DAG_PB + multihash).decode()
+    return "b" + encoded.lower().rstrip("=")
+
+
+def file_cid(filepath: Path) -> str:
+    """
+    Compute the CID of a file.
+
+    The file is memory mapped and hashed one chunk at a time.
+
+    :param filepath: the file path
+    :return: the base32 CIDv1
+    """
+    dag = BalancedDag()
+    with open(filepath, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset in range(0, size, CHUNK_SIZE):
+                    dag.add(leaf_node(data[offset : offset + CHUNK_SIZE]))
+    multihash, *_ = dag.root()
+    return to_cid(multihash)
+
+
+def file_cids(
+    filepaths: List[Path], max_workers: int = CID_WORKERS
+) -> Iterator[Tuple[Path, str]]:
+    """
+    Compute the CIDs of several files, in a process pool when there are enough of them.
+
+    :param filepaths: the file paths
+    :param max_workers: maximum number of processes
+    :yield: every file path along with its CID, in order
+    """
+    if max_workers <= 1 or len(filepaths) <= CID_CHUNK_SIZE:
+        yield from zip(filepaths, map(file_cid, filepaths))
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from zip(
+            filepaths, executor.map(file_cid, filepaths, chunksize=CID_CHUNK_SIZE)
+        )
+
+
+def find_files(paths: Sequence[Path]) -> List[Path]:
+    """Find the files under some paths, sorted"""
+    filepaths: List[Path] = []
+    for path in paths:
+        if path.is_dir():
+            filepaths.extend(p for p in path.rglob("*") if p.is_file())
+        else:
+            filepaths.append(path)
+    return sorted(filepaths)
+
+
+def check_tier_images(
+    tiers: TierResolver, paths: Sequence[Path], max_workers: int = CID_WORKERS
+) -> int:
+    """
+    Check that every tier image hash is the CID of one of the given images.
+
+    :param tiers: the points to image hash resolver
+    :param paths: the tier image files or directories
+    :param max_workers: maximum number of processes
+    :return: the number of errors
+    """
+    cid_to_file: Dict[str, Path] = {}
+    for filepath, cid in file_cids(find_files(paths), max_workers):
+        cid_to_file.setdefault(cid, filepath)
+
+    errors = 0
+    for threshold, image_hash in zip(tiers.thresholds, tiers.image_hashes):
+        image_path = cid_to_file.pop(image_hash, None)
+        if image_path is None:
+            print(f"No image matches tier {threshold}, {image_hash}")
+            errors += 1
+            continue
+        print(f"Tier {threshold} matches {image_path}")
+
+    for cid, filepath in cid_to_file.items():
+        print(f"{filepath} is not a tier image, its CID is {cid}")
+    return errors
+
+
+def find_mint_image(metadata_path: Path) -> Optional[Path]:
+    """Find the image of a mint's metadata, i.e. 01.png for 01.json"""
+    return next(
+        (
+            path
+            for path in sorted(metadata_path.parent.glob(f"{metadata_path.stem}.*"))
+            if path != metadata_path
+        ),
+        None,
+    )
+
+
+def check_mints(mints_dir: Path, max_workers: int = CID_WORKERS) -> int:
+    """
+    Check the image CID in every mint metadata against the image next to it.
+
+    :param mints_dir: the directory with the metadata and images of the mints
+    :param max_workers: maximum number of processes
+    :return: the number of errors
+    """
+    errors = 0
+    expected: Dict[Path, Tuple[Path, str]] = {}
+    for metadata_path in sorted(mints_dir.glob("*.json")):
+        image = json.loads(metadata_path.read_text(encoding="utf-8")).get("image", "")
+        image_path = find_mint_image(metadata_path)
+        if not image.startswith(IPFS_PREFIX) or image_path is None:
+            print(f"{metadata_path} has no ipfs image, or the image is missing")
+            errors += 1
+            continue
+        expected[image_path] = (metadata_path, image[len(IPFS_PREFIX) :])
+
+    for image_path, cid in file_cids(list(expected), max_workers):
+        metadata_path, expected_cid = expected[image_path]
+        if cid != expected_cid:
+            print(
+                f"{image_path} does not match {metadata_path}: expected {expected_cid}, got {cid}"
+            )
+            errors += 1
+            continue
+        print(f"{image_path} matches {metadata_path}")
+    return errors
+
+
+def main() -> None:
+    """Run the script"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=CID_WORKERS, help="Number of processes"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    cid_parser = commands.add_parser("cid", help="Print the CIDs of some files")
+    cid_parser.add_argument("paths", type=Path, nargs="+")
+    verify_parser = commands.add_parser(
+        "verify", help="Check the tier images and mints against their CIDs"
+    )
+    verify_parser.add_argument(
+        "--tier-images",
+        type=Path,
+        nargs="*",
+        default=[],
+        help="Tier image files or directories",
+    )
+    verify_parser.add_argument("--mints", type=Path, default=MINTS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "cid":
+        for filepath, cid in file_cids(find_files(args.paths), args.jobs):
+            print(f"{cid}  {filepath}")
+        return
+
+    errors = check_mints(args.mints, args.jobs)
+    if args.tier_images:
+        errors += check_tier_images(
+            TierResolver.from_service_config(), args.tier_images, args.jobs
+        )
+    if errors:
+        print(f"Found {errors} mismatched CIDs")
+        sys.exit(1)
+    print("All the CIDs match")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,20 +20,84 @@
 
 """This module contains tools for verifying the service behaviour."""
 
+import argparse
+import bisect
+import csv
+import itertools
 import json
 import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 import requests
+import yaml
+from eth_abi import decode, encode
+from eth_typing import HexStr
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from web3 import Web3
+from web3.contract import Contract
+from web3.exceptions import Web3Exception
 
 
-CONFIG = {
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None  # type: ignore
+
+
+STORE_FILE = "contribute_verify.db"  # nosec
+
+# Seconds before the data from each source is considered stale
+DEFAULT_TTL = {
+    "mints": 60,
+    "points": 600,
+    "images": 3600,
+}
+
+LEADERBOARD_BASE_ENDPOINT = "https://sheets.googleapis.com/v4/spreadsheets"
+# values:batchGet responses have no validators, so whether the sheet changed is
+# told by its Drive modification time
+LEADERBOARD_DRIVE_ENDPOINT = "https://www.googleapis.com/drive/v3/files"
+
+CONFIG: Dict[str, Dict[str, Any]] = {
     "prod": {
         "dynamic_contribution_contract_address": "0x02c26437b292d86c5f4f21bbcce0771948274f84",
         "earliest_block_to_monitor": 16097553,
         "latest_block_to_monitor": "latest",
+        "confirmation_depth": 12,
+        "ttl": DEFAULT_TTL,
         "infura_url": f"https://mainnet.infura.io/v3/{os.environ.get('INFURA_API_KEY')}",
         "abi_file_path": Path(
             "packages",
@@ -44,8 +108,9 @@ CONFIG = {
             "DynamicContribution.json",
         ),
         "leaderboard_sheet_id": "1y-N033k42sacqOkeHT53QPCd-pFtQEfeXiOCgEUDddw",
-        "leaderboard_points_range": "Ranking!B2:C302",
-        "leaderboard_layers_range": "Layers!B1:Z3",
+        "leaderboard_base_endpoint": LEADERBOARD_BASE_ENDPOINT,
+        "leaderboard_drive_endpoint": LEADERBOARD_DRIVE_ENDPOINT,
+        "leaderboard_points_range": "Ranking!B2:C",
         "leaderboard_api_key": os.environ.get("LEADERBOARD_API_KEY"),
         "service_endpoint": "https://pfp.autonolas.tech",
     },
@@ -53,6 +118,8 @@ CONFIG = {
         "dynamic_contribution_contract_address": "0x7c3b976434fae9986050b26089649d9f63314bd8",
         "earliest_block_to_monitor": 8053690,
         "latest_block_to_monitor": "latest",
+        "confirmation_depth": 12,
+        "ttl": DEFAULT_TTL,
         "infura_url": f"https://goerli.infura.io/v3/{os.environ.get('INFURA_API_KEY')}",
         "abi_file_path": Path(
             "packages",
@@ -63,13 +130,20 @@ CONFIG = {
             "DynamicContribution.json",
         ),
         "leaderboard_sheet_id": "12p7sUM5-bgWfg2M_dWXQ21Br98AyTEJ3QJ1cVzapVKs",
-        "leaderboard_points_range": "Ranking!B2:C302",
-        "leaderboard_layers_range": "Layers!B1:Z3",
+        "leaderboard_base_endpoint": LEADERBOARD_BASE_ENDPOINT,
+        "leaderboard_drive_endpoint": LEADERBOARD_DRIVE_ENDPOINT,
+        "leaderboard_points_range": "Ranking!B2:C",
         "leaderboard_api_key": os.environ.get("LEADERBOARD_API_KEY"),
         "service_endpoint": "https://pfp.staging.autonolas.tech",
     },
 }
 
+SERVICE_CONFIG_PATH = Path(
+    "packages", "valory", "services", "contribute", "service.yaml"
+)
+ENV_VAR_REGEX = re.compile(r"^\$\{(?:(?P<name>\w+):)?(?P<type>\w+):(?P<value>.*)\}$")
+
+# Fallback for when the service configuration is not available
 POINT_TO_HASHES = {
     "0": "bafybeiabtdl53v2a3irrgrg7eujzffjallpymli763wvhv6gceurfmcemm",
     "100": "bafybeid46w6yzbehir7ackcnsyuasdkun5aq7jnckt4sknvmiewpph776q",
@@ -79,183 +153,2345 @@ POINT_TO_HASHES = {
 }
 
 NULL_ADDRESS = "0x0000000000000000000000000000000000000000"
+NULL_ADDRESS_TOPIC = HexStr("0x" + "0" * 64)
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+TOKEN_URI_SELECTOR = bytes(Web3.keccak(text="tokenURI(uint256)")[:4])
+OWNER_OF_SELECTOR = bytes(Web3.keccak(text="ownerOf(uint256)")[:4])
+
+# Log queries start with MAX_BLOCKS blocks per window. Windows are halved when
+# the provider reports too many results and doubled after sparse windows.
+MAX_BLOCKS = 300000
+MAX_WINDOW_BLOCKS = 2400000
+SPARSE_WINDOW_LOGS = 1000
+LOG_FETCH_WORKERS = 8
+# Only the errors for windows with too many results split them. Rate limited
+# and timed out queries are retried as they are, after a backoff.
+RANGE_TOO_LARGE_ERRORS = (
+    "query returned more than",  # Infura, -32005
+    "log response size exceeded",  # Alchemy
+)
+RATE_LIMITED_ERRORS = (
+    "rate limit",
+    "request rate",
+    "request count exceeded",
+    "too many requests",
+    "compute units",
+    "limit exceeded",
+)
+LOG_FETCH_RETRIES = 5
+LOG_FETCH_BACKOFF_FACTOR = 1.0
+
+METADATA_WORKERS = 32
+METADATA_TIMEOUT = 10.0
+METADATA_RETRIES = 5
+METADATA_BACKOFF_FACTOR = 0.5
+CHECKPOINT_INTERVAL = 100
+MINT_PAGE_SIZE = 1000
+VERIFY_BATCH_SIZE = 1000
+
+# Token views are read with batched eth_calls, two calls per token
+RPC_BATCH_TOKENS = 250
+RPC_WORKERS = 4
+IPFS_GATEWAY = "https://gateway.autonolas.tech/ipfs/"
+IMAGE_SOURCES = ("endpoint", "chain")
+
+WATCH_INTERVAL = 300.0
+METRICS_PORT = 9464
+
+# The points range is open ended, i.e. "Ranking!B2:C", and read in chunks of rows
+SHEET_RANGE_REGEX = re.compile(
+    r"^(?P<sheet>[^!]+)!(?P<first_column>[A-Z]+)(?P<first_row>\d+):(?P<last_column>[A-Z]+)\d*$"
+)
+LEADERBOARD_CHUNK_ROWS = 500
+LEADERBOARD_WORKERS = 4
+
+ROW_FIELDS = ("token_id", "address", "points", "expected_image", "image", "ok")
+NOT_AVAILABLE = "N/A"
+
+# Snapshots keep the minted rows column by column, with the addresses and
+# images interned. Missing points and images are stored as NO_VALUE.
+# Only the latest SNAPSHOT_RETENTION snapshots of a deployment are kept.
+SNAPSHOT_VERSION = 1
+SNAPSHOT_RETENTION = 100
+SNAPSHOT_COLUMNS = (
+    ("token_ids", "Q"),
+    ("address_ids", "I"),
+    ("points", "q"),
+    ("expected_images", "i"),
+    ("images", "i"),
+    ("ok", "b"),
+)
+NO_VALUE = -1
+DIFF_CHANGES = ("new", "removed", "tier", "image", "failing", "fixed")
 
 NORMAL = "\033[0m"
 RED = "\033[31m"
 
 
-def get_token_to_address(config: Dict) -> Dict:
-    """Read minted tokens and get their ids and minter addresses"""
+def get_contract(config: Dict) -> Tuple[Web3, Contract]:
+    """Get a web3 instance and the dynamic contribution contract"""
 
     web3 = Web3(Web3.HTTPProvider(config["infura_url"]))
 
     with open(config["abi_file_path"], "r", encoding="utf-8") as abi_file:
         abi = json.load(abi_file)["abi"]
 
-    factory_contract = web3.eth.contract(
+    contract = web3.eth.contract(
         address=Web3.to_checksum_address(
             config["dynamic_contribution_contract_address"]
         ),
         abi=abi,
     )
+    return web3, contract
+
 
-    # Avoid parsing too many blocks at a time. This might take too long and
-    # the connection could time out.
-    MAX_BLOCKS = 300000
-    from_block = config["earliest_block_to_monitor"]
-    to_block = (
+def get_last_block(web3: Web3, config: Dict) -> int:
+    """Get the last block to monitor"""
+    return (
         web3.eth.get_block_number()
         if config["latest_block_to_monitor"] == "latest"
         else config["latest_block_to_monitor"]
     )
-    ranges = list(range(from_block, to_block, MAX_BLOCKS)) + [to_block]
 
-    entries = []
 
-    for i in range(len(ranges) - 1):
-        from_block = ranges[i]
-        to_block = ranges[i + 1]
-        entries += factory_contract.events.Transfer.create_filter(  # type: ignore
-            fromBlock=from_block,  # exclusive
-            toBlock=to_block,  # inclusive
-            argument_filters={"from": NULL_ADDRESS},
-        ).get_all_entries()  # limited to 10k entries for now: https://github.com/valory-xyz/contribution-service/issues/13
+def is_range_too_large(error: Exception) -> bool:
+    """Check whether a log query failed because its block range had too many results"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in RANGE_TOO_LARGE_ERRORS)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a log query failed because it was rate limited or timed out"""
+    if isinstance(
+        error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    ):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        if response is not None and response.status_code in (429, 503):
+            return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in RATE_LIMITED_ERRORS)
+
+
+class LogRangeFetcher:  # pylint: disable=too-few-public-methods
+    """Fetches logs over a block range using adaptive, concurrent windows"""
+
+    def __init__(
+        self,
+        get_logs: Callable[[int, int], List[Any]],
+        max_workers: int = LOG_FETCH_WORKERS,
+        window: int = MAX_BLOCKS,
+        max_window: int = MAX_WINDOW_BLOCKS,
+        sparse_logs: int = SPARSE_WINDOW_LOGS,
+        retries: int = LOG_FETCH_RETRIES,
+        backoff_factor: float = LOG_FETCH_BACKOFF_FACTOR,
+    ) -> None:
+        """
+        Constructor
+
+        :param get_logs: callable that returns the logs between two blocks, both inclusive
+        :param max_workers: maximum number of concurrent log queries
+        :param window: initial number of blocks per query
+        :param max_window: maximum number of blocks per query
+        :param sparse_logs: queries returning fewer logs than this grow the window
+        :param retries: maximum number of retries of a rate limited or timed out query
+        :param backoff_factor: exponential backoff factor between retries
+        """
+        self.get_logs = get_logs
+        self.max_workers = max_workers
+        self.window = window
+        self.max_window = max_window
+        self.sparse_logs = sparse_logs
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+    def _get_logs(self, start: int, end: int, attempt: int) -> List[Any]:
+        """Query a window, backing off first if it is a retry"""
+        if attempt:
+            time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+        return self.get_logs(start, end)
+
+    def fetch(  # pylint: disable=too-many-locals
+        self, from_block: int, to_block: int
+    ) -> List[Any]:
+        """
+        Get all the logs between two blocks, both inclusive.
+
+        Windows that the provider rejects for returning too many results are split
+        in half and queried again, while rate limited or timed out windows are
+        retried with an exponential backoff. Windows returning few results double
+        the size of the next ones.
+
+        :param from_block: the first block
+        :param to_block: the last block
+        :return: the logs, sorted by block number and log index
+        """
+        logs: List[Any] = []
+        next_block = from_block
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending: Dict[Future, Tuple[int, int, int]] = {}
+
+            def submit(start: int, end: int, attempt: int = 0) -> None:
+                future = executor.submit(self._get_logs, start, end, attempt)
+                pending[future] = (start, end, attempt)
+
+            while pending or next_block <= to_block:
+                while len(pending) < self.max_workers and next_block <= to_block:
+                    end = min(next_block + self.window - 1, to_block)
+                    submit(next_block, end)
+                    next_block = end + 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, end, attempt = pending.pop(future)
+                    try:
+                        window_logs = future.result()
+                    except Exception as e:  # pylint: disable=broad-except
+                        if start < end and is_range_too_large(e):
+                            middle = (start + end) // 2
+                            self.window = max(1, min(self.window, middle - start + 1))
+                            submit(start, middle)
+                            submit(middle + 1, end)
+                        elif is_retryable(e) and attempt < self.retries:
+                            submit(start, end, attempt + 1)
+                        else:
+                            raise
+                        continue
+
+                    logs += window_logs
+                    if len(window_logs) < self.sparse_logs:
+                        self.window = min(self.max_window, self.window * 2)
+
+        return sorted(logs, key=lambda log: (log["blockNumber"], log["logIndex"]))
+
+
+def get_mints(
+    contract: Contract, from_block: int, to_block: int
+) -> List[Dict[str, Any]]:
+    """Read the mint events between two blocks, both inclusive"""
+
+    def get_logs(start: int, end: int) -> List[Any]:
+        """Stateless log query, so no server-side filter is installed"""
+        return contract.w3.eth.get_logs(
+            {
+                "address": contract.address,
+                "fromBlock": start,
+                "toBlock": end,
+                "topics": [TRANSFER_TOPIC, NULL_ADDRESS_TOPIC],
+            }
+        )
+
+    transfer = contract.events.Transfer()
+    logs = LogRangeFetcher(get_logs).fetch(from_block, to_block)
+    entries = [transfer.process_log(log) for log in logs]
+
+    return [
+        {
+            "token_id": str(entry["args"]["id"]),
+            "address": entry["args"]["to"],
+            "block": entry["blockNumber"],
+            "log_index": entry["logIndex"],
+        }
+        for entry in entries
+    ]
+
+
+def get_token_to_address(config: Dict) -> Dict:
+    """Read minted tokens and get their ids and minter addresses"""
+
+    web3, contract = get_contract(config)
+    mints = get_mints(
+        contract, config["earliest_block_to_monitor"], get_last_block(web3, config)
+    )
+    return {mint["token_id"]: mint["address"] for mint in mints}
+
+
+class VerificationStore:
+    """Local SQLite store for the verification data, keyed by deployment and source"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            deployment TEXT NOT NULL,
+            source TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            last_block INTEGER,
+            PRIMARY KEY (deployment, source, kind)
+        );
+        CREATE TABLE IF NOT EXISTS mints (
+            deployment TEXT NOT NULL,
+            contract TEXT NOT NULL,
+            token_id TEXT NOT NULL,
+            address TEXT NOT NULL,
+            block INTEGER NOT NULL,
+            log_index INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (deployment, contract, token_id)
+        );
+        CREATE INDEX IF NOT EXISTS mints_by_address ON mints (deployment, contract, address);
+        CREATE INDEX IF NOT EXISTS mints_by_block ON mints (deployment, contract, block, log_index);
+        CREATE TABLE IF NOT EXISTS points (
+            deployment TEXT NOT NULL,
+            source TEXT NOT NULL,
+            address TEXT NOT NULL,
+            points TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (deployment, source, address)
+        );
+        CREATE TABLE IF NOT EXISTS images (
+            deployment TEXT NOT NULL,
+            contract TEXT NOT NULL,
+            token_id TEXT NOT NULL,
+            image_hash TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (deployment, contract, token_id)
+        );
+        CREATE TABLE IF NOT EXISTS http_cache (
+            key TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            deployment TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            rows INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (deployment, created_at)
+        );
+    """
+
+    def __init__(self, path: str) -> None:
+        """Constructor"""
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        """Close the store"""
+        self.connection.close()
+
+    def get_fetched_at(
+        self, deployment: str, source: str, kind: str
+    ) -> Optional[float]:
+        """Get the last time some kind of data was fetched from a source"""
+        row = self.connection.execute(
+            "SELECT fetched_at FROM sources WHERE deployment = ? AND source = ? AND kind = ?",
+            (deployment, source, kind),
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, deployment: str, source: str, kind: str, ttl: float) -> bool:
+        """Check whether some kind of data was fetched from a source less than ttl seconds ago"""
+        fetched_at = self.get_fetched_at(deployment, source, kind)
+        return fetched_at is not None and time.time() - fetched_at < ttl
+
+    def get_last_block(self, deployment: str, contract: str) -> Optional[int]:
+        """Get the last block that was fully scanned for mints"""
+        row = self.connection.execute(
+            "SELECT last_block FROM sources WHERE deployment = ? AND source = ? AND kind = 'mints'",
+            (deployment, contract),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _touch(
+        self,
+        deployment: str,
+        source: str,
+        kind: str,
+        last_block: Optional[int] = None,
+    ) -> None:
+        """Record that some kind of data has just been fetched from a source"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+            (deployment, source, kind, time.time(), last_block),
+        )
+
+    def update_mints(
+        self,
+        deployment: str,
+        contract: str,
+        from_block: int,
+        last_block: int,
+        mints: List[Dict[str, Any]],
+    ) -> None:
+        """Replace the mints from a block onwards and move the checkpoint to last_block"""
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM mints WHERE deployment = ? AND contract = ? AND block >= ?",
+                (deployment, contract, from_block),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO mints VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        deployment,
+                        contract,
+                        mint["token_id"],
+                        mint["address"],
+                        mint["block"],
+                        mint["log_index"],
+                        now,
+                    )
+                    for mint in mints
+                ],
+            )
+            self._touch(deployment, contract, "mints", last_block)
+
+    def get_mints(
+        self, deployment: str, contract: str, address: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Get the token id to mint mapping, sorted by mint order, optionally for a single address"""
+        query = "SELECT token_id, address, block, log_index FROM mints WHERE deployment = ? AND contract = ?"
+        args: Tuple = (deployment, contract)
+        if address is not None:
+            query += " AND address = ?"
+            args += (address,)
+        rows = self.connection.execute(query + " ORDER BY block, log_index", args)
+        return {
+            token_id: {
+                "token_id": token_id,
+                "address": mint_address,
+                "block": block,
+                "log_index": log_index,
+            }
+            for token_id, mint_address, block, log_index in rows
+        }
+
+    def get_token_ids(self, deployment: str, contract: str) -> Set[str]:
+        """Get the ids of the minted tokens"""
+        rows = self.connection.execute(
+            "SELECT token_id FROM mints WHERE deployment = ? AND contract = ?",
+            (deployment, contract),
+        )
+        return {token_id for (token_id,) in rows}
+
+    def iter_mints(
+        self, deployment: str, contract: str, page_size: int = MINT_PAGE_SIZE
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the mints in mint order, together with their cached image.
+
+        Mints are read in pages, so no cursor is left open while the caller writes
+        to the store. Every mint is flagged with whether it is the first token
+        minted by its address.
+
+        :param deployment: the deployment name
+        :param contract: the contract address
+        :param page_size: the number of mints per page
+        :yield: the mints
+        """
+        query = """
+            SELECT m.token_id, m.address, m.block, m.log_index,
+                NOT EXISTS (
+                    SELECT 1 FROM mints e
+                    WHERE e.deployment = m.deployment AND e.contract = m.contract
+                    AND e.address = m.address
+                    AND (e.block < m.block OR (e.block = m.block AND e.log_index < m.log_index))
+                ),
+                i.image_hash, i.fetched_at
+            FROM mints m
+            LEFT JOIN images i ON i.deployment = m.deployment
+                AND i.contract = m.contract AND i.token_id = m.token_id
+            WHERE m.deployment = ? AND m.contract = ?
+            AND (m.block > ? OR (m.block = ? AND m.log_index > ?))
+            ORDER BY m.block, m.log_index
+            LIMIT ?
+        """
+        last_block, last_log_index = -1, -1
+        while True:
+            page = self.connection.execute(
+                query,
+                (
+                    deployment,
+                    contract,
+                    last_block,
+                    last_block,
+                    last_log_index,
+                    page_size,
+                ),
+            ).fetchall()
+            for (
+                token_id,
+                address,
+                block,
+                log_index,
+                is_first,
+                image,
+                fetched_at,
+            ) in page:
+                yield {
+                    "token_id": token_id,
+                    "address": address,
+                    "block": block,
+                    "log_index": log_index,
+                    "is_first": bool(is_first),
+                    "image": image,
+                    "image_fetched_at": fetched_at,
+                }
+            if len(page) < page_size:
+                return
+            _, _, last_block, last_log_index, *_ = page[-1]
+
+    def set_points(
+        self, deployment: str, source: str, address_to_points: Dict[str, str]
+    ) -> None:
+        """Replace the leaderboard read from a source"""
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM points WHERE deployment = ? AND source = ?",
+                (deployment, source),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?)",
+                [
+                    (deployment, source, address, points, now)
+                    for address, points in address_to_points.items()
+                ],
+            )
+            self._touch(deployment, source, "points")
+
+    def get_points(
+        self, deployment: str, source: str, address: Optional[str] = None
+    ) -> Dict[str, str]:
+        """Get the address to points mapping, optionally for a single address"""
+        query = "SELECT address, points FROM points WHERE deployment = ? AND source = ?"
+        args: Tuple = (deployment, source)
+        if address is not None:
+            query += " AND address = ?"
+            args += (address,)
+        return dict(self.connection.execute(query, args))
+
+    def set_image_hashes(
+        self, deployment: str, contract: str, token_to_hash: Dict[str, str]
+    ) -> None:
+        """Insert or update the image hashes of some tokens"""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?)",
+                [
+                    (deployment, contract, token_id, image_hash, now)
+                    for token_id, image_hash in token_to_hash.items()
+                ],
+            )
+            self._touch(deployment, contract, "images")
+
+    def get_image_hashes(
+        self,
+        deployment: str,
+        contract: str,
+        ttl: Optional[float] = None,
+        token_id: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """Get the token id to image hash mapping, optionally only the entries fetched less than ttl seconds ago"""
+        query = "SELECT token_id, image_hash FROM images WHERE deployment = ? AND contract = ?"
+        args: Tuple = (deployment, contract)
+        if ttl is not None:
+            query += " AND fetched_at > ?"
+            args += (time.time() - ttl,)
+        if token_id is not None:
+            query += " AND token_id = ?"
+            args += (token_id,)
+        return dict(self.connection.execute(query, args))
+
+    def get_http_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached HTTP response body and its validators"""
+        row = self.connection.execute(
+            "SELECT etag, last_modified, body FROM http_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "body": row[2]}
+
+    def set_http_cache(
+        self,
+        key: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: str,
+    ) -> None:
+        """Cache an HTTP response body and its validators"""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?)",
+                (key, etag, last_modified, body, time.time()),
+            )
+
+    def add_snapshot(
+        self,
+        deployment: str,
+        rows: int,
+        data: bytes,
+        retention: int = SNAPSHOT_RETENTION,
+    ) -> float:
+        """
+        Store a verification snapshot, unless nothing changed since the latest one.
+
+        The oldest snapshots of the deployment are dropped beyond the retention.
+
+        :param deployment: the deployment name
+        :param rows: the number of rows of the snapshot
+        :param data: the serialized snapshot
+        :param retention: the number of snapshots to keep
+        :return: the creation time of the snapshot, or of the latest one if it is the same
+        """
+        latest = self.connection.execute(
+            "SELECT created_at, data FROM snapshots WHERE deployment = ? ORDER BY created_at DESC LIMIT 1",
+            (deployment,),
+        ).fetchone()
+        if latest is not None and latest[1] == data:
+            return latest[0]
+
+        created_at = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?, ?)",
+                (deployment, created_at, rows, data),
+            )
+            self.connection.execute(
+                "DELETE FROM snapshots WHERE deployment = ? AND created_at NOT IN "
+                "(SELECT created_at FROM snapshots WHERE deployment = ? ORDER BY created_at DESC LIMIT ?)",
+                (deployment, deployment, retention),
+            )
+        return created_at
 
-    token_id_to_member = {
-        str(entry["args"]["id"]): entry["args"]["to"] for entry in entries
-    }
+    def get_snapshots(self, deployment: str) -> List[Tuple[float, int, int]]:
+        """Get the creation time, rows and size of the stored snapshots, oldest first"""
+        return self.connection.execute(
+            "SELECT created_at, rows, length(data) FROM snapshots WHERE deployment = ? ORDER BY created_at",
+            (deployment,),
+        ).fetchall()
 
-    return token_id_to_member
+    def get_snapshot(self, deployment: str, created_at: float) -> bytes:
+        """Get the data of a stored snapshot"""
+        row = self.connection.execute(
+            "SELECT data FROM snapshots WHERE deployment = ? AND created_at = ?",
+            (deployment, created_at),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"There is no {deployment} snapshot from {created_at}")
+        return row[0]
 
 
-def get_address_to_points(config: Dict) -> Dict:
+class MintIndex:  # pylint: disable=too-few-public-methods
+    """Index of the minted tokens, checkpointed per deployment and contract"""
+
+    def __init__(self, store: VerificationStore) -> None:
+        """Constructor"""
+        self.store = store
+
+    def update(self, deployment: str, config: Dict) -> List[Dict[str, Any]]:
+        """
+        Scan the blocks that are new since the last checkpoint and merge their mints.
+
+        The last `confirmation_depth` blocks before the checkpoint are scanned again
+        and their mints are replaced, so tokens affected by a reorg are corrected.
+        Scanning is skipped while the checkpoint is younger than the mints ttl.
+
+        :param deployment: the deployment name
+        :param config: the deployment configuration
+        :return: the mints read in this update, sorted by mint order
+        """
+        contract_address = config["dynamic_contribution_contract_address"].lower()
+        if self.store.is_fresh(
+            deployment, contract_address, "mints", config["ttl"]["mints"]
+        ):
+            return []
+
+        web3, contract = get_contract(config)
+        last_block = get_last_block(web3, config)
+        checkpoint = self.store.get_last_block(deployment, contract_address)
+        from_block = config["earliest_block_to_monitor"]
+        if checkpoint is not None:
+            from_block = max(
+                from_block,
+                min(checkpoint, last_block) - config["confirmation_depth"] + 1,
+            )
+
+        # The unconfirmed mints are dropped and read again
+        mints = []
+        if from_block <= last_block:
+            print(
+                f"Scanning mints from block {from_block} to {last_block}",
+                file=sys.stderr,
+            )
+            mints = get_mints(contract, from_block, last_block)
+        self.store.update_mints(
+            deployment, contract_address, from_block, last_block, mints
+        )
+        return mints
+
+
+def make_session(
+    pool_size: int,
+    retries: int,
+    backoff_factor: float,
+    methods: Tuple[str, ...] = ("GET",),
+) -> requests.Session:
+    """Create a session whose keep-alive connections are shared by a pool of workers"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=methods,
+    )
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class LeaderboardReader:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Reads the leaderboard points range in concurrent, conditional chunks"""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: Dict,
+        store: Optional[VerificationStore] = None,
+        chunk_rows: int = LEADERBOARD_CHUNK_ROWS,
+        max_workers: int = LEADERBOARD_WORKERS,
+        timeout: float = METADATA_TIMEOUT,
+        retries: int = METADATA_RETRIES,
+    ) -> None:
+        """
+        Constructor
+
+        :param config: the deployment configuration
+        :param store: store that keeps the chunks and their validators between runs
+        :param chunk_rows: number of rows per request
+        :param max_workers: maximum number of concurrent requests
+        :param timeout: timeout per request, in seconds
+        :param retries: number of retries per request
+        """
+        match = SHEET_RANGE_REGEX.match(config["leaderboard_points_range"])
+        if not match:
+            raise ValueError(
+                f"Invalid leaderboard points range: {config['leaderboard_points_range']}"
+            )
+        self.sheet = match.group("sheet")
+        self.first_column = match.group("first_column")
+        self.last_column = match.group("last_column")
+        self.first_row = int(match.group("first_row"))
+
+        self.sheet_id = config["leaderboard_sheet_id"]
+        self.endpoint = (
+            f"{config['leaderboard_base_endpoint']}/{self.sheet_id}/values:batchGet"
+        )
+        self.drive_endpoint = f"{config['leaderboard_drive_endpoint']}/{self.sheet_id}"
+        self.api_key = config["leaderboard_api_key"]
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = make_session(max_workers, retries, METADATA_BACKOFF_FACTOR)
+
+    def _get_chunk_range(self, chunk: int) -> str:
+        """Get the sheet range of a chunk"""
+        start = self.first_row + chunk * self.chunk_rows
+        end = start + self.chunk_rows - 1
+        return f"{self.sheet}!{self.first_column}{start}:{self.last_column}{end}"
+
+    def _get_chunk(
+        self, chunk_range: str, cached: Optional[Dict[str, Any]]
+    ) -> Tuple[List[List[str]], Optional[Tuple]]:
+        """Get the values of a chunk and, if they were downloaded, their cache entry"""
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.session.get(
+            self.endpoint,
+            params={"ranges": chunk_range, "key": self.api_key},
+            headers=headers,
+            timeout=self.timeout,
+        )
+        if response.status_code == 304 and cached:
+            return json.loads(cached["body"]), None
+        response.raise_for_status()
+
+        value_ranges = response.json()["valueRanges"]
+        values = value_ranges[0].get("values", []) if value_ranges else []
+        cache_entry = (
+            f"{self.sheet_id}/{chunk_range}",
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            json.dumps(values),
+        )
+        return values, cache_entry
+
+    def _get_modified_time(self) -> Optional[str]:
+        """Get the Drive modification time of the sheet, or None if it can't be read"""
+        try:
+            response = self.session.get(
+                self.drive_endpoint,
+                params={"fields": "modifiedTime", "key": self.api_key},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json()["modifiedTime"]
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            print(
+                f"Could not get the leaderboard modification time: {e}",
+                file=sys.stderr,
+            )
+            return None
+
+    def read(self) -> Dict[str, str]:
+        """
+        Read the whole points range.
+
+        With a store, the range is not read again while the Drive modification time
+        of the sheet is the one of the last read. Otherwise, chunks are requested in
+        concurrent waves until one of them is not full. Chunks that have not changed
+        since the last read are not downloaded again when the server returns
+        validators (ETag or Last-Modified).
+
+        :return: the address to points mapping
+        """
+        modified_time = None
+        if self.store:
+            modified_time = self._get_modified_time()
+            cached = self.store.get_http_cache(self.sheet_id)
+            if modified_time and cached and cached["last_modified"] == modified_time:
+                print("The leaderboard has not changed", file=sys.stderr)
+                return self._to_points(json.loads(cached["body"]))
+
+        rows = self._read_chunks()
+        if self.store and modified_time:
+            self.store.set_http_cache(
+                self.sheet_id, None, modified_time, json.dumps(rows)
+            )
+        return self._to_points(rows)
+
+    @staticmethod
+    def _to_points(rows: List[List[str]]) -> Dict[str, str]:
+        """Get the address to points mapping of the range rows"""
+        return {row[0]: row[1] for row in rows if len(row) >= 2}
+
+    def _read_range(self) -> List[List[str]]:
+        """Read the whole range rows in a single request"""
+        values, _ = self._get_chunk(
+            f"{self.sheet}!{self.first_column}{self.first_row}:{self.last_column}",
+            None,
+        )
+        return values
+
+    def _read_chunks(self) -> List[List[str]]:  # pylint: disable=too-many-locals
+        """
+        Read the range rows chunk by chunk.
+
+        A chunk that can't be read is replaced by its cached values. Without
+        them, the chunks of the wave are still read, so their validators are
+        kept, and the whole range is then read in a single request.
+
+        :return: the range rows
+        """
+        rows: List[List[str]] = []
+        downloaded = 0
+        first_chunk = 0
+        failed = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                chunk_ranges = [
+                    self._get_chunk_range(chunk)
+                    for chunk in range(first_chunk, first_chunk + self.max_workers)
+                ]
+                # The store is only used from this thread
+                cached = [
+                    self.store.get_http_cache(f"{self.sheet_id}/{chunk_range}")
+                    if self.store
+                    else None
+                    for chunk_range in chunk_ranges
+                ]
+                futures = [
+                    executor.submit(self._get_chunk, chunk_range, cache)
+                    for chunk_range, cache in zip(chunk_ranges, cached)
+                ]
+
+                is_last_wave = False
+                for chunk_range, cache, future in zip(chunk_ranges, cached, futures):
+                    try:
+                        values, cache_entry = future.result()
+                    except (
+                        requests.exceptions.RequestException,
+                        KeyError,
+                        ValueError,
+                    ) as e:
+                        if is_last_wave or failed:
+                            continue
+                        print(
+                            f"{RED}Could not read the leaderboard chunk {chunk_range}: {e}{NORMAL}",
+                            file=sys.stderr,
+                        )
+                        if cache is None:
+                            failed = True
+                            continue
+                        values, cache_entry = json.loads(cache["body"]), None
+                    if cache_entry is not None:
+                        downloaded += 1
+                        if self.store:
+                            self.store.set_http_cache(*cache_entry)
+                    if is_last_wave or failed:
+                        continue
+                    rows += values
+                    is_last_wave = len(values) < self.chunk_rows
+
+                if is_last_wave or failed:
+                    break
+                first_chunk += self.max_workers
+
+        if failed:
+            print("Reading the whole leaderboard range at once", file=sys.stderr)
+            rows = self._read_range()
+
+        print(
+            f"Read {len(rows)} leaderboard rows, {downloaded} chunks downloaded",
+            file=sys.stderr,
+        )
+        return rows
+
+
+def get_address_to_points(
+    config: Dict, store: Optional[VerificationStore] = None
+) -> Dict:
     """Read leaderboard"""
+    address_to_points = LeaderboardReader(config, store).read()
+    if not address_to_points:
+        raise ValueError("Could not retrieve the leaderboard")
+    return address_to_points
+
+
+class MetadataClient:
+    """Pooled, retrying HTTP client for the token metadata"""
+
+    def __init__(
+        self,
+        service_endpoint: str,
+        max_workers: int = METADATA_WORKERS,
+        timeout: float = METADATA_TIMEOUT,
+        retries: int = METADATA_RETRIES,
+        backoff_factor: float = METADATA_BACKOFF_FACTOR,
+    ) -> None:
+        """
+        Constructor
+
+        :param service_endpoint: the endpoint that serves the token metadata
+        :param max_workers: maximum number of concurrent requests
+        :param timeout: timeout per request, in seconds
+        :param retries: number of retries per request
+        :param backoff_factor: exponential backoff factor between retries
+        """
+        self.service_endpoint = service_endpoint
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        # Connections are kept alive and shared by all the workers
+        self.session = make_session(max_workers, retries, backoff_factor)
+
+    def get_metadata(self, url: str) -> Dict:
+        """Get the metadata served at the given url"""
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_image_hash(self, token_id: str, url: Optional[str] = None) -> str:
+        """Get the token's image hash, from the service endpoint unless a metadata url is given"""
+        metadata = self.get_metadata(url or f"{self.service_endpoint}/{token_id}")
+        return metadata["image"].split("/")[-1]
+
+    def get_image_hashes(
+        self,
+        token_ids: Iterable[str],
+        on_result: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, str]:
+        """
+        Get the image hashes of several tokens concurrently.
+
+        Tokens whose request keeps failing after the retries are reported and left out.
+
+        :param token_ids: the token ids
+        :param on_result: callback that receives every token id and image hash as soon as they are fetched
+        :return: the token id to image hash mapping
+        """
+        token_to_hash = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.get_image_hash, token_id): token_id
+                for token_id in token_ids
+            }
+            for future in as_completed(futures):
+                token_id = futures[future]
+                try:
+                    image_hash = future.result()
+                except (
+                    requests.exceptions.RequestException,
+                    KeyError,
+                    ValueError,
+                ) as e:
+                    print(
+                        f"{RED}Could not get the image for token {token_id}: {e}{NORMAL}",
+                        file=sys.stderr,
+                    )
+                    continue
+                token_to_hash[token_id] = image_hash
+                if on_result:
+                    on_result(token_id, image_hash)
+        return token_to_hash
+
+
+class TokenReader:
+    """Reads the token URIs and owners from the contract with batched JSON-RPC calls"""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        rpc_url: str,
+        contract_address: str,
+        batch_tokens: int = RPC_BATCH_TOKENS,
+        max_workers: int = RPC_WORKERS,
+        timeout: float = METADATA_TIMEOUT,
+        retries: int = METADATA_RETRIES,
+        backoff_factor: float = METADATA_BACKOFF_FACTOR,
+    ) -> None:
+        """
+        Constructor
+
+        :param rpc_url: the JSON-RPC endpoint
+        :param contract_address: the dynamic contribution contract address
+        :param batch_tokens: number of tokens read per request
+        :param max_workers: maximum number of concurrent requests
+        :param timeout: timeout per request, in seconds
+        :param retries: number of retries per request
+        :param backoff_factor: exponential backoff factor between retries
+        """
+        self.rpc_url = rpc_url
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.batch_tokens = batch_tokens
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        # eth_calls are read only, so they are retried like GETs
+        self.session = make_session(
+            max_workers, retries, backoff_factor, methods=("GET", "POST")
+        )
+
+    def _call(self, call_id: int, selector: bytes, token_id: str) -> Dict[str, Any]:
+        """Build the eth_call of a token view"""
+        data = selector + encode(["uint256"], [int(token_id)])
+        return {
+            "jsonrpc": "2.0",
+            "id": call_id,
+            "method": "eth_call",
+            "params": [
+                {"to": self.contract_address, "data": "0x" + data.hex()},
+                "latest",
+            ],
+        }
+
+    @staticmethod
+    def _decode(response: Optional[Dict[str, Any]], output_type: str) -> Optional[Any]:
+        """Decode the result of an eth_call, or None if it failed"""
+        if not response or "result" not in response:
+            return None
+        try:
+            (value,) = decode([output_type], bytes.fromhex(response["result"][2:]))
+        except Exception:  # pylint: disable=broad-except
+            return None
+        return value
+
+    def read_batch(self, token_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Read the URI and owner of several tokens in a single request.
+
+        The views of tokens that revert, e.g. burned ones, are None.
+
+        :param token_ids: the token ids
+        :return: the token id to {"uri", "owner"} mapping
+        """
+        calls = []
+        for i, token_id in enumerate(token_ids):
+            calls.append(self._call(2 * i, TOKEN_URI_SELECTOR, token_id))
+            calls.append(self._call(2 * i + 1, OWNER_OF_SELECTOR, token_id))
+        response = self.session.post(self.rpc_url, json=calls, timeout=self.timeout)
+        response.raise_for_status()
+        responses = response.json()
+        if not isinstance(responses, list):
+            raise ValueError(f"Batched eth_call failed: {responses.get('error')}")
+
+        by_id = {item.get("id"): item for item in responses}
+        return {
+            token_id: {
+                "uri": self._decode(by_id.get(2 * i), "string"),
+                "owner": self._decode(by_id.get(2 * i + 1), "address"),
+            }
+            for i, token_id in enumerate(token_ids)
+        }
+
+    def read(self, token_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Read the URI and owner of several tokens, in concurrent batches"""
+        tokens: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch in executor.map(
+                self.read_batch, batched(token_ids, self.batch_tokens)
+            ):
+                tokens.update(batch)
+        return tokens
+
+
+def to_gateway_url(uri: str) -> str:
+    """Get an http url for a token URI, through the IPFS gateway for ipfs:// URIs"""
+    if uri.startswith("ipfs://"):
+        return IPFS_GATEWAY + uri[len("ipfs://") :]
+    return uri
+
+
+def find_parameter(resource: Any, name: str) -> Any:
+    """Find the first value of a parameter in a nested configuration"""
+    if isinstance(resource, dict):
+        if name in resource:
+            return resource[name]
+        resource = list(resource.values())
+    if isinstance(resource, list):
+        for item in resource:
+            value = find_parameter(item, name)
+            if value is not None:
+                return value
+    return None
+
+
+def load_points_to_image_hashes(
+    service_config_path: Path = SERVICE_CONFIG_PATH,
+) -> Dict[str, str]:
+    """
+    Load the points to image hash mapping the way the deployed service does.
+
+    The value in the service configuration is usually an environment variable
+    template, i.e. `${POINTS_TO_IMAGE_HASHES:str:{...}}`. The environment
+    variable is used when set, otherwise the default value.
+
+    :param service_config_path: path to the service configuration
+    :return: the points to image hash mapping
+    """
+    with open(service_config_path, "r", encoding="utf-8") as file:
+        value = find_parameter(list(yaml.safe_load_all(file)), "points_to_image_hashes")
+
+    if value is None:
+        raise ValueError(
+            f"Could not find points_to_image_hashes in {service_config_path}"
+        )
+
+    if isinstance(value, str):
+        match = ENV_VAR_REGEX.match(value.strip())
+        if match:
+            value = os.environ.get(match.group("name") or "", match.group("value"))
+        value = json.loads(value)
+
+    if not value:
+        raise ValueError(f"points_to_image_hashes is not set in {service_config_path}")
+
+    return {str(points): image_hash for points, image_hash in value.items()}
+
+
+class TierResolver:
+    """Resolves the image hash that corresponds to some amount of points"""
+
+    def __init__(self, points_to_image_hashes: Dict[str, str]) -> None:
+        """Constructor"""
+        tiers = sorted(
+            (int(points), image_hash)
+            for points, image_hash in points_to_image_hashes.items()
+        )
+        self.thresholds = [threshold for threshold, _ in tiers]
+        self.image_hashes = [image_hash for _, image_hash in tiers]
+        self.base_image = self.image_hashes[0]
+        self._np_thresholds = np.array(self.thresholds) if np else None
+
+    @classmethod
+    def from_service_config(
+        cls, service_config_path: Path = SERVICE_CONFIG_PATH
+    ) -> "TierResolver":
+        """Build the resolver from the service configuration, falling back to POINT_TO_HASHES"""
+        try:
+            return cls(load_points_to_image_hashes(service_config_path))
+        except (OSError, ValueError) as e:
+            print(f"{e}, using the default points to image hashes", file=sys.stderr)
+            return cls(POINT_TO_HASHES)
+
+    def get_tier(self, points: Union[str, int]) -> int:
+        """Get the index of the tier that corresponds to the points"""
+        tier = bisect.bisect_right(self.thresholds, int(points)) - 1
+        if tier < 0:
+            raise ValueError(f"Could not get the image hash for {points} points")
+        return tier
+
+    def get_image(self, points: Union[str, int]) -> str:
+        """Get the image hash given the points"""
+        return self.image_hashes[self.get_tier(points)]
+
+    def get_images(self, points: Sequence[Union[str, int]]) -> List[str]:
+        """Get the image hashes for a whole points column at once"""
+        if self._np_thresholds is None:
+            return [self.get_image(p) for p in points]
+        values = np.asarray(points).astype(np.int64)
+        tiers = np.searchsorted(self._np_thresholds, values, side="right") - 1
+        if len(tiers) and tiers.min() < 0:
+            raise ValueError(
+                f"Could not get the image hash for {values[tiers.argmin()]} points"
+            )
+        return [self.image_hashes[tier] for tier in tiers.tolist()]
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address so that checksummed and lowercase versions match"""
+    return address.strip().lower()
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable in lists of some size"""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def mark_first_tokens(mints: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sort in-memory mints in mint order and flag the first token of every address"""
+    address_to_tokens: Dict[str, List[str]] = {}
+    ordered_mints = sorted(
+        mints.values(), key=lambda mint: (mint["block"], mint["log_index"])
+    )
+    for mint in ordered_mints:
+        address_to_tokens.setdefault(normalize_address(mint["address"]), []).append(
+            mint["token_id"]
+        )
+    return [
+        {
+            **mint,
+            "is_first": address_to_tokens[normalize_address(mint["address"])][0]
+            == mint["token_id"],
+        }
+        for mint in ordered_mints
+    ]
+
+
+class VerificationEngine:
+    """Checks the token images against the leaderboard, one row at a time"""
+
+    def __init__(
+        self,
+        address_to_points: Dict[str, str],
+        tiers: TierResolver,
+        batch_size: int = VERIFY_BATCH_SIZE,
+    ) -> None:
+        """
+        Constructor
+
+        :param address_to_points: the leaderboard
+        :param tiers: the points to image hash resolver
+        :param batch_size: number of rows whose expected image is resolved at once
+        """
+        self.tiers = tiers
+        self.batch_size = batch_size
+
+        # Leaderboard by normalized address
+        self.leaderboard = {
+            normalize_address(address): (address, points)
+            for address, points in address_to_points.items()
+        }
+        self.minted_addresses: Set[str] = set()
+
+    def join_points(self, mints: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Attach the points and expected image to every mint.
+
+        Only the first token minted by an address gets the improved image,
+        the rest are expected to keep the base image.
+
+        :param mints: the mints in mint order, flagged with `is_first`
+        :yield: the table rows, without the verdict
+        """
+        for batch in batched(mints, self.batch_size):
+            rows = []
+            upgradable_points = []
+            for mint in batch:
+                address = normalize_address(mint["address"])
+                entry = self.leaderboard.get(address)
+                is_upgradable = False
+                if entry:
+                    self.minted_addresses.add(address)
+                    if mint["is_first"]:
+                        is_upgradable = True
+                        upgradable_points.append(entry[1])
+                row = {
+                    "token_id": mint["token_id"],
+                    "address": mint["address"],
+                    "points": entry[1] if entry else NOT_AVAILABLE,
+                    "expected_image": self.tiers.base_image,
+                    "image": mint.get("image"),
+                    "image_fetched_at": mint.get("image_fetched_at"),
+                }
+                rows.append((row, is_upgradable))
+
+            # Resolve the upgraded images of the whole batch at once
+            upgraded_images = iter(self.tiers.get_images(upgradable_points))
+            for row, is_upgradable in rows:
+                if is_upgradable:
+                    row["expected_image"] = next(upgraded_images, None)
+                yield row
+
+    @staticmethod
+    def verdict(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Compare the expected and actual image of every row"""
+        for row in rows:
+            row.pop("image_fetched_at", None)
+            row["image"] = row["image"] or NOT_AVAILABLE
+            row["ok"] = row["expected_image"] == row["image"]
+            yield row
+
+    def verify(
+        self, mints: Dict[str, Dict[str, Any]], token_to_hash: Dict[str, str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Verify in-memory mints and image hashes.
+
+        :param mints: the token id to mint mapping
+        :param token_to_hash: the token id to actual image hash mapping
+        :return: the table rows, in mint order
+        """
+        rows = []
+        for row in self.join_points(mark_first_tokens(mints)):
+            row["image"] = token_to_hash.get(row["token_id"])
+            rows.append(row)
+        return list(self.verdict(rows))
+
+    def get_unminted(self) -> Iterator[Dict[str, Any]]:
+        """Get the leaderboard entries whose address has not minted any of the joined tokens"""
+        for normalized_address, (address, points) in self.leaderboard.items():
+            if normalized_address not in self.minted_addresses:
+                yield {
+                    "token_id": NOT_AVAILABLE,
+                    "address": address,
+                    "points": points,
+                    "expected_image": NOT_AVAILABLE,
+                    "image": NOT_AVAILABLE,
+                    "ok": None,
+                }
+
+
+def fetch_images(
+    rows: Iterable[Dict[str, Any]],
+    client: MetadataClient,
+    ttl: float,
+    on_result: Optional[Callable[[str, str], None]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Fill in the actual image of every row.
+
+    Rows without a cached image, or whose image is older than the ttl, are fetched
+    concurrently. Rows are yielded in their original order, keeping a bounded number
+    of them in flight.
+
+    :param rows: the table rows
+    :param client: the metadata client
+    :param ttl: seconds before a cached image is fetched again
+    :param on_result: callback that receives every fetched token id and image hash
+    :yield: the table rows with their image
+    """
+    min_fetched_at = time.time() - ttl
+    max_in_flight = client.max_workers * 4
+    pending: Deque[Tuple[Dict[str, Any], Optional[Future]]] = deque()
+
+    def resolve(row: Dict[str, Any], future: Optional[Future]) -> Dict[str, Any]:
+        """Wait for the image of a row"""
+        if future is None:
+            return row
+        try:
+            row["image"] = future.result()
+        except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+            print(
+                f"{RED}Could not get the image for token {row['token_id']}: {e}{NORMAL}",
+                file=sys.stderr,
+            )
+            row["image"] = None
+            return row
+        if on_result:
+            on_result(row["token_id"], row["image"])
+        return row
+
+    with ThreadPoolExecutor(max_workers=client.max_workers) as executor:
+        for row in rows:
+            future = None
+            fetched_at = row.pop("image_fetched_at", None)
+            if not row["image"] or fetched_at is None or fetched_at <= min_fetched_at:
+                future = executor.submit(client.get_image_hash, row["token_id"])
+            pending.append((row, future))
+
+            while pending and (
+                len(pending) >= max_in_flight
+                or pending[0][1] is None
+                or pending[0][1].done()
+            ):
+                yield resolve(*pending.popleft())
+
+        while pending:
+            yield resolve(*pending.popleft())
+
+
+def fetch_images_onchain(  # pylint: disable=too-many-locals
+    rows: Iterable[Dict[str, Any]],
+    reader: TokenReader,
+    client: MetadataClient,
+    ttl: float,
+    on_result: Optional[Callable[[str, str], None]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Fill in the actual image of every row, from the metadata of its on-chain token URI.
+
+    Rows are processed in batches: the URIs and owners of the batch are read with
+    batched eth_calls, then the metadata is fetched concurrently. Tokens whose
+    on-chain owner is not the minter, and tokens whose URI is not the one served
+    by the service endpoint, are reported. If the contract can't be read, the
+    stale tokens of the batch are reported and left without an image.
+
+    :param rows: the table rows
+    :param reader: the token reader
+    :param client: the metadata client
+    :param ttl: seconds before a cached image is fetched again
+    :param on_result: callback that receives every fetched token id and image hash
+    :yield: the table rows with their image
+    """
+    min_fetched_at = time.time() - ttl
+    with ThreadPoolExecutor(max_workers=client.max_workers) as executor:
+        for batch in batched(rows, VERIFY_BATCH_SIZE):
+            stale = []
+            for row in batch:
+                fetched_at = row.pop("image_fetched_at", None)
+                if (
+                    not row["image"]
+                    or fetched_at is None
+                    or fetched_at <= min_fetched_at
+                ):
+                    stale.append(row)
+
+            try:
+                tokens = reader.read(row["token_id"] for row in stale)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(
+                    f"{RED}Could not read {len(stale)} tokens from the contract: {e}{NORMAL}",
+                    file=sys.stderr,
+                )
+                for row in stale:
+                    print(
+                        f"{RED}Could not read the URI of token {row['token_id']}{NORMAL}",
+                        file=sys.stderr,
+                    )
+                    row["image"] = None
+                yield from batch
+                continue
+
+            futures = {}
+            for row in stale:
+                token = tokens.get(row["token_id"]) or {}
+                if token.get("owner") and normalize_address(
+                    token["owner"]
+                ) != normalize_address(row["address"]):
+                    print(
+                        f"{RED}Token {row['token_id']} is owned by {token['owner']}, not its minter {row['address']}{NORMAL}",
+                        file=sys.stderr,
+                    )
+                if not token.get("uri"):
+                    print(
+                        f"{RED}Could not read the URI of token {row['token_id']}{NORMAL}",
+                        file=sys.stderr,
+                    )
+                    row["image"] = None
+                    continue
+                if token["uri"] != f"{client.service_endpoint}/{row['token_id']}":
+                    print(
+                        f"Token {row['token_id']} points to {token['uri']}",
+                        file=sys.stderr,
+                    )
+                futures[row["token_id"]] = executor.submit(
+                    client.get_image_hash, row["token_id"], to_gateway_url(token["uri"])
+                )
+
+            for row in batch:
+                future = futures.get(row["token_id"])
+                if future is None:
+                    yield row
+                    continue
+                try:
+                    row["image"] = future.result()
+                except (
+                    requests.exceptions.RequestException,
+                    KeyError,
+                    ValueError,
+                ) as e:
+                    print(
+                        f"{RED}Could not get the image for token {row['token_id']}: {e}{NORMAL}",
+                        file=sys.stderr,
+                    )
+                    row["image"] = None
+                    yield row
+                    continue
+                if on_result:
+                    on_result(row["token_id"], row["image"])
+                yield row
+
+
+class Sink(ABC):
+    """Receives the verification rows as soon as they are ready"""
+
+    @abstractmethod
+    def write(self, row: Dict[str, Any]) -> None:
+        """Write a row"""
+
+    def close(self) -> None:
+        """Finish writing"""
+
+
+class TableSink(Sink):
+    """Prints the rows as a colored table"""
+
+    def __init__(self, stream: TextIO = sys.stdout) -> None:
+        """Constructor"""
+        self.stream = stream
+        self.in_unminted = False
+        print(
+            "\nID                    ADDRESS                        POINTS   EXP_IMAGE     IMAGE     OK",
+            file=self.stream,
+        )
+        print("-" * 90, file=self.stream)
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Write a row"""
+        if row["ok"] is None:
+            if not self.in_unminted:
+                print("-" * 90, file=self.stream)
+                self.in_unminted = True
+            print(
+                f"{'N/A':>3}    {row['address']:>40}    {row['points']:>6}    {'N/A':>8}    {'N/A':>8}   N/A",
+                file=self.stream,
+            )
+            return
+
+        color = NORMAL if row["ok"] else RED
+        print(
+            f"{color}{row['token_id']:>3}    {row['address']:>40}    {row['points']:>6}    {row['expected_image'][-8:]:>8}    {row['image'][-8:]:>8}   {row['ok']}{NORMAL}",
+            file=self.stream,
+        )
+
+    def close(self) -> None:
+        """Finish writing"""
+        if not self.in_unminted:
+            print("-" * 90, file=self.stream)
+
+
+class JsonlSink(Sink):
+    """Writes every row as a JSON line"""
+
+    def __init__(self, stream: TextIO = sys.stdout) -> None:
+        """Constructor"""
+        self.stream = stream
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Write a row"""
+        self.stream.write(json.dumps(row) + "\n")
+        self.stream.flush()
+
+
+class CsvSink(Sink):
+    """Writes the rows as CSV"""
+
+    def __init__(self, stream: TextIO = sys.stdout) -> None:
+        """Constructor"""
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=ROW_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Write a row"""
+        self.writer.writerow(row)
+        self.stream.flush()
+
+
+SINKS: Dict[str, Callable[..., Sink]] = {
+    "table": TableSink,
+    "jsonl": JsonlSink,
+    "csv": CsvSink,
+}
+
+
+class Snapshot:
+    """The minted rows of a verification run, stored column by column in typed arrays"""
+
+    def __init__(self, tiers: TierResolver) -> None:
+        """
+        Constructor
+
+        The tier images are interned first, so the image code of a tier image
+        is its tier index.
+
+        :param tiers: the points to image hash resolver
+        """
+        self.thresholds = list(tiers.thresholds)
+        self.columns = {name: array(typecode) for name, typecode in SNAPSHOT_COLUMNS}
+        self.addresses: List[str] = []
+        self.images: List[str] = list(tiers.image_hashes)
+        self._address_ids: Dict[str, int] = {}
+        self._image_ids = {image: i for i, image in enumerate(self.images)}
+
+    def __len__(self) -> int:
+        """Get the number of rows"""
+        return len(self.columns["token_ids"])
 
-    leaderboard_base_endpoint = "https://sheets.googleapis.com/v4/spreadsheets"
+    @staticmethod
+    def _intern(values: List[str], ids: Dict[str, int], value: str) -> int:
+        """Get the index of a value in a table, adding it if needed"""
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
 
-    leaderboard_endpoint = f"{leaderboard_base_endpoint}/{config['leaderboard_sheet_id']}/values:batchGet?ranges={config['leaderboard_layers_range']}&ranges={config['leaderboard_points_range']}&key={config['leaderboard_api_key']}"
+    def _image_id(self, image: Optional[str]) -> int:
+        """Get the code of an image"""
+        if not image or image == NOT_AVAILABLE:
+            return NO_VALUE
+        return self._intern(self.images, self._image_ids, image)
 
-    response = requests.get(leaderboard_endpoint)
+    def add(self, row: Dict[str, Any]) -> None:
+        """Add a verified row, unminted leaderboard entries are left out"""
+        if row["ok"] is None:
+            return
+        columns = self.columns
+        columns["token_ids"].append(int(row["token_id"]))
+        columns["address_ids"].append(
+            self._intern(
+                self.addresses, self._address_ids, normalize_address(row["address"])
+            )
+        )
+        columns["points"].append(
+            NO_VALUE if row["points"] == NOT_AVAILABLE else int(row["points"])
+        )
+        columns["expected_images"].append(self._image_id(row["expected_image"]))
+        columns["images"].append(self._image_id(row["image"]))
+        columns["ok"].append(bool(row["ok"]))
+
+    def describe_image(self, code: int) -> str:
+        """Get the tier of an image code, or the image hash if it is not a tier image"""
+        if code == NO_VALUE:
+            return NOT_AVAILABLE
+        if code < len(self.thresholds):
+            return f"tier {self.thresholds[code]}"
+        return self.images[code]
+
+    def get_row(self, index: int) -> Dict[str, Any]:
+        """Get a row, with its images described"""
+        columns = self.columns
+        points = columns["points"][index]
+        return {
+            "token_id": str(columns["token_ids"][index]),
+            "address": self.addresses[columns["address_ids"][index]],
+            "points": NOT_AVAILABLE if points == NO_VALUE else str(points),
+            "expected_image": self.describe_image(columns["expected_images"][index]),
+            "image": self.describe_image(columns["images"][index]),
+            "ok": bool(columns["ok"][index]),
+        }
 
-    for data in response.json()["valueRanges"]:
-        if data["range"] == config["leaderboard_points_range"]:
-            return dict(data["values"])
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the snapshot.
 
-    raise ValueError("Could not retrieve the leaderboard")
+        The data is a length prefixed JSON header, followed by the addresses as
+        20 bytes each and the raw bytes of every column.
+
+        :return: the serialized snapshot
+        """
+        header = json.dumps(
+            {
+                "version": SNAPSHOT_VERSION,
+                "byteorder": sys.byteorder,
+                "itemsizes": [column.itemsize for column in self.columns.values()],
+                "rows": len(self),
+                "addresses": len(self.addresses),
+                "thresholds": self.thresholds,
+                "images": self.images,
+            }
+        ).encode()
+        return b"".join(
+            [
+                struct.pack(">I", len(header)),
+                header,
+                bytes.fromhex("".join(address[2:] for address in self.addresses)),
+                *(column.tobytes() for column in self.columns.values()),
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Snapshot":
+        """Deserialize a snapshot"""
+        (header_size,) = struct.unpack_from(">I", data)
+        offset = 4 + header_size
+        header = json.loads(data[4:offset])
+        if header["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {header['version']}")
+
+        snapshot = cls(
+            TierResolver(dict(zip(map(str, header["thresholds"]), header["images"])))
+        )
+        snapshot.images = header["images"]
+        snapshot._image_ids = {image: i for i, image in enumerate(snapshot.images)}
+        addresses = data[offset : offset + 20 * header["addresses"]]
+        snapshot.addresses = [
+            "0x" + addresses[i : i + 20].hex() for i in range(0, len(addresses), 20)
+        ]
+        offset += len(addresses)
+        for column, itemsize in zip(snapshot.columns.values(), header["itemsizes"]):
+            if column.itemsize != itemsize:
+                raise ValueError("The snapshot was stored on an incompatible platform")
+            column.frombytes(data[offset : offset + itemsize * header["rows"]])
+            offset += itemsize * header["rows"]
+            if header["byteorder"] != sys.byteorder:
+                column.byteswap()
+        return snapshot
 
 
-def get_token_image_hash(token_id: str, config: Dict) -> str:
-    """Get the token's image hash"""
-    url = f"{config['service_endpoint']}/{token_id}"
-    response = requests.get(url)
-    return response.json()["image"].split("/")[-1]
+def diff_snapshots(  # pylint: disable=too-many-locals
+    old: Snapshot, new: Snapshot
+) -> Iterator[Dict[str, Any]]:
+    """
+    Compare two snapshots, reporting only what changed.
 
+    The changes are the new and removed tokens, i.e. by a reorg, the tokens
+    whose expected tier or image changed, and the rows that started failing or
+    were fixed.
 
-def get_image(points: str) -> str:
-    """Get the image hash given the points"""
-    thresholds = list(sorted(POINT_TO_HASHES.keys(), reverse=True))
-    for t in thresholds:
-        if int(points) >= int(t):
-            return POINT_TO_HASHES[t]
-    raise ValueError(f"Could not get the image hash for {points} points")
+    :param old: the older snapshot
+    :param new: the newer snapshot
+    :yield: the changes, as {"change", "token_id", "address", "before", "after"}
+    """
+    old_rows = {token_id: i for i, token_id in enumerate(old.columns["token_ids"])}
+    # Image codes of the old snapshot, translated to the ones of the new snapshot
+    new_image_ids = {image: i for i, image in enumerate(new.images)}
+    image_codes = [new_image_ids.get(image, -2) for image in old.images]
+    old_expected, old_images, old_ok = (
+        old.columns["expected_images"],
+        old.columns["images"],
+        old.columns["ok"],
+    )
+    new_expected, new_images, new_ok = (
+        new.columns["expected_images"],
+        new.columns["images"],
+        new.columns["ok"],
+    )
+
+    def translate(code: int) -> int:
+        """Translate an old image code"""
+        return code if code == NO_VALUE else image_codes[code]
+
+    for i, token_id in enumerate(new.columns["token_ids"]):
+        j = old_rows.get(token_id)
+        if j is None:
+            row = new.get_row(i)
+            yield {
+                "change": "new",
+                "token_id": row["token_id"],
+                "address": row["address"],
+                "before": None,
+                "after": row["image"],
+            }
+            continue
+
+        changes: List[Tuple[str, Any, Any]] = []
+        if translate(old_expected[j]) != new_expected[i]:
+            changes.append(
+                (
+                    "tier",
+                    old.describe_image(old_expected[j]),
+                    new.describe_image(new_expected[i]),
+                )
+            )
+        if translate(old_images[j]) != new_images[i]:
+            changes.append(
+                (
+                    "image",
+                    old.describe_image(old_images[j]),
+                    new.describe_image(new_images[i]),
+                )
+            )
+        if old_ok[j] != new_ok[i]:
+            changes.append(
+                ("fixed" if new_ok[i] else "failing", bool(old_ok[j]), bool(new_ok[i]))
+            )
+        for change, before, after in changes:
+            yield {
+                "change": change,
+                "token_id": str(token_id),
+                "address": new.addresses[new.columns["address_ids"][i]],
+                "before": before,
+                "after": after,
+            }
+
+    new_token_ids = set(new.columns["token_ids"])
+    for token_id, j in old_rows.items():
+        if token_id not in new_token_ids:
+            row = old.get_row(j)
+            yield {
+                "change": "removed",
+                "token_id": row["token_id"],
+                "address": row["address"],
+                "before": row["image"],
+                "after": None,
+            }
+
+
+def refresh_leaderboard(
+    store: VerificationStore, deployment: str, config: Dict
+) -> bool:
+    """Read the leaderboard again if the stored one is stale, returning whether it was read"""
+    if store.is_fresh(
+        deployment, config["leaderboard_sheet_id"], "points", config["ttl"]["points"]
+    ):
+        return False
+    print("Reading the leaderboard", file=sys.stderr)
+    store.set_points(
+        deployment,
+        config["leaderboard_sheet_id"],
+        get_address_to_points(config, store),
+    )
+    return True
 
 
-def draw_table(  # pylint: disable=too-many-locals,too-many-statements
+def verify(
     deployment: str,
+    sink: Sink,
+    store_path: str = STORE_FILE,
+    source: str = "endpoint",
 ) -> None:
-    """Prints the verification table"""
+    """
+    Run the verification pipeline and stream its rows to a sink.
+
+    Mints are read from the store in mint order, joined with the leaderboard,
+    completed with their actual image and compared, one row at a time.
+
+    :param deployment: the deployment name
+    :param sink: the sink that receives the rows
+    :param store_path: path to the local store
+    :param source: where the actual images come from, the service endpoint or the token URIs on chain
+    """
 
     config = CONFIG[deployment]
-    print(f"Drawing {RED}{deployment.upper()}{NORMAL} table...")
-
-    token_to_address_file = "token_to_address.json"  # nosec
-    address_to_points_file = "address_to_points.json"  # nosec
-    token_to_hash_file = "token_to_hash.json"  # nosec
-
-    # Get minted tokens
-    if not os.path.isfile(token_to_address_file):
-        print(f"Writing {token_to_address_file}")
-        token_to_address = get_token_to_address(config)
-        with open(token_to_address_file, "w", encoding="utf-8") as outfile:
-            json.dump(token_to_address, outfile, indent=4)
-    else:
-        print(f"Loading {token_to_address_file}")
-        with open(token_to_address_file, "r", encoding="utf-8") as infile:
-            token_to_address = json.load(infile)
-
-    # Read leaderboard
-    if not os.path.isfile(address_to_points_file):
-        print(f"Writing {address_to_points_file}")
-        address_to_points = get_address_to_points(config)
-        with open(address_to_points_file, "w", encoding="utf-8") as outfile:
-            json.dump(address_to_points, outfile, indent=4)
-    else:
-        print(f"Loading {address_to_points_file}")
-        with open(address_to_points_file, "r", encoding="utf-8") as infile:
-            address_to_points = json.load(infile)
-
-    # Get expected image hash
-    if not os.path.isfile(token_to_hash_file):
-        print(f"Writing {token_to_hash_file}")
-        token_to_hash = {
-            token_id: get_token_image_hash(token_id, config)
-            for token_id in token_to_address.keys()
+    contract_address = config["dynamic_contribution_contract_address"].lower()
+    store = VerificationStore(store_path)
+
+    try:
+        # Get minted tokens
+        MintIndex(store).update(deployment, config)
+
+        # Read leaderboard
+        refresh_leaderboard(store, deployment, config)
+        engine = VerificationEngine(
+            store.get_points(deployment, config["leaderboard_sheet_id"]),
+            TierResolver.from_service_config(),
+        )
+
+        # Fetched images are saved periodically, so an interrupted run resumes
+        # from the tokens that are still missing or stale.
+        fetched: Dict[str, str] = {}
+
+        def save_image_hash(token_id: str, image_hash: str) -> None:
+            """Record an image hash, checkpointing every few tokens"""
+            fetched[token_id] = image_hash
+            if len(fetched) >= CHECKPOINT_INTERVAL:
+                store.set_image_hashes(deployment, contract_address, fetched)
+                fetched.clear()
+
+        snapshot = Snapshot(engine.tiers)
+        rows = store.iter_mints(deployment, contract_address)
+        rows = engine.join_points(rows)
+        client = MetadataClient(config["service_endpoint"])
+        if source == "chain":
+            rows = fetch_images_onchain(
+                rows,
+                TokenReader(config["infura_url"], contract_address),
+                client,
+                config["ttl"]["images"],
+                on_result=save_image_hash,
+            )
+        else:
+            rows = fetch_images(
+                rows, client, config["ttl"]["images"], on_result=save_image_hash
+            )
+        try:
+            for row in engine.verdict(rows):
+                snapshot.add(row)
+                sink.write(row)
+        finally:
+            store.set_image_hashes(deployment, contract_address, fetched)
+        store.add_snapshot(deployment, len(snapshot), snapshot.to_bytes())
+
+        for row in engine.get_unminted():
+            sink.write(row)
+        sink.close()
+    finally:
+        store.close()
+
+
+class Metrics:
+    """Thread-safe gauges exported in the Prometheus text format"""
+
+    def __init__(self, prefix: str = "contribute_verify") -> None:
+        """Constructor"""
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.gauges: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge"""
+        with self.lock:
+            self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def reset(self, name: str) -> None:
+        """Remove all the label combinations of a gauge"""
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def render(self) -> str:
+        """Render the gauges in the Prometheus text format"""
+        lines = []
+        with self.lock:
+            for name, samples in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {self.prefix}_{name} gauge")
+                for labels, value in samples.items():
+                    label_str = ",".join(f'{key}="{val}"' for key, val in labels)
+                    label_str = f"{{{label_str}}}" if label_str else ""
+                    lines.append(f"{self.prefix}_{name}{label_str} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the metrics at /metrics from a background thread"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Metrics request handler"""
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                """Handle a GET request"""
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                """Do not log every scrape"""
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class Watcher:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """Keeps the verification up to date, re-checking only the tokens that could have changed"""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        deployment: str,
+        store: VerificationStore,
+        client: MetadataClient,
+        tiers: TierResolver,
+        metrics: Metrics,
+        sink: Sink,
+    ) -> None:
+        """Constructor"""
+        self.deployment = deployment
+        self.config = CONFIG[deployment]
+        self.contract_address = self.config[
+            "dynamic_contribution_contract_address"
+        ].lower()
+        self.store = store
+        self.client = client
+        self.tiers = tiers
+        self.metrics = metrics
+        self.sink = sink
+
+        self.mints: Dict[str, Dict[str, Any]] = {}
+        self.address_to_tokens: Dict[str, List[str]] = {}
+        self.address_to_points: Dict[str, str] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def _add_mints(self, mints: Iterable[Dict[str, Any]]) -> Set[str]:
+        """Merge mints into the in-memory index, returning their token ids"""
+        token_ids = set()
+        touched_addresses = set()
+        for mint in mints:
+            previous = self.mints.get(mint["token_id"])
+            if previous:
+                touched_addresses.add(normalize_address(previous["address"]))
+            self.mints[mint["token_id"]] = mint
+            touched_addresses.add(normalize_address(mint["address"]))
+            token_ids.add(mint["token_id"])
+        self._order_mints(touched_addresses)
+        return token_ids
+
+    def _remove_mints(self, token_ids: Iterable[str]) -> Set[str]:
+        """Drop mints from the in-memory index, returning the remaining token ids of their addresses"""
+        touched_addresses = set()
+        for token_id in token_ids:
+            mint = self.mints.pop(token_id)
+            self.results.pop(token_id, None)
+            touched_addresses.add(normalize_address(mint["address"]))
+        self._order_mints(touched_addresses)
+        return {
+            token_id
+            for address in touched_addresses
+            for token_id in self.address_to_tokens.get(address, [])
         }
-        with open(token_to_hash_file, "w", encoding="utf-8") as outfile:
-            json.dump(token_to_hash, outfile, indent=4)
-    else:
-        print(f"Loading {token_to_hash_file}")
-        with open(token_to_hash_file, "r", encoding="utf-8") as infile:
-            token_to_hash = json.load(infile)
-
-    # Build table
-    table = []
-    for token_id, address in token_to_address.items():
-        token_data = {
-            "token_id": token_id,
-            "address": address,
-            "points": address_to_points[address]
-            if address in address_to_points
-            else "N/A",
+
+    def _order_mints(self, addresses: Set[str]) -> None:
+        """Rebuild the mint order of some addresses"""
+        for address in addresses:
+            self.address_to_tokens.pop(address, None)
+        for mint in sorted(
+            (
+                mint
+                for mint in self.mints.values()
+                if normalize_address(mint["address"]) in addresses
+            ),
+            key=lambda mint: (mint["block"], mint["log_index"]),
+        ):
+            self.address_to_tokens.setdefault(
+                normalize_address(mint["address"]), []
+            ).append(mint["token_id"])
+
+    def _changed_addresses(self, address_to_points: Dict[str, str]) -> Set[str]:
+        """Get the normalized addresses whose points changed"""
+        old = {
+            normalize_address(address): points
+            for address, points in self.address_to_points.items()
+        }
+        new = {
+            normalize_address(address): points
+            for address, points in address_to_points.items()
         }
+        return {
+            address
+            for address in old.keys() | new.keys()
+            if old.get(address) != new.get(address)
+        }
+
+    def poll(self) -> None:
+        """Pick up new mints and leaderboard changes and re-verify the affected tokens"""
+        cycle_start = time.monotonic()
 
-        token_data["expected_image"] = (
-            get_image(token_data["points"])
-            if address in address_to_points
-            else POINT_TO_HASHES["0"]
+        # New mints, including the ones re-read after a reorg
+        start = time.monotonic()
+        if self.mints:
+            candidates = self._add_mints(
+                MintIndex(self.store).update(self.deployment, self.config)
+            )
+            # Mints dropped by a reorg are no longer stored
+            removed = self.mints.keys() - self.store.get_token_ids(
+                self.deployment, self.contract_address
+            )
+            if removed:
+                candidates.difference_update(removed)
+                candidates.update(self._remove_mints(removed))
+        else:
+            MintIndex(self.store).update(self.deployment, self.config)
+            candidates = self._add_mints(
+                self.store.get_mints(self.deployment, self.contract_address).values()
+            )
+        self.metrics.set("phase_seconds", time.monotonic() - start, phase="mints")
+
+        # Tokens of the addresses whose points changed
+        start = time.monotonic()
+        if (
+            refresh_leaderboard(self.store, self.deployment, self.config)
+            or not self.address_to_points
+        ):
+            address_to_points = self.store.get_points(
+                self.deployment, self.config["leaderboard_sheet_id"]
+            )
+            for address in self._changed_addresses(address_to_points):
+                candidates.update(self.address_to_tokens.get(address, []))
+            self.address_to_points = address_to_points
+        self.metrics.set("phase_seconds", time.monotonic() - start, phase="leaderboard")
+
+        # Failing tokens might have been fixed by the service in the meantime
+        candidates.update(
+            token_id for token_id, row in self.results.items() if not row["ok"]
         )
-        token_data["image"] = token_to_hash[token_id]
-        token_data["ok"] = token_data["expected_image"] == token_data["image"]
-
-        table.append(token_data)
-
-    # Account for multiple tokens per address
-    # Only the first token gets the improved image
-    visited_addresses = []
-    for row in table:
-        address = row["address"]
-        if address in visited_addresses:
-            row["expected_image"] = POINT_TO_HASHES["0"]
-            row["ok"] = row["expected_image"] == row["image"]
-        visited_addresses.append(address)
 
-    # Print table
+        # Actual images. On the first cycle the cached ones are still used.
+        start = time.monotonic()
+        token_to_hash = {}
+        if not self.results:
+            token_to_hash = self.store.get_image_hashes(
+                self.deployment, self.contract_address, ttl=self.config["ttl"]["images"]
+            )
+        fetched = self.client.get_image_hashes(
+            token_id for token_id in candidates if token_id not in token_to_hash
+        )
+        self.store.set_image_hashes(self.deployment, self.contract_address, fetched)
+        token_to_hash.update(fetched)
+        self.metrics.set("phase_seconds", time.monotonic() - start, phase="images")
+
+        # Verdict
+        start = time.monotonic()
+        engine = VerificationEngine(self.address_to_points, self.tiers)
+        mints = sorted(
+            (self.mints[token_id] for token_id in candidates),
+            key=lambda mint: (mint["block"], mint["log_index"]),
+        )
+        rows = engine.join_points(
+            {
+                **mint,
+                "is_first": self.address_to_tokens[normalize_address(mint["address"])][
+                    0
+                ]
+                == mint["token_id"],
+                "image": token_to_hash.get(mint["token_id"]),
+            }
+            for mint in mints
+        )
+        for row in engine.verdict(rows):
+            self.results[row["token_id"]] = row
+            self.sink.write(row)
+        self.metrics.set("phase_seconds", time.monotonic() - start, phase="verify")
+
+        self._export(len(candidates), time.monotonic() - cycle_start)
+
+    def _export(self, reverified: int, cycle_seconds: float) -> None:
+        """Export the state of the verification"""
+        tiers: Dict[str, int] = {
+            str(threshold): 0 for threshold in self.tiers.thresholds
+        }
+        image_to_threshold = dict(zip(self.tiers.image_hashes, self.tiers.thresholds))
+        for row in self.results.values():
+            tiers[str(image_to_threshold[row["expected_image"]])] += 1
+
+        self.metrics.set("tokens", len(self.results))
+        self.metrics.set(
+            "mismatches", sum(1 for row in self.results.values() if not row["ok"])
+        )
+        self.metrics.set("reverified_tokens", reverified)
+        self.metrics.reset("tier_tokens")
+        for threshold, count in tiers.items():
+            self.metrics.set("tier_tokens", count, tier=threshold)
+        self.metrics.set("phase_seconds", cycle_seconds, phase="cycle")
+        self.metrics.set("last_success_timestamp_seconds", time.time())
+
+
+def watch(  # pylint: disable=too-many-arguments
+    deployment: str,
+    sink: Sink,
+    interval: float = WATCH_INTERVAL,
+    metrics_port: int = METRICS_PORT,
+    store_path: str = STORE_FILE,
+) -> None:
+    """
+    Verify continuously, every interval seconds.
+
+    :param deployment: the deployment name
+    :param sink: the sink that receives the re-verified rows
+    :param interval: seconds between polls
+    :param metrics_port: port of the metrics endpoint
+    :param store_path: path to the local store
+    """
+    metrics = Metrics()
+    server = metrics.serve(metrics_port)
     print(
-        "\nID                    ADDRESS                        POINTS   EXP_IMAGE     IMAGE     OK"
+        f"Serving metrics at http://127.0.0.1:{metrics_port}/metrics", file=sys.stderr
     )
-    print("-" * 90)
-    for row in table:
-        color = NORMAL if row["ok"] else RED
+    store = VerificationStore(store_path)
+    watcher = Watcher(
+        deployment,
+        store,
+        MetadataClient(CONFIG[deployment]["service_endpoint"]),
+        TierResolver.from_service_config(),
+        metrics,
+        sink,
+    )
+    try:
+        while True:
+            try:
+                watcher.poll()
+            except (
+                requests.exceptions.RequestException,
+                sqlite3.Error,
+                Web3Exception,
+                ValueError,
+            ) as e:
+                print(f"{RED}Verification failed: {e}{NORMAL}", file=sys.stderr)
+            time.sleep(interval)
+    finally:
+        server.shutdown()
+        store.close()
+
+
+def resolve_snapshot(snapshots: List[Tuple[float, int, int]], reference: str) -> float:
+    """Get the creation time of a snapshot referenced by its position, i.e. -1 for the latest, or its creation time"""
+    try:
+        return snapshots[int(reference)][0]
+    except (ValueError, IndexError):
+        pass
+    for created_at, *_ in snapshots:
+        if str(created_at) == reference:
+            return created_at
+    raise ValueError(f"There is no snapshot {reference}")
+
+
+def list_snapshots(deployment: str, store_path: str = STORE_FILE) -> None:
+    """Print the stored snapshots of a deployment"""
+    store = VerificationStore(store_path)
+    try:
+        snapshots = store.get_snapshots(deployment)
+    finally:
+        store.close()
+    print(f"{'#':>4}  {'CREATED_AT':<20} {'DATE':<20} {'ROWS':>8} {'BYTES':>10}")
+    for i, (created_at, rows, size) in enumerate(snapshots):
+        date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
         print(
-            f"{color}{row['token_id']:>3}    {row['address']:>40}    {row['points']:>6}    {row['expected_image'][-8:]:>8}    {row['image'][-8:]:>8}   {row['ok']}{NORMAL}"
+            f"{i - len(snapshots):>4}  {created_at:<20} {date:<20} {rows:>8} {size:>10}"
         )
 
-    print("-" * 90)
-    for address, points in address_to_points.items():
-        if address not in token_to_address.values():
-            print(
-                f"{'N/A':>3}    {address:>40}    {points:>6}    {'N/A':>8}    {'N/A':>8}   N/A"
+
+def diff(
+    deployment: str,
+    references: Sequence[str] = ("-2", "-1"),
+    store_path: str = STORE_FILE,
+    stream: TextIO = sys.stdout,
+    as_json: bool = False,
+) -> None:
+    """
+    Print the changes between two stored snapshots.
+
+    :param deployment: the deployment name
+    :param references: the older and newer snapshots, by position or creation time
+    :param store_path: path to the local store
+    :param stream: the stream to print to
+    :param as_json: print the changes as JSON lines
+    """
+    store = VerificationStore(store_path)
+    try:
+        snapshots = store.get_snapshots(deployment)
+        old, new = (
+            Snapshot.from_bytes(
+                store.get_snapshot(deployment, resolve_snapshot(snapshots, reference))
             )
+            for reference in references
+        )
+    finally:
+        store.close()
+
+    counts = dict.fromkeys(DIFF_CHANGES, 0)
+    for change in diff_snapshots(old, new):
+        counts[change["change"]] += 1
+        if as_json:
+            stream.write(json.dumps(change) + "\n")
+            continue
+        color = RED if change["change"] == "failing" else NORMAL
+        print(
+            f"{color}{change['change']:<8} {change['token_id']:>6}    {change['address']:>42}    {change['before']} -> {change['after']}{NORMAL}",
+            file=stream,
+        )
+    print(
+        ", ".join(f"{count} {change}" for change, count in counts.items()),
+        file=sys.stderr,
+    )
+
+
+def draw_table(deployment: str) -> None:
+    """Prints the verification table"""
+    print(f"Drawing {RED}{deployment.upper()}{NORMAL} table...", file=sys.stderr)
+    verify(deployment, TableSink())
+
+
+def main() -> None:
+    """Run the verification"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("deployment", choices=sorted(CONFIG), nargs="?", default="prod")
+    parser.add_argument("-f", "--format", choices=sorted(SINKS), default="table")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="Write the rows to a file instead of stdout"
+    )
+    parser.add_argument("--store", default=STORE_FILE, help="Path to the local store")
+    parser.add_argument(
+        "--source",
+        choices=IMAGE_SOURCES,
+        default="endpoint",
+        help="Read the images from the service endpoint, or from the token URIs on chain",
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="Keep verifying the changed tokens"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=WATCH_INTERVAL, help="Seconds between polls"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=METRICS_PORT, help="Metrics endpoint port"
+    )
+    parser.add_argument(
+        "--snapshots", action="store_true", help="List the stored snapshots"
+    )
+    parser.add_argument(
+        "--diff",
+        nargs="*",
+        metavar="SNAPSHOT",
+        help="Print the changes between two snapshots, by position or creation time, the last two by default",
+    )
+    args = parser.parse_args()
+    if args.watch and args.source != "endpoint":
+        parser.error("--watch reads the images from the service endpoint")
+    if args.diff is not None and len(args.diff) not in (0, 2):
+        parser.error("--diff takes either no snapshots or two of them")
+
+    if args.snapshots:
+        list_snapshots(args.deployment, store_path=args.store)
+        return
+    if args.diff is not None:
+        diff(
+            args.deployment,
+            args.diff or ("-2", "-1"),
+            store_path=args.store,
+            as_json=args.format == "jsonl",
+        )
+        return
+
+    def run(sink: Sink) -> None:
+        """Run the requested verification"""
+        if args.watch:
+            watch(
+                args.deployment,
+                sink,
+                interval=args.interval,
+                metrics_port=args.metrics_port,
+                store_path=args.store,
+            )
+        else:
+            verify(args.deployment, sink, store_path=args.store, source=args.source)
+
+    if args.output is None:
+        run(SINKS[args.format]())
+        return
+
+    with open(args.output, "w", encoding="utf-8", newline="") as stream:
+        run(SINKS[args.format](stream))
 
 
-draw_table("prod")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for bump.py."""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+from aea.configurations.data_types import PackageId
+from aea.helpers.ipfs.base import IPFSHashOnly
+from aea.package_manager.v1 import PackageManagerV1
+from click.testing import CliRunner
+
+from autonomy.cli.helpers.ipfs_hash import load_configuration
+from scripts import bump
+from scripts.bump import (
+    HashManifest,
+    PackageStore,
+    StoredPackageManager,
+    apply_plan,
+    main,
+    plan_bump,
+)
+
+
+PIPFILE = """[dev-packages]
+open-aea = "==1.48.0"
+open-aea-ledger-ethereum = "==1.48.0"
+open-autonomy = {version = "==0.14.6", extras = ["all"]}
+openai = "==0.27.2"
+"""
+TOX_INI = """[testenv]
+deps =
+    open-aea==1.48.0
+    open-autonomy==0.14.6
+    openai==0.27.2
+"""
+SKILL_YAML = """name: {name}
+author: valory
+version: 0.1.0
+type: skill
+description: {name}.
+license: Apache-2.0
+aea_version: '>=1.0.0, <2.0.0'
+fingerprint: {{}}
+fingerprint_ignore_patterns: []
+connections: []
+contracts: []
+protocols: []
+skills: {skills}
+behaviours: {{}}
+handlers: {{}}
+models: {{}}
+dependencies: {dependencies}
+is_abstract: true
+"""
+SKILLS = {
+    "a": ([], {"open-aea": {"version": "==1.48.0"}}),
+    "b": (["a"], {}),
+    "c": (["b"], {}),
+    "d": ([], {}),
+}
+DEPENDENCIES = {"open-aea": "==1.50.0", "open-autonomy": "==0.15.0"}
+PLACEHOLDER_HASH = "bafybei" + "a" * 52
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Repository with a Pipfile, a tox.ini and dev skills, with the caches out of it"""
+    repo = tmp_path / "repo"
+    packages = repo / "packages"
+    for path in (packages, packages / "valory", packages / "valory" / "skills"):
+        path.mkdir(parents=True)
+        (path / "__init__.py").write_text("", encoding="utf-8")
+    for name, (skills, dependencies) in SKILLS.items():
+        skill = packages / "valory" / "skills" / name
+        skill.mkdir()
+        (skill / "__init__.py").write_text(f'"""{name}"""\n', encoding="utf-8")
+        (skill / "skill.yaml").write_text(
+            SKILL_YAML.format(
+                name=name,
+                skills=json.dumps(
+                    [
+                        f"valory/{dependency}:0.1.0:{PLACEHOLDER_HASH}"
+                        for dependency in skills
+                    ]
+                ),
+                dependencies=json.dumps(dependencies),
+            ),
+            encoding="utf-8",
+        )
+    (packages / "packages.json").write_text(
+        json.dumps(
+            {
+                "dev": {f"skill/valory/{name}/0.1.0": "" for name in SKILLS},
+                "third_party": {},
+            }
+        ),
+        encoding="utf-8",
+    )
+    (repo / "Pipfile").write_text(PIPFILE, encoding="utf-8")
+    (repo / "tox.ini").write_text(TOX_INI, encoding="utf-8")
+
+    monkeypatch.chdir(repo)
+    monkeypatch.setattr(bump, "PIPFILE", repo / "Pipfile")
+    monkeypatch.setattr(bump, "PYPROJECT_TOML", repo / "pyproject.toml")
+    monkeypatch.setattr(bump, "TOX_INI", repo / "tox.ini")
+    monkeypatch.setattr(bump, "_legacy_cache_file", tmp_path / "aea" / ".gitcache")
+    monkeypatch.setattr(bump, "_cache_file", tmp_path / "aea" / ".gitcache.v2")
+    monkeypatch.setattr(bump, "_package_store", tmp_path / "aea" / "package_store")
+    monkeypatch.setattr(bump, "_hash_manifest_file", repo / ".package_hashes.json")
+    monkeypatch.setattr(bump, "_version_cache", {})
+    monkeypatch.setattr(bump, "get_dependencies", lambda: dict(DEPENDENCIES))
+    return repo
+
+
+def read_files(path: Path) -> Dict[Path, bytes]:
+    """Read all the files of a directory"""
+    return {file: file.read_bytes() for file in path.rglob("*") if file.is_file()}
+
+
+def test_plan_round_trip(repo: Path) -> None:
+    """Applying a plan writes its updates, after which there is nothing to plan"""
+    skill_yaml = repo / "packages" / "valory" / "skills" / "a" / "skill.yaml"
+    files = read_files(repo)
+
+    # Package paths are relative to the working directory, i.e. the repository
+    plan = {path.absolute(): update for path, update in plan_bump(DEPENDENCIES).items()}
+
+    assert set(plan) == {repo / "Pipfile", repo / "tox.ini", skill_yaml}
+    assert read_files(repo) == files
+    for path, (content, _) in plan.items():
+        assert content == files[path].decode("utf-8")
+    assert 'open-aea = "==1.50.0"' in plan[repo / "Pipfile"][1]
+    assert 'open-autonomy = {version = "==0.15.0", extras = ["all"]}' in (
+        plan[repo / "Pipfile"][1]
+    )
+    assert 'open-aea-ledger-ethereum = "==1.48.0"' in plan[repo / "Pipfile"][1]
+    assert (
+        "    open-autonomy==0.15.0\n    openai==0.27.2\n" in plan[repo / "tox.ini"][1]
+    )
+    assert "==1.50.0" in plan[skill_yaml][1]
+
+    apply_plan(plan)
+
+    for path, (_, updated) in plan.items():
+        assert path.read_text(encoding="utf-8") == updated
+    assert {
+        path: content for path, content in read_files(repo).items() if path not in plan
+    } == {path: content for path, content in files.items() if path not in plan}
+    assert not plan_bump(DEPENDENCIES)
+
+
+def test_dry_run_writes_nothing(repo: Path) -> None:
+    """A dry run prints the diff of the updates and writes no file"""
+    files = read_files(repo)
+
+    result = CliRunner().invoke(main, ["--dry-run"])
+
+    assert result.exit_code == 0, result.output
+    assert '+open-aea = "==1.50.0"' in result.output
+    assert '-open-aea = "==1.48.0"' in result.output
+    assert "+    open-autonomy==0.15.0" in result.output
+    assert read_files(repo) == files
+
+
+@pytest.fixture(name="remote")
+def fixture_remote(tmp_path: Path) -> Path:
+    """Package served by the fake IPFS fetch"""
+    remote = tmp_path / "remote" / "foo"
+    remote.mkdir(parents=True)
+    (remote / "__init__.py").write_text('"""foo"""\n', encoding="utf-8")
+    (remote / "protocol.yaml").write_text("name: foo\n", encoding="utf-8")
+    return remote
+
+
+@pytest.fixture(name="fetched")
+def fixture_fetched(remote: Path, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Fake IPFS fetch of the remote package, which records the fetched packages"""
+    fetched: List[str] = []
+
+    def fetch_ipfs(
+        _package_type: str, public_id: Any, dest: str, _remote: bool
+    ) -> Path:
+        fetched.append(str(public_id))
+        shutil.copytree(remote, dest)
+        return Path(dest)
+
+    def load_fetch_ipfs() -> Callable:
+        return fetch_ipfs
+
+    monkeypatch.setattr(bump, "load_fetch_ipfs", load_fetch_ipfs)
+    return fetched
+
+
+def get_package_id(package_hash: str) -> PackageId:
+    """Get the id of the foo protocol with a hash"""
+    return PackageId.from_uri_path("protocol/valory/foo/0.1.0").with_hash(package_hash)
+
+
+def test_store_refuses_mismatching_hash(
+    remote: Path, fetched: List[str], tmp_path: Path
+) -> None:
+    """A download whose hash doesn't match the expected one is not stored"""
+    store = PackageStore(tmp_path / "store")
+    package_id = get_package_id(PLACEHOLDER_HASH)
+
+    with pytest.raises(ValueError, match=f"expected {PLACEHOLDER_HASH}"):
+        store.fetch(package_id)
+
+    assert fetched == [str(package_id.public_id)]
+    assert store.get(package_id) is None
+    assert not list(store.path.iterdir())
+    assert IPFSHashOnly.get(str(remote)) != PLACEHOLDER_HASH
+
+
+def test_store_fetches_once(remote: Path, fetched: List[str], tmp_path: Path) -> None:
+    """A package is only downloaded once, and is served offline once stored"""
+    package_id = get_package_id(IPFSHashOnly.get(str(remote)))
+
+    path = PackageStore(tmp_path / "store").fetch(package_id)
+    assert PackageStore(tmp_path / "store", offline=True).fetch(package_id) == path
+    assert fetched == [str(package_id.public_id)]
+
+    with pytest.raises(ValueError, match="can't be fetched offline"):
+        PackageStore(tmp_path / "other_store", offline=True).fetch(package_id)
+
+
+@pytest.mark.usefixtures("fetched")
+def test_restore_copies(remote: Path, tmp_path: Path) -> None:
+    """Restored packages are copies, so editing them leaves the store untouched"""
+    store = PackageStore(tmp_path / "store")
+    package_id = get_package_id(IPFSHashOnly.get(str(remote)))
+    dest = tmp_path / "packages" / "valory" / "protocols" / "foo"
+
+    store.restore(package_id, dest)
+
+    stored = store.get(package_id)
+    assert stored is not None
+    for name in ("__init__.py", "protocol.yaml"):
+        assert (dest / name).stat().st_nlink == 1
+        assert (dest / name).stat().st_ino != (stored / name).stat().st_ino
+        assert (dest / name).read_bytes() == (remote / name).read_bytes()
+
+    (dest / "protocol.yaml").write_text("name: bar\n", encoding="utf-8")
+    assert (stored / "protocol.yaml").read_text(encoding="utf-8") == "name: foo\n"
+    assert IPFSHashOnly.get(str(stored)) == package_id.package_hash
+
+
+def test_restore_refetches_corrupted_package(
+    remote: Path, fetched: List[str], tmp_path: Path
+) -> None:
+    """A package modified in the store is downloaded again on restore"""
+    store = PackageStore(tmp_path / "store")
+    package_id = get_package_id(IPFSHashOnly.get(str(remote)))
+    stored = store.fetch(package_id)
+    (stored / "protocol.yaml").write_text("name: bar\n", encoding="utf-8")
+    dest = tmp_path / "packages" / "valory" / "protocols" / "foo"
+
+    store.restore(package_id, dest)
+
+    assert IPFSHashOnly.get(str(dest)) == package_id.package_hash
+    assert IPFSHashOnly.get(str(stored)) == package_id.package_hash
+    assert fetched == [str(package_id.public_id)] * 2
+
+
+@pytest.fixture(name="rehashed")
+def fixture_rehashed(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Record the packages whose hash is calculated"""
+    rehashed: List[str] = []
+    calculate_hash = PackageManagerV1.calculate_hash_from_package_id
+
+    def record_calculate_hash(self: PackageManagerV1, package_id: PackageId) -> str:
+        rehashed.append(package_id.name)
+        return calculate_hash(self, package_id)
+
+    monkeypatch.setattr(
+        PackageManagerV1, "calculate_hash_from_package_id", record_calculate_hash
+    )
+    return rehashed
+
+
+def update_hashes(repo: Path, manifest: Optional[HashManifest]) -> Dict[str, str]:
+    """Update the hashes of the dev packages, and get them"""
+    manager = StoredPackageManager.from_store(
+        repo / "packages",
+        store=PackageStore(repo.parent / "store"),
+        manifest=manifest,
+        config_loader=load_configuration,
+    )
+    manager.update_package_hashes()
+    manager.dump()
+    return {
+        package_id.name: package_hash
+        for package_id, package_hash in manager.dev_packages.items()
+    }
+
+
+def load_manifest(repo: Path) -> HashManifest:
+    """Load the hash manifest of the repository"""
+    manifest = HashManifest(repo / ".package_hashes.json")
+    manifest.load()
+    return manifest
+
+
+def test_manifest_rehashes_changed_packages(repo: Path, rehashed: List[str]) -> None:
+    """Only the changed packages and the ones that depend on them are rehashed"""
+    hashes = update_hashes(repo, load_manifest(repo))
+    assert sorted(rehashed) == ["a", "b", "c", "d"]
+
+    rehashed.clear()
+    assert update_hashes(repo, load_manifest(repo)) == hashes
+    assert not rehashed
+
+    init_file = repo / "packages" / "valory" / "skills" / "a" / "__init__.py"
+    init_file.write_text('"""a changed"""\n', encoding="utf-8")
+    updated_hashes = update_hashes(repo, load_manifest(repo))
+    assert sorted(rehashed) == ["a", "b", "c"]
+    assert {name for name in hashes if hashes[name] != updated_hashes[name]} == {
+        "a",
+        "b",
+        "c",
+    }
+
+    rehashed.clear()
+    assert update_hashes(repo, None) == updated_hashes
+    assert sorted(rehashed) == ["a", "b", "c", "d"]
+
+
+def test_manifest_ignores_touched_files(repo: Path, rehashed: List[str]) -> None:
+    """Files whose mtime changed but not their content don't need a rehash"""
+    hashes = update_hashes(repo, load_manifest(repo))
+    init_file = repo / "packages" / "valory" / "skills" / "d" / "__init__.py"
+    stat = init_file.stat()
+    os.utime(init_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    rehashed.clear()
+
+    assert update_hashes(repo, load_manifest(repo)) == hashes
+    assert not rehashed
+
+
+@pytest.mark.usefixtures("repo")
+def test_full_rehash(rehashed: List[str], monkeypatch: pytest.MonkeyPatch) -> None:
+    """--full-rehash rehashes all the packages after the sync"""
+    monkeypatch.setattr(bump, "get_latest_tag", lambda repo: "v1.0.0")
+    monkeypatch.setattr(StoredPackageManager, "sync", lambda self, **kwargs: self)
+
+    def bump_and_sync(*args: str) -> List[str]:
+        rehashed.clear()
+        result = CliRunner().invoke(main, ["--sync", *args])
+        assert result.exit_code == 0, result.output
+        return sorted(rehashed)
+
+    assert bump_and_sync() == ["a", "b", "c", "d"]
+    assert bump_and_sync() == []
+    assert bump_and_sync("--full-rehash") == ["a", "b", "c", "d"]
+    assert bump_and_sync() == []
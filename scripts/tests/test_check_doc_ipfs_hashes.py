@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for check_doc_ipfs_hashes.py."""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from scripts import check_doc_ipfs_hashes
+from scripts.benchmark_check_doc_ipfs_hashes import make_doc, regex_scan
+from scripts.check_doc_ipfs_hashes import ROOT_DIR, check_ipfs_hashes, scan_file
+
+
+OLD_HASH = "bafybei" + "a" * 52
+NEW_HASH = "bafybei" + "b" * 52
+PACKAGES = {"skill/valory/foo/0.1.0": NEW_HASH}
+REFERENCE = 'PUBLIC_ID = "valory/foo:0.1.0:{}"\n'
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Repository with a skill package and a doc that references it"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(check_doc_ipfs_hashes, "get_packages", lambda: dict(PACKAGES))
+    monkeypatch.setitem(check_doc_ipfs_hashes.VERSION_CACHE, NEW_HASH, "0.1.0")
+    packages_file = tmp_path / "packages" / "packages.json"
+    packages_file.parent.mkdir()
+    packages_file.write_text('{"dev": {}, "third_party": {}}', encoding="utf-8")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "index.md").write_text(
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH}\n", encoding="utf-8"
+    )
+    return tmp_path
+
+
+def write_files(files: Dict[Path, str]) -> None:
+    """Write files, with their directories"""
+    for path, content in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+
+def test_package_files_are_not_fixed(repo: Path) -> None:
+    """Python files of packages are checked but not fixed, other ones are fixed"""
+    package_file = (
+        repo / "packages" / "valory" / "skills" / "foo" / "tests" / "test_foo.py"
+    )
+    script_file = repo / "tools" / "foo.py"
+    write_files(
+        {
+            package_file: REFERENCE.format(OLD_HASH),
+            script_file: REFERENCE.format(OLD_HASH),
+        }
+    )
+
+    with pytest.raises(ValueError, match="errors while fixing"):
+        check_ipfs_hashes(
+            paths=[Path("docs")],
+            fix=True,
+            use_cache=False,
+            max_workers=1,
+            py_paths=[Path("packages"), Path("tools")],
+        )
+
+    assert package_file.read_text(encoding="utf-8") == REFERENCE.format(OLD_HASH)
+    assert script_file.read_text(encoding="utf-8") == REFERENCE.format(NEW_HASH)
+
+
+def test_python_files_are_not_checked_by_default(repo: Path) -> None:
+    """Only the docs are checked unless Python paths are given"""
+    write_files({repo / "tools" / "foo.py": REFERENCE.format(OLD_HASH)})
+
+    check_ipfs_hashes(paths=[Path("docs")], use_cache=False, max_workers=1)
+
+
+def test_fix_several_commands_in_one_file(repo: Path) -> None:
+    """Every stale command of a doc is fixed and the rest of the doc is kept"""
+    doc = repo / "docs" / "index.md"
+    doc.write_text(
+        f"# Fetch\n\nautonomy fetch valory/foo:0.1.0:{OLD_HASH}\n\n"
+        f"Then `autonomy fetch valory/foo:0.1.0:{NEW_HASH} --local` and\n"
+        f"aea fetch valory/foo:0.1.0:{OLD_HASH} --remote\n",
+        encoding="utf-8",
+    )
+
+    check_ipfs_hashes(paths=[Path("docs")], fix=True, use_cache=False, max_workers=1)
+
+    assert doc.read_text(encoding="utf-8") == (
+        f"# Fetch\n\nautonomy fetch valory/foo:0.1.0:{NEW_HASH}\n\n"
+        f"Then `autonomy fetch valory/foo:0.1.0:{NEW_HASH} --local` and\n"
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH} --remote\n"
+    )
+    assert not list(doc.parent.glob(".index.md.*"))
+
+
+def test_fix_dry_run(repo: Path, capsys: pytest.CaptureFixture) -> None:
+    """A dry run prints the fixes as a diff and writes nothing"""
+    doc = repo / "docs" / "index.md"
+    content = (
+        f"autonomy fetch valory/foo:0.1.0:{OLD_HASH}\n"
+        f"aea fetch valory/foo:0.1.0:{OLD_HASH}\n"
+    )
+    doc.write_text(content, encoding="utf-8")
+    script_file = repo / "tools" / "foo.py"
+    write_files({script_file: REFERENCE.format(OLD_HASH)})
+    capsys.readouterr()
+
+    check_ipfs_hashes(
+        paths=[Path("docs")],
+        fix=True,
+        dry_run=True,
+        use_cache=False,
+        max_workers=1,
+        py_paths=[Path("tools")],
+    )
+
+    output = capsys.readouterr().out
+    assert f"-autonomy fetch valory/foo:0.1.0:{OLD_HASH}\n" in output
+    assert f"+autonomy fetch valory/foo:0.1.0:{NEW_HASH}\n" in output
+    assert f"-aea fetch valory/foo:0.1.0:{OLD_HASH}\n" in output
+    assert "+" + REFERENCE.format(NEW_HASH) in output
+    assert "Fixed" not in output
+    assert doc.read_text(encoding="utf-8") == content
+    assert script_file.read_text(encoding="utf-8") == REFERENCE.format(OLD_HASH)
+
+
+def get_scanned_docs(monkeypatch: pytest.MonkeyPatch) -> List[List[Path]]:
+    """Record the docs that every check scans"""
+    scanned: List[List[Path]] = []
+    scan_files = check_doc_ipfs_hashes.scan_files
+
+    def record_scan_files(files: List[Path], *args: Any) -> Any:
+        if files and files[0].suffix == ".md":
+            scanned[-1].extend(files)
+        return scan_files(files, *args)
+
+    monkeypatch.setattr(check_doc_ipfs_hashes, "scan_files", record_scan_files)
+    return scanned
+
+
+def test_cache_invalidation(repo: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Docs are rescanned when they or packages.json change"""
+    scanned = get_scanned_docs(monkeypatch)
+    doc = repo / "docs" / "index.md"
+    other_doc = repo / "docs" / "other.md"
+    other_doc.write_text(
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH} --local\n", encoding="utf-8"
+    )
+
+    def check() -> List[Path]:
+        scanned.append([])
+        check_ipfs_hashes(paths=[Path("docs")], max_workers=1)
+        return sorted(scanned[-1])
+
+    docs = [Path("docs", "index.md"), Path("docs", "other.md")]
+    assert check() == docs
+    assert check() == []
+
+    doc.write_text(
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH} --remote\n", encoding="utf-8"
+    )
+    assert check() == [Path("docs", "index.md")]
+    assert check() == []
+
+    packages_file = repo / "packages" / "packages.json"
+    packages_file.write_text('{"dev": {}, "third_party": {}}\n', encoding="utf-8")
+    assert check() == docs
+    assert check() == []
+
+
+def get_cached_matches(path: Path) -> Optional[int]:
+    """Get the cached number of commands of a file"""
+    cache = check_doc_ipfs_hashes.ScanCache(
+        check_doc_ipfs_hashes.SCAN_CACHE_FILE,
+        check_doc_ipfs_hashes.get_digest(check_doc_ipfs_hashes.PACKAGES_FILE),
+    )
+    return cache.get_matches(path, check_doc_ipfs_hashes.get_digest(path))
+
+
+def test_cache_skips_failed_docs(repo: Path) -> None:
+    """Docs with mismatching hashes are not cached"""
+    doc = repo / "docs" / "index.md"
+    doc.write_text(f"autonomy fetch valory/foo:0.1.0:{OLD_HASH}\n", encoding="utf-8")
+
+    with pytest.raises(SystemExit):
+        check_ipfs_hashes(paths=[Path("docs")], max_workers=1)
+
+    assert get_cached_matches(Path("docs", "index.md")) is None
+
+    doc.write_text(f"autonomy fetch valory/foo:0.1.0:{NEW_HASH}\n", encoding="utf-8")
+    check_ipfs_hashes(paths=[Path("docs")], max_workers=1)
+    assert get_cached_matches(Path("docs", "index.md")) == 1
+
+
+@pytest.mark.parametrize(
+    "doc",
+    sorted((ROOT_DIR / "docs").rglob("*.md")),
+    ids=lambda doc: str(doc.relative_to(ROOT_DIR)),
+)
+def test_scan_commands_matches_regex_on_docs(doc: Path) -> None:
+    """The scanner finds the same commands as the regex in the repository docs"""
+    assert scan_file(doc)
+    assert scan_file(doc) == regex_scan(doc)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        make_doc(300),
+        f"autonomy fetch {NEW_HASH} --alias agent && aea fetch {OLD_HASH}\n",
+        f"aea -s add skill valory/foo:{NEW_HASH}\nautonomy run\n{OLD_HASH}\n",
+        f"`autonomy fetch valory/foo:0.1.0:{NEW_HASH}` and {OLD_HASH} ü\n",
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH} \n--service",
+        f"autonomy fetch valory/foo:0.1.0:{NEW_HASH}",
+        f"autonomy fetch:{NEW_HASH}\n",
+        f"autonomy fetch x{NEW_HASH}\n",
+        "",
+    ],
+)
+def test_scan_commands_matches_regex(content: str, tmp_path: Path) -> None:
+    """The scanner finds the same commands as the regex in edge cases"""
+    doc = tmp_path / "doc.md"
+    doc.write_text(content, encoding="utf-8")
+    assert scan_file(doc) == regex_scan(doc)
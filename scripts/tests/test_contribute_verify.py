@@ -0,0 +1,853 @@
+# -*- coding: utf-8 -*-
+# ------------------------------------------------------------------------------
+#
+#   Copyright 2024 Valory AG
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# ------------------------------------------------------------------------------
+
+"""Tests for contribute_verify.py, against fakes and the benchmark stand-ins."""
+
+import json
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from scripts import contribute_verify
+from scripts.benchmark_contribute_verify import (
+    DYNAMIC_CONTRIBUTION_ABI,
+    Dataset,
+    FakeChain,
+    FakeMetadata,
+    FakeSheets,
+    json_response,
+)
+from scripts.contribute_verify import (
+    CONFIG,
+    LeaderboardReader,
+    LogRangeFetcher,
+    MetadataClient,
+    MintIndex,
+    NOT_AVAILABLE,
+    POINT_TO_HASHES,
+    SERVICE_CONFIG_PATH,
+    Snapshot,
+    TierResolver,
+    TokenReader,
+    VerificationEngine,
+    VerificationStore,
+    diff_snapshots,
+    fetch_images_onchain,
+    load_points_to_image_hashes,
+)
+
+
+TOKENS = 30
+BATCH_SIZE = 10
+LEADERBOARD = [[f"0x{i:040x}", str(i * 100)] for i in range(23)]
+LOG_BLOCKS = range(0, 1000, 10)
+MAX_LOGS = 10
+CONFIRMATION_DEPTH = 50
+
+# Mints in mint order, with several tokens per address and leaderboard points
+# at the exact tier thresholds
+VERIFY_MINTS = [
+    ("1", "0x01", 1, 0),
+    ("2", "0x02", 1, 1),
+    ("3", "0x01", 2, 0),
+    ("4", "0x03", 3, 0),
+    ("5", "0x04", 4, 0),
+    ("6", "0x05", 5, 0),
+    ("7", "0x06", 6, 0),
+    ("8", "0x07", 7, 0),
+    ("9", "0x08", 8, 0),
+    ("10", "0x09", 9, 0),
+    ("11", "0x0a", 10, 0),
+    ("12", "0x02", 11, 0),
+]
+VERIFY_POINTS = {
+    "0x01": "99",
+    "0x02": "100",
+    "0x03": "0",
+    "0x04": "49999",
+    "0x05": "50000",
+    "0x06": "100000",
+    "0x07": "149999",
+    "0x08": "150000",
+    "0x0b": "200000",
+}
+
+
+class FailingChain(FakeChain):
+    """Chain stand-in whose first requests fail"""
+
+    def __init__(self, *args: Any, failures: int = 1) -> None:
+        """Constructor"""
+        self.failures = failures
+        self.lock = threading.Lock()
+        super().__init__(*args)
+
+    def handle(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple:
+        """Fail while there are failures left, then serve the request"""
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                return json_response({"error": "unavailable"}, status=503)
+        return super().handle(method, path, body, headers)
+
+
+@pytest.fixture(name="dataset")
+def fixture_dataset() -> Dataset:
+    """Synthetic dataset"""
+    return Dataset(TOKENS)
+
+
+@pytest.fixture(name="metadata")
+def fixture_metadata(dataset: Dataset) -> Iterator[FakeMetadata]:
+    """Token metadata endpoint stand-in"""
+    metadata = FakeMetadata(dataset)
+    yield metadata
+    metadata.server.close()
+
+
+def get_rows(dataset: Dataset) -> List[Dict[str, Any]]:
+    """Get the rows of the minted tokens, without an image"""
+    return [
+        {"token_id": str(token_id), "address": address, "image": None}
+        for _, _, token_id, address in dataset.mints
+    ]
+
+
+def read_images(
+    chain: FakeChain, metadata: FakeMetadata, dataset: Dataset
+) -> Dict[str, Optional[str]]:
+    """Read the images of every token from the chain stand-in"""
+    reader = TokenReader(
+        chain.server.url,
+        CONFIG["prod"]["dynamic_contribution_contract_address"],
+        batch_tokens=BATCH_SIZE,
+        max_workers=1,
+        retries=0,
+    )
+    return {
+        row["token_id"]: row["image"]
+        for row in fetch_images_onchain(
+            get_rows(dataset),
+            reader,
+            MetadataClient(metadata.server.url, retries=0),
+            ttl=0,
+        )
+    }
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Verify in several batches"""
+    monkeypatch.setattr(contribute_verify, "VERIFY_BATCH_SIZE", BATCH_SIZE)
+
+
+def test_fetch_images_onchain(dataset: Dataset, metadata: FakeMetadata) -> None:
+    """Every token gets the image of its on-chain token URI"""
+    chain = FakeChain(
+        dataset,
+        CONFIG["prod"]["dynamic_contribution_contract_address"],
+        f"{metadata.server.url}/",
+    )
+    try:
+        images = read_images(chain, metadata, dataset)
+    finally:
+        chain.server.close()
+
+    assert images == {
+        str(token_id): image for token_id, image in dataset.images.items()
+    }
+
+
+def test_fetch_images_onchain_failed_batch(
+    dataset: Dataset, metadata: FakeMetadata, capsys: pytest.CaptureFixture
+) -> None:
+    """The tokens of a batch whose eth_calls fail are reported without an image"""
+    chain = FailingChain(
+        dataset,
+        CONFIG["prod"]["dynamic_contribution_contract_address"],
+        f"{metadata.server.url}/",
+    )
+    try:
+        images = read_images(chain, metadata, dataset)
+    finally:
+        chain.server.close()
+
+    failed = [str(token_id) for _, _, token_id, _ in dataset.mints[:BATCH_SIZE]]
+    assert len(images) == TOKENS
+    assert all(images[token_id] is None for token_id in failed)
+    assert all(
+        images[str(token_id)] == image
+        for token_id, image in dataset.images.items()
+        if str(token_id) not in failed
+    )
+    errors = capsys.readouterr().err
+    assert all(
+        f"Could not read the URI of token {token_id}" in errors for token_id in failed
+    )
+
+
+@pytest.fixture(name="sheets")
+def fixture_sheets(dataset: Dataset) -> Iterator[FakeSheets]:
+    """Leaderboard sheet stand-in"""
+    sheets = FakeSheets(dataset)
+    sheets.update(LEADERBOARD)
+    yield sheets
+    sheets.server.close()
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path: Path) -> Iterator[VerificationStore]:
+    """Empty local store"""
+    store = VerificationStore(str(tmp_path / "contribute_verify.db"))
+    yield store
+    store.close()
+
+
+def get_reader(
+    sheets: FakeSheets, store: Optional[VerificationStore] = None, chunk_rows: int = 4
+) -> LeaderboardReader:
+    """Get a leaderboard reader of the sheet stand-in"""
+    config = {
+        **CONFIG["prod"],
+        "leaderboard_base_endpoint": f"{sheets.server.url}/v4/spreadsheets",
+        "leaderboard_drive_endpoint": f"{sheets.server.url}/drive/v3/files",
+        "leaderboard_api_key": "test",
+    }
+    return LeaderboardReader(
+        config, store, chunk_rows=chunk_rows, max_workers=2, retries=0
+    )
+
+
+@pytest.mark.parametrize("chunk_rows", [4, len(LEADERBOARD), 1000])
+def test_leaderboard_paging(sheets: FakeSheets, chunk_rows: int) -> None:
+    """The whole range is read, whether its last chunk is partial, full or the first one"""
+    assert get_reader(sheets, chunk_rows=chunk_rows).read() == dict(LEADERBOARD)
+
+
+def test_leaderboard_unchanged_sheet(
+    sheets: FakeSheets, store: VerificationStore
+) -> None:
+    """An unchanged sheet is not read again, a modified one is"""
+    assert get_reader(sheets, store).read() == dict(LEADERBOARD)
+
+    sheets.server.reset()
+    assert get_reader(sheets, store).read() == dict(LEADERBOARD)
+    assert sheets.server.requests == 1
+
+    leaderboard = [[address, str(int(points) + 1)] for address, points in LEADERBOARD]
+    sheets.update(leaderboard)
+    assert get_reader(sheets, store).read() == dict(leaderboard)
+
+
+def test_leaderboard_unchanged_chunks(
+    sheets: FakeSheets, store: VerificationStore, capsys: pytest.CaptureFixture
+) -> None:
+    """Without the modification time, unchanged chunks are not downloaded again"""
+    sheets.drive_available = False
+    assert get_reader(sheets, store).read() == dict(LEADERBOARD)
+
+    capsys.readouterr()
+    assert get_reader(sheets, store).read() == dict(LEADERBOARD)
+    assert f"Read {len(LEADERBOARD)} leaderboard rows, 0 chunks downloaded" in (
+        capsys.readouterr().err
+    )
+
+
+class FailingSheets(FakeSheets):
+    """Sheet stand-in whose values:batchGet fails for some ranges"""
+
+    def __init__(self, *args: Any) -> None:
+        """Constructor"""
+        self.failing: Set[str] = set()
+        super().__init__(*args)
+
+    def batch_get(self, path: str, headers: Dict[str, str]) -> Tuple[int, Dict, bytes]:
+        """Fail for the failing ranges, serve the other ones"""
+        if self.failing & set(parse_qs(urlparse(path).query).get("ranges", [])):
+            return json_response({"error": "unavailable"}, status=503)
+        return super().batch_get(path, headers)
+
+
+@pytest.fixture(name="failing_sheets")
+def fixture_failing_sheets(dataset: Dataset) -> Iterator[FailingSheets]:
+    """Leaderboard sheet stand-in without the Drive API, whose chunks can fail"""
+    sheets = FailingSheets(dataset)
+    sheets.update(LEADERBOARD)
+    sheets.drive_available = False
+    yield sheets
+    sheets.server.close()
+
+
+def get_chunk_range(reader: LeaderboardReader, chunk: int) -> str:
+    """Get the sheet range of a chunk"""
+    return reader._get_chunk_range(chunk)  # pylint: disable=protected-access
+
+
+def get_cached_chunk(
+    reader: LeaderboardReader, store: VerificationStore, chunk: int
+) -> Optional[List[List[str]]]:
+    """Get the cached values of a chunk"""
+    cached = store.get_http_cache(f"{reader.sheet_id}/{get_chunk_range(reader, chunk)}")
+    return json.loads(cached["body"]) if cached else None
+
+
+def test_leaderboard_failed_chunk_cached(
+    failing_sheets: FailingSheets,
+    store: VerificationStore,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    """A chunk that can't be read is replaced by its cached values"""
+    reader = get_reader(failing_sheets, store)
+    assert reader.read() == dict(LEADERBOARD)
+
+    leaderboard = [[address, str(int(points) + 1)] for address, points in LEADERBOARD]
+    failing_sheets.update(leaderboard)
+    failing_sheets.failing.add(get_chunk_range(reader, 1))
+    capsys.readouterr()
+
+    assert reader.read() == {**dict(leaderboard), **dict(LEADERBOARD[4:8])}
+    assert "Could not read the leaderboard chunk" in capsys.readouterr().err
+    assert get_cached_chunk(reader, store, 1) == LEADERBOARD[4:8]
+    assert get_cached_chunk(reader, store, 2) == leaderboard[8:12]
+
+
+def test_leaderboard_failed_chunk_full_read(
+    failing_sheets: FailingSheets,
+    store: VerificationStore,
+    capsys: pytest.CaptureFixture,
+) -> None:
+    """Without cached values, the whole range is read at once and the other chunks are cached"""
+    reader = get_reader(failing_sheets, store)
+    failing_sheets.failing.add(get_chunk_range(reader, 1))
+
+    assert reader.read() == dict(LEADERBOARD)
+    assert "Reading the whole leaderboard range at once" in capsys.readouterr().err
+    assert get_cached_chunk(reader, store, 0) == LEADERBOARD[:4]
+    assert get_cached_chunk(reader, store, 1) is None
+
+    failing_sheets.failing.add(CONFIG["prod"]["leaderboard_points_range"])
+    store.connection.execute("DELETE FROM http_cache")
+    with pytest.raises(requests.exceptions.RequestException):
+        reader.read()
+    assert get_cached_chunk(reader, store, 0) == LEADERBOARD[:4]
+
+
+class FakeLogs:  # pylint: disable=too-few-public-methods
+    """eth_getLogs stand-in with a log every 10 blocks, which fails like a provider"""
+
+    def __init__(self, error: Optional[Exception] = None, failures: int = 0) -> None:
+        """
+        Constructor
+
+        :param error: the error of the first queries
+        :param failures: number of queries that fail with the error
+        """
+        self.error = error
+        self.failures = failures
+        self.queries: List[Tuple[int, int]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, start: int, end: int) -> List[Dict[str, int]]:
+        """Get the logs between two blocks, both inclusive"""
+        with self.lock:
+            self.queries.append((start, end))
+            if self.error is not None and self.failures:
+                self.failures -= 1
+                raise self.error
+        logs = [
+            {"blockNumber": block, "logIndex": 0}
+            for block in LOG_BLOCKS
+            if start <= block <= end
+        ]
+        if len(logs) > MAX_LOGS:
+            raise ValueError(
+                {
+                    "code": -32005,
+                    "message": f"query returned more than {MAX_LOGS} results",
+                }
+            )
+        return logs
+
+
+@pytest.fixture(name="sleeps")
+def fixture_sleeps(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """Record the backoff delays instead of sleeping"""
+    sleeps: List[float] = []
+    monkeypatch.setattr(contribute_verify.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def test_log_range_split(sleeps: List[float]) -> None:
+    """Windows with too many results are split until the provider accepts them"""
+    get_logs = FakeLogs()
+    logs = LogRangeFetcher(get_logs, max_workers=2, window=1000).fetch(0, 999)
+
+    assert [log["blockNumber"] for log in logs] == list(LOG_BLOCKS)
+    assert (0, 999) in get_logs.queries
+    assert (0, 499) in get_logs.queries
+    assert not sleeps
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError({"code": -32000, "message": "execution reverted"}),
+        ValueError({"code": -32602, "message": "invalid block range params"}),
+    ],
+)
+def test_log_range_other_errors(error: Exception, sleeps: List[float]) -> None:
+    """Other errors are raised without splitting or retrying"""
+    get_logs = FakeLogs(error, failures=1)
+    with pytest.raises(ValueError):
+        LogRangeFetcher(get_logs, window=100).fetch(0, 99)
+
+    assert get_logs.queries == [(0, 99)]
+    assert not sleeps
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError({"code": -32005, "message": "project ID request rate exceeded"}),
+        ValueError({"code": 429, "message": "Too Many Requests"}),
+        requests.exceptions.Timeout(),
+        requests.exceptions.ConnectionError(),
+    ],
+)
+def test_log_range_retry(error: Exception, sleeps: List[float]) -> None:
+    """Rate limited and timed out windows are retried as they are, with a backoff"""
+    get_logs = FakeLogs(error, failures=2)
+    logs = LogRangeFetcher(get_logs, window=100, backoff_factor=0.5).fetch(0, 99)
+
+    assert [log["blockNumber"] for log in logs] == list(LOG_BLOCKS[:10])
+    assert get_logs.queries == [(0, 99)] * 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_log_range_retries_exhausted(sleeps: List[float]) -> None:
+    """A window that stays rate limited fails once the retries are exhausted"""
+    get_logs = FakeLogs(requests.exceptions.Timeout(), failures=10)
+    with pytest.raises(requests.exceptions.Timeout):
+        LogRangeFetcher(get_logs, window=100, retries=2).fetch(0, 99)
+
+    assert get_logs.queries == [(0, 99)] * 3
+    assert len(sleeps) == 2
+
+
+class MintChain(FakeChain):
+    """Chain stand-in that records its log queries and whose mints can change"""
+
+    def __init__(self, *args: Any) -> None:
+        """Constructor"""
+        super().__init__(*args)
+        self.queries: List[Tuple[int, int]] = []
+        get_logs = self.methods["eth_getLogs"]
+
+        def record(params: List) -> Any:
+            """Record the block range of a query"""
+            self.queries.append(
+                (int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16))
+            )
+            return get_logs(params)
+
+        self.methods["eth_getLogs"] = record
+
+    def set_mints(
+        self, mints: List[Tuple[int, int, int, str]], last_block: int
+    ) -> None:
+        """Replace the mints, i.e. after a reorg, and the head of the chain"""
+        self.dataset.mints = mints
+        self.dataset.last_block = last_block
+        self.blocks = [block for block, *_ in mints]
+        self.owners = {token_id: address for *_, token_id, address in mints}
+
+
+@pytest.fixture(name="mint_chain")
+def fixture_mint_chain(dataset: Dataset) -> Iterator[MintChain]:
+    """Chain stand-in for the mint index"""
+    chain = MintChain(
+        dataset, CONFIG["prod"]["dynamic_contribution_contract_address"], "/"
+    )
+    yield chain
+    chain.server.close()
+
+
+@pytest.fixture(name="mint_config")
+def fixture_mint_config(mint_chain: MintChain, tmp_path: Path) -> Dict[str, Any]:
+    """Deployment configuration that reads the mints from the chain stand-in"""
+    abi_file_path = tmp_path / "DynamicContribution.json"
+    abi_file_path.write_text(
+        json.dumps({"abi": DYNAMIC_CONTRIBUTION_ABI}), encoding="utf-8"
+    )
+    return {
+        **CONFIG["prod"],
+        "earliest_block_to_monitor": mint_chain.dataset.mints[0][0],
+        "confirmation_depth": CONFIRMATION_DEPTH,
+        "ttl": {**CONFIG["prod"]["ttl"], "mints": 0},
+        "infura_url": mint_chain.server.url,
+        "abi_file_path": abi_file_path,
+    }
+
+
+def get_token_ids(mints: List[Tuple[int, int, int, str]]) -> List[str]:
+    """Get the token ids of some stand-in mints"""
+    return [str(token_id) for *_, token_id, _ in mints]
+
+
+def test_mint_index_resume(
+    mint_chain: MintChain, mint_config: Dict[str, Any], store: VerificationStore
+) -> None:
+    """An update only scans the blocks since the checkpoint, minus the confirmation depth"""
+    dataset = mint_chain.dataset
+    index = MintIndex(store)
+    contract = mint_config["dynamic_contribution_contract_address"].lower()
+
+    mints = index.update("prod", mint_config)
+    assert [mint["token_id"] for mint in mints] == get_token_ids(dataset.mints)
+    assert mint_chain.queries[0][0] == mint_config["earliest_block_to_monitor"]
+    checkpoint = dataset.last_block
+    assert store.get_last_block("prod", contract) == checkpoint
+
+    new_mint = (checkpoint + 10, 0, TOKENS + 1, dataset.mints[0][3])
+    mint_chain.set_mints(dataset.mints + [new_mint], checkpoint + 20)
+    mint_chain.queries.clear()
+    mints = index.update("prod", mint_config)
+
+    from_block = checkpoint - CONFIRMATION_DEPTH + 1
+    assert min(start for start, _ in mint_chain.queries) == from_block
+    assert [mint["token_id"] for mint in mints] == get_token_ids(
+        [mint for mint in dataset.mints if mint[0] >= from_block]
+    )
+    assert list(store.get_mints("prod", contract)) == get_token_ids(dataset.mints)
+    assert store.get_last_block("prod", contract) == checkpoint + 20
+
+
+def test_mint_index_reorg(
+    mint_chain: MintChain, mint_config: Dict[str, Any], store: VerificationStore
+) -> None:
+    """Mints within the confirmation depth that a reorg dropped are removed"""
+    dataset = mint_chain.dataset
+    index = MintIndex(store)
+    contract = mint_config["dynamic_contribution_contract_address"].lower()
+    index.update("prod", mint_config)
+
+    *confirmed, dropped = dataset.mints
+    assert dropped[0] > dataset.last_block - CONFIRMATION_DEPTH
+    mint_chain.set_mints(confirmed, dataset.last_block + 1)
+    index.update("prod", mint_config)
+
+    assert list(store.get_mints("prod", contract)) == get_token_ids(confirmed)
+
+
+def baseline_get_image(points: str) -> str:
+    """
+    The image hash of some points, as the baseline draw_table resolved it.
+
+    The baseline sorted the thresholds as strings, which resolved 100000 points
+    and more to the 50000 tier. They are sorted as numbers here.
+
+    :param points: the points
+    :return: the image hash
+    """
+    for threshold in sorted(POINT_TO_HASHES.keys(), key=int, reverse=True):
+        if int(points) >= int(threshold):
+            return POINT_TO_HASHES[threshold]
+    raise ValueError(f"Could not get the image hash for {points} points")
+
+
+def baseline_table(
+    token_to_address: Dict[str, str],
+    address_to_points: Dict[str, str],
+    token_to_hash: Dict[str, str],
+) -> List[Dict[str, Any]]:
+    """The verification table, as the baseline draw_table built it"""
+    table = []
+    for token_id, address in token_to_address.items():
+        row: Dict[str, Any] = {
+            "token_id": token_id,
+            "address": address,
+            "points": address_to_points.get(address, "N/A"),
+            "expected_image": baseline_get_image(address_to_points[address])
+            if address in address_to_points
+            else POINT_TO_HASHES["0"],
+            "image": token_to_hash[token_id],
+        }
+        row["ok"] = row["expected_image"] == row["image"]
+        table.append(row)
+
+    visited_addresses = set()
+    for row in table:
+        if row["address"] in visited_addresses:
+            row["expected_image"] = POINT_TO_HASHES["0"]
+            row["ok"] = row["expected_image"] == row["image"]
+        visited_addresses.add(row["address"])
+    return table
+
+
+def get_verify_images(upgraded: bool) -> Dict[str, str]:
+    """Actual images of the fixture tokens, either all upgraded or with some wrong ones"""
+    token_to_hash = {}
+    for i, (token_id, address, *_) in enumerate(VERIFY_MINTS):
+        points = VERIFY_POINTS.get(address)
+        image = baseline_get_image(points) if points else POINT_TO_HASHES["0"]
+        if not upgraded and i % 3 == 0:
+            image = POINT_TO_HASHES["150000"]
+        token_to_hash[token_id] = image
+    return token_to_hash
+
+
+@pytest.mark.parametrize("upgraded", [True, False])
+@pytest.mark.parametrize("batch_size", [1, 5, 1000])
+def test_verify_matches_baseline(upgraded: bool, batch_size: int) -> None:
+    """The verdicts are the ones of the baseline table, in any batch size"""
+    token_to_hash = get_verify_images(upgraded)
+    mints = {
+        token_id: {
+            "token_id": token_id,
+            "address": address,
+            "block": block,
+            "log_index": log_index,
+        }
+        # The mints are sorted by the engine, not by their order here
+        for token_id, address, block, log_index in reversed(VERIFY_MINTS)
+    }
+    engine = VerificationEngine(
+        VERIFY_POINTS, TierResolver(POINT_TO_HASHES), batch_size=batch_size
+    )
+
+    rows = engine.verify(mints, token_to_hash)
+
+    assert rows == baseline_table(
+        {token_id: address for token_id, address, *_ in VERIFY_MINTS},
+        VERIFY_POINTS,
+        token_to_hash,
+    )
+    assert [row["address"] for row in engine.get_unminted()] == ["0x0b"]
+
+
+def test_verify_first_token_per_address() -> None:
+    """Only the first token of an address gets the upgraded image, whatever its case"""
+    mints = {
+        token_id: {
+            "token_id": token_id,
+            "address": address,
+            "block": block,
+            "log_index": 0,
+        }
+        for token_id, address, block in (("1", "0xAB", 1), ("2", "0xab", 2))
+    }
+    engine = VerificationEngine({"0xAb": "100"}, TierResolver(POINT_TO_HASHES))
+
+    rows = engine.verify(mints, {})
+
+    assert [row["expected_image"] for row in rows] == [
+        POINT_TO_HASHES["100"],
+        POINT_TO_HASHES["0"],
+    ]
+    assert [row["image"] for row in rows] == [contribute_verify.NOT_AVAILABLE] * 2
+    assert not any(row["ok"] for row in rows)
+    assert not list(engine.get_unminted())
+
+
+def test_tier_boundaries() -> None:
+    """Points at a threshold get its tier, one point less gets the previous one"""
+    tiers = TierResolver(POINT_TO_HASHES)
+    thresholds = sorted(POINT_TO_HASHES, key=int)
+
+    for previous, threshold in zip(thresholds, thresholds[1:]):
+        assert tiers.get_image(threshold) == POINT_TO_HASHES[threshold]
+        assert tiers.get_image(int(threshold) - 1) == POINT_TO_HASHES[previous]
+    assert tiers.get_image(10**9) == POINT_TO_HASHES[thresholds[-1]]
+    with pytest.raises(ValueError):
+        tiers.get_image(-1)
+
+
+@pytest.mark.skipif(contribute_verify.np is None, reason="numpy is not installed")
+def test_tiers_numpy_matches_bisect(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Resolving a points column with numpy gives the images bisect gives"""
+    tiers = TierResolver(POINT_TO_HASHES)
+    points = [
+        str(int(threshold) + delta)
+        for threshold in POINT_TO_HASHES
+        for delta in (-1, 0, 1)
+        if int(threshold) + delta >= 0
+    ]
+
+    images = tiers.get_images(points)
+    monkeypatch.setattr(tiers, "_np_thresholds", None)
+    assert images == tiers.get_images(points) == [tiers.get_image(p) for p in points]
+    assert tiers.get_images([]) == []
+    for np_thresholds in (None, contribute_verify.np.array(tiers.thresholds)):
+        monkeypatch.setattr(tiers, "_np_thresholds", np_thresholds)
+        with pytest.raises(ValueError):
+            tiers.get_images(["100", "-1"])
+
+
+@pytest.mark.parametrize(
+    "value, environment, expected",
+    [
+        (
+            '${POINTS_TO_IMAGE_HASHES:str:{"0":"a","10":"b"}}',
+            None,
+            {"0": "a", "10": "b"},
+        ),
+        (
+            '${POINTS_TO_IMAGE_HASHES:str:{"0":"a"}}',
+            '{"0": "c", "5": "d"}',
+            {"0": "c", "5": "d"},
+        ),
+        ("${POINTS_TO_IMAGE_HASHES:str:null}", '{"0": "c"}', {"0": "c"}),
+        ("${POINTS_TO_IMAGE_HASHES:str:null}", None, None),
+        ('${str:{"0":"a"}}', None, {"0": "a"}),
+        ("{0: a, 10: b}", None, {"0": "a", "10": "b"}),
+    ],
+)
+def test_load_points_to_image_hashes(  # pylint: disable=too-many-arguments
+    value: str,
+    environment: Optional[str],
+    expected: Optional[Dict[str, str]],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The env var template is expanded like the service does, in the overrides too"""
+    service_config_path = tmp_path / "service.yaml"
+    service_config_path.write_text(
+        "name: contribute\n"
+        "---\n"
+        "public_id: valory/contribute_skill:0.1.0\n"
+        "type: skill\n"
+        "models:\n"
+        "  params:\n"
+        "    args:\n"
+        f"      points_to_image_hashes: {value}\n",
+        encoding="utf-8",
+    )
+    if environment is None:
+        monkeypatch.delenv("POINTS_TO_IMAGE_HASHES", raising=False)
+    else:
+        monkeypatch.setenv("POINTS_TO_IMAGE_HASHES", environment)
+
+    with pytest.raises(ValueError) if expected is None else nullcontext():
+        assert load_points_to_image_hashes(service_config_path) == expected
+    tiers = TierResolver.from_service_config(service_config_path)
+    assert dict(zip(map(str, tiers.thresholds), tiers.image_hashes)) == (
+        expected or POINT_TO_HASHES
+    )
+
+
+def test_tiers_from_repository_service(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The repository's service takes the tiers from POINTS_TO_IMAGE_HASHES"""
+    monkeypatch.setenv("POINTS_TO_IMAGE_HASHES", '{"0": "a", "100": "b"}')
+    tiers = TierResolver.from_service_config(
+        Path(contribute_verify.__file__).parent.parent / SERVICE_CONFIG_PATH
+    )
+    assert tiers.thresholds == [0, 100]
+    assert tiers.get_image(99) == "a"
+
+
+TIER_0 = POINT_TO_HASHES["0"]
+TIER_100 = POINT_TO_HASHES["100"]
+OTHER_IMAGE = "bafybei" + "c" * 52
+ADDRESS_1 = "0x" + "ab" * 20
+ADDRESS_2 = "0x" + "cd" * 20
+SNAPSHOT_ROWS = [
+    ("1", ADDRESS_1, "100", TIER_100, TIER_100, True),
+    ("2", ADDRESS_2, NOT_AVAILABLE, TIER_0, OTHER_IMAGE, False),
+    ("3", ADDRESS_1, "100", TIER_0, NOT_AVAILABLE, False),
+]
+
+
+def get_snapshot(rows: List[Tuple]) -> Snapshot:
+    """Get the snapshot of verified rows, given as tuples of their fields"""
+    snapshot = Snapshot(TierResolver(POINT_TO_HASHES))
+    for row in rows:
+        snapshot.add(dict(zip(contribute_verify.ROW_FIELDS, row)))
+    return snapshot
+
+
+def test_snapshot_round_trip() -> None:
+    """A deserialized snapshot has the rows of the serialized one"""
+    unminted = (NOT_AVAILABLE, ADDRESS_2, "100", TIER_100, NOT_AVAILABLE, None)
+    snapshot = get_snapshot([*SNAPSHOT_ROWS, unminted])
+    data = snapshot.to_bytes()
+
+    loaded = Snapshot.from_bytes(data)
+
+    assert len(loaded) == len(snapshot) == len(SNAPSHOT_ROWS)
+    rows = [loaded.get_row(i) for i in range(len(loaded))]
+    assert rows == [snapshot.get_row(i) for i in range(len(snapshot))]
+    assert [tuple(row.values()) for row in rows] == [
+        ("1", ADDRESS_1, "100", "tier 100", "tier 100", True),
+        ("2", ADDRESS_2, NOT_AVAILABLE, "tier 0", OTHER_IMAGE, False),
+        ("3", ADDRESS_1, "100", "tier 0", NOT_AVAILABLE, False),
+    ]
+    assert loaded.to_bytes() == data
+    assert not list(diff_snapshots(snapshot, loaded))
+
+
+def test_snapshot_diff() -> None:
+    """Added, removed and changed rows are reported, the unchanged ones are not"""
+    old = get_snapshot(SNAPSHOT_ROWS)
+    new = get_snapshot(
+        [
+            ("1", ADDRESS_1, "100", TIER_0, TIER_100, False),
+            ("2", ADDRESS_2, NOT_AVAILABLE, TIER_0, TIER_0, True),
+            ("4", ADDRESS_1, "100", TIER_100, TIER_100, True),
+        ]
+    )
+
+    changes = sorted(
+        (tuple(change.values()) for change in diff_snapshots(old, new)),
+        key=lambda change: (change[1], change[0]),
+    )
+
+    assert changes == [
+        ("failing", "1", ADDRESS_1, True, False),
+        ("tier", "1", ADDRESS_1, "tier 100", "tier 0"),
+        ("fixed", "2", ADDRESS_2, False, True),
+        ("image", "2", ADDRESS_2, OTHER_IMAGE, "tier 0"),
+        ("removed", "3", ADDRESS_1, NOT_AVAILABLE, None),
+        ("new", "4", ADDRESS_1, None, "tier 100"),
+    ]
+
+
+def test_snapshot_retention(store: VerificationStore) -> None:
+    """Unchanged snapshots are not stored again, and only the latest ones are kept"""
+    snapshots = [get_snapshot(SNAPSHOT_ROWS[: i + 1]).to_bytes() for i in range(3)]
+
+    created_at = store.add_snapshot("test", 1, snapshots[0], retention=2)
+    assert store.add_snapshot("test", 1, snapshots[0], retention=2) == created_at
+    assert len(store.get_snapshots("test")) == 1
+
+    for i, data in enumerate(snapshots[1:], 2):
+        created_at = store.add_snapshot("test", i, data, retention=2)
+    assert [rows for _, rows, _ in store.get_snapshots("test")] == [2, 3]
+    assert store.get_snapshot("test", created_at) == snapshots[2]
+
+    # Only a snapshot that is the same as the latest one is skipped
+    store.add_snapshot("test", 2, snapshots[1], retention=2)
+    assert [rows for _, rows, _ in store.get_snapshots("test")] == [3, 2]
+    assert not store.get_snapshots("other")